@@ -16,6 +16,15 @@ class DiscordConfig:
         "retry_delays": [1, 2, 5, 10],  # Delays en segundos para cada reintento
         "queue_max_size": int(os.getenv("DISCORD_QUEUE_MAX_SIZE", "100")),
         "worker_health_check_interval": int(os.getenv("DISCORD_WORKER_HEALTH_CHECK", "60")),
+        # Modo asíncrono: corrutinas en el event loop de FastAPI en lugar de un hilo por petición
+        "async_mode": os.getenv("DISCORD_ASYNC_MODE", "true").lower() == "true",
+        "async_workers": int(os.getenv("DISCORD_ASYNC_WORKERS", "256")),
+        "max_concurrent_generations": int(os.getenv("DISCORD_MAX_CONCURRENT_GENERATIONS", "128")),
+        # Lotes oportunistas: con la cola por encima del umbral, un worker toma varias peticiones
+        "batch_mode": os.getenv("DISCORD_BATCH_MODE", "true").lower() == "true",
+        "batch_queue_threshold": int(os.getenv("DISCORD_BATCH_QUEUE_THRESHOLD", "8")),
+        "batch_max_size": int(os.getenv("DISCORD_BATCH_MAX_SIZE", "16")),
+        "batch_max_concurrency": int(os.getenv("DISCORD_BATCH_MAX_CONCURRENCY", "8")),
     }
     
     # Configuraciones de rate limiting
@@ -50,10 +59,14 @@ class DiscordConfig:
     
     # Configuraciones de respuesta
     RESPONSE_CONFIG = {
+        # Tiempo límite desde la recepción para generar la respuesta (como mucho, los 15 min del token)
         "default_timeout_seconds": int(os.getenv("DISCORD_DEFAULT_TIMEOUT", "25")),
         "max_response_length": int(os.getenv("DISCORD_MAX_RESPONSE_LENGTH", "2000")),
         "truncate_long_responses": os.getenv("DISCORD_TRUNCATE_RESPONSES", "true").lower() == "true",
         "add_timestamps": os.getenv("DISCORD_ADD_TIMESTAMPS", "false").lower() == "true",
+        # Streaming: editar el mensaje original con el texto parcial (solo en modo asíncrono)
+        "stream_responses": os.getenv("DISCORD_STREAM_RESPONSES", "true").lower() == "true",
+        "stream_edit_interval_seconds": float(os.getenv("DISCORD_STREAM_EDIT_INTERVAL", "1.0")),
     }
     
     @classmethod
@@ -98,6 +111,14 @@ class DiscordConfig:
                 raise ValueError("request_timeout debe ser mayor que 0")
             if ack_config["max_retries"] < 0:
                 raise ValueError("max_retries debe ser mayor o igual que 0")
+            if ack_config["async_workers"] <= 0:
+                raise ValueError("async_workers debe ser mayor que 0")
+            if ack_config["max_concurrent_generations"] <= 0:
+                raise ValueError("max_concurrent_generations debe ser mayor que 0")
+            if ack_config["batch_max_size"] <= 0:
+                raise ValueError("batch_max_size debe ser mayor que 0")
+            if ack_config["batch_max_concurrency"] <= 0:
+                raise ValueError("batch_max_concurrency debe ser mayor que 0")
             
             # Validar rate limiting
             rate_config = cls.get_rate_limit_config()
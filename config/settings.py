@@ -24,13 +24,91 @@ GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
 # Configuraciones del modelo
-MODEL_PROVIDER = "gemini"  # ollama, gemini y openai.
-MODEL_NAME = "gemini-2.5-flash"  # gemini-2.5-flash, llama3.1, gpt-4o-mini
+MODEL_PROVIDER = os.getenv("MODEL_PROVIDER", "gemini")  # ollama, gemini, openai y fake (simulado).
+MODEL_NAME = os.getenv("MODEL_NAME", "gemini-2.5-flash")  # gemini-2.5-flash, llama3.1, gpt-4o-mini
 EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
 
+# Proveedores alternativos para respaldo (hedging) y failover, p. ej. "openai:gpt-4o-mini,ollama:llama3.1"
+MODEL_FALLBACKS = [item.strip() for item in os.getenv("MODEL_FALLBACKS", "").split(",") if item.strip()]
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))  # Latencia a partir de la que se lanza el respaldo
+LLM_HEDGE_MIN_SAMPLES = 20  # Latencias necesarias antes de usar el percentil
+LLM_HEDGE_INITIAL_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_INITIAL_DELAY", "5.0"))  # Espera mientras no hay muestras
+LLM_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", "5"))  # Errores seguidos que abren el circuito
+LLM_CIRCUIT_RESET_SECONDS = float(os.getenv("LLM_CIRCUIT_RESET_SECONDS", "30"))  # Tiempo abierto antes de probar de nuevo
+
+# Proveedor simulado (MODEL_PROVIDER="fake") para pruebas de rendimiento sin API
+FAKE_LLM_LATENCY_PROFILE = os.getenv("FAKE_LLM_LATENCY_PROFILE", "fixed")  # fixed, lognormal o replay
+FAKE_LLM_LATENCY_SECONDS = float(os.getenv("FAKE_LLM_LATENCY_SECONDS", "1.0"))  # Latencia fija o mediana
+FAKE_LLM_LATENCY_SIGMA = float(os.getenv("FAKE_LLM_LATENCY_SIGMA", "0.5"))  # Dispersión del perfil lognormal
+FAKE_LLM_FIRST_TOKEN_SHARE = float(os.getenv("FAKE_LLM_FIRST_TOKEN_SHARE", "0.3"))  # Parte de la latencia hasta el primer token
+FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))  # Probabilidad de error por llamada
+FAKE_LLM_RESPONSES = [item for item in os.getenv("FAKE_LLM_RESPONSES", "").split("|") if item] or [
+    "Esta es una respuesta simulada para pruebas de rendimiento.",
+    "No tengo información sobre eso en el contexto proporcionado.",
+]
+FAKE_LLM_REPLAY_LIMIT = 1000  # Tiempos registrados que se muestrean en el perfil replay
+FAKE_LLM_SEED = int(os.getenv("FAKE_LLM_SEED")) if os.getenv("FAKE_LLM_SEED") else None
+
 # Configuraciones del RAG
 RAG_K_RESULTS = 5
-HISTORY_LIMIT = 10
+HISTORY_LIMIT = 10  # Turnos (pregunta + respuesta) que se conservan por usuario
+ENTITY_TRACKER_MAX_CONVERSATIONS = int(os.getenv("ENTITY_TRACKER_MAX_CONVERSATIONS", "10000"))  # Conversaciones con entidades en memoria
+
+# Presupuesto de tokens del prompt (estimados a ~4 caracteres por token)
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))
+PROMPT_MAX_QUESTION_TOKENS = int(os.getenv("PROMPT_MAX_QUESTION_TOKENS", "500"))
+PROMPT_CONTEXT_SHARE = float(os.getenv("PROMPT_CONTEXT_SHARE", "0.6"))  # Parte del resto para documentos
+RAG_HYBRID_SEARCH = os.getenv("RAG_HYBRID_SEARCH", "true").lower() == "true"  # BM25 + vectorial
+RAG_RRF_K = 60  # Constante de Reciprocal Rank Fusion
+
+# Ingesta de la base de conocimiento: todos los .txt y .md de data/
+KNOWLEDGE_DIR = Path(os.getenv("KNOWLEDGE_DIR", str(DATA_DIR)))
+KNOWLEDGE_EXTENSIONS = (".txt", ".md")
+KNOWLEDGE_EXCLUDE_DIRS = ("memory", "contexts", "index", "guilds")  # Datos del bot, no conocimiento
+RAG_LINE_MODE_EXTENSIONS = (".txt",)  # Un hecho por línea; el resto se fragmenta
+RAG_CHUNK_SIZE = int(os.getenv("RAG_CHUNK_SIZE", "800"))  # Caracteres por fragmento
+RAG_CHUNK_OVERLAP = int(os.getenv("RAG_CHUNK_OVERLAP", "100"))  # Caracteres compartidos entre fragmentos
+RAG_EMBED_BATCH_SIZE = int(os.getenv("RAG_EMBED_BATCH_SIZE", "256"))  # Documentos embebidos por lote al indexar
+
+# Bases de conocimiento por servidor: data/guilds/<guild_id>/ (sin carpeta se usa la global)
+GUILD_KNOWLEDGE_DIR = DATA_DIR / "guilds"
+GUILD_INDEX_DIRNAME = ".index"  # Índice de cada servidor, dentro de su carpeta
+RAG_GUILD_MEMORY_BUDGET_MB = int(os.getenv("RAG_GUILD_MEMORY_BUDGET_MB", "512"))  # Índices de servidores residentes
+
+# Configuraciones del índice vectorial persistente
+INDEX_DIR = DATA_DIR / "index"
+
+# Tipo de índice vectorial: flat (exacto), hnsw, ivf, ivfpq o sq8 (aproximados)
+RAG_INDEX_TYPE = os.getenv("RAG_INDEX_TYPE", "flat")
+RAG_INDEX_PARAMS = {
+    "hnsw_m": 32,          # Vecinos por nodo del grafo HNSW
+    "ivf_nlist": 1024,     # Máximo de listas invertidas (se ajusta al tamaño del corpus)
+    "pq_m": 16,            # Subvectores de Product Quantization (debe dividir la dimensión)
+    "pq_nbits": 8,         # Bits por subvector
+    "train_size": 50000,   # Vectores de muestra para entrenar IVF/PQ/SQ8 antes de añadir el resto
+    "search_nprobe": 16,   # Listas IVF visitadas por búsqueda
+    "search_ef": 64,       # Amplitud de búsqueda HNSW
+}
+RAG_RELOAD_POLL_SECONDS = int(os.getenv("RAG_RELOAD_POLL_SECONDS", "30"))  # 0 deshabilita la recarga automática
+
+# Caché de embeddings de consultas
+RAG_QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("RAG_QUERY_EMBEDDING_CACHE_SIZE", "2048"))
+RAG_QUERY_EMBEDDING_CACHE_TTL = int(os.getenv("RAG_QUERY_EMBEDDING_CACHE_TTL", "3600"))  # Segundos, 0 = sin expiración
+
+# Caché de resultados de recuperación (se invalida al cambiar la huella del índice)
+RAG_RETRIEVAL_CACHE_SIZE = int(os.getenv("RAG_RETRIEVAL_CACHE_SIZE", "1024"))
+RAG_RETRIEVAL_CACHE_TTL = int(os.getenv("RAG_RETRIEVAL_CACHE_TTL", "600"))  # Segundos, 0 = sin expiración
+
+# Caché semántica de respuestas para preguntas sin historial
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "3600"))  # Segundos, 0 = sin expiración
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.95"))  # Similitud coseno mínima
+
+# Agrupación de embeddings de consultas concurrentes
+EMBEDDING_BATCHING_ENABLED = os.getenv("EMBEDDING_BATCHING_ENABLED", "true").lower() == "true"
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5"))
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "32"))
 
 # Configuraciones del servidor
 HOST = "0.0.0.0"
@@ -4,6 +4,7 @@ Servidor FastAPI principal para el bot de Discord
 
 from fastapi import FastAPI, Request, Response
 from fastapi.responses import JSONResponse
+import asyncio
 import threading
 import requests
 import os
@@ -11,13 +12,14 @@ import time
 from dotenv import load_dotenv
 
 # Importar desde la nueva estructura
-from src.core.chat import chat, tirar_dados, girar_ruleta, lanzar_moneda, mensaje_ayuda, borrar_memoria_usuario
+from src.core.chat import chat, tirar_dados, girar_ruleta, lanzar_moneda, mensaje_ayuda, borrar_memoria_usuario, response_cache, chat_flights
 from src.utils.security import verify_discord_signature
 from src.utils.logger import logger
 from src.discord.interaction_handler import interaction_handler
 from src.utils.metrics import metrics_collector
 from src.utils.context_storage import context_storage
 from src.utils.persistent_memory import persistent_memory
+from src.rag.enhanced_rag import reload_knowledge_base, start_warmup, is_rag_ready, get_rag_stats
 
 # Cargar variables de entorno
 load_dotenv()
@@ -38,6 +40,21 @@ app = FastAPI(
     version="1.0.0"
 )
 
+@app.on_event("startup")
+async def warmup_rag():
+    """Carga embeddings y vectorstore en segundo plano sin bloquear el arranque."""
+    start_warmup()
+
+@app.on_event("startup")
+async def start_interaction_workers():
+    """Inicia los consumidores asíncronos de interacciones en el event loop de FastAPI."""
+    await interaction_handler.start_async_workers()
+
+@app.on_event("shutdown")
+async def stop_interaction_workers():
+    """Detiene los consumidores asíncronos y cierra su sesión HTTP."""
+    await interaction_handler.shutdown_async()
+
 @app.post("/discord-interactions")
 async def handle_discord_interactions(request: Request):
     """
@@ -101,6 +118,17 @@ async def handle_discord_interactions(request: Request):
                     "type": 4,
                     "data": {"content": "Debes enviar un mensaje para el chat. Ejemplo: /chat prompt:Tu pregunta"}
                 }
+
+            # El RAG todavía se está calentando: responder sin bloquear
+            if not is_rag_ready():
+                logger.info("Chat recibido antes de completar el calentamiento del RAG")
+                return {
+                    "type": 4,
+                    "data": {
+                        "content": "⏳ El bot se está iniciando. Inténtalo de nuevo en unos segundos.",
+                        "flags": 64  # Ephemeral flag
+                    }
+                }
             
             # Usar el nuevo sistema mejorado de ACK diferido
             success = interaction_handler.submit_interaction(interaction_data, prompt)
@@ -336,6 +364,25 @@ async def cleanup_memories(days: int = 30):
             "error": str(e)
         }
 
+# Endpoints para gestión de la base de conocimiento
+
+@app.post("/rag/reload")
+async def reload_rag(guild_id: str = None):
+    """Endpoint para recargar la base de conocimiento (global o de un servidor) sin reiniciar el servidor."""
+    try:
+        result = await asyncio.to_thread(reload_knowledge_base, guild_id)
+        return {
+            "success": True,
+            "data": result,
+            "message": f"Base de conocimiento recargada: +{result['added']} / -{result['removed']} documentos"
+        }
+    except Exception as e:
+        logger.error(f"Error recargando la base de conocimiento: {e}")
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
 @app.get("/health")
 async def health_check():
     """Endpoint de verificación de salud del servidor."""
@@ -348,6 +395,7 @@ async def health_check():
         "total_interactions": health_data["total_interactions"],
         "failed_interactions": health_data["failed_interactions"],
         "queue_size": health_data["current_queue_size"],
+        "rag_ready": is_rag_ready(),
         "timestamp": "2024-01-01T00:00:00Z"
     }
 
@@ -358,8 +406,12 @@ async def get_metrics():
         "system_health": metrics_collector.get_system_health(),
         "queue_status": {
             "size": interaction_handler.get_queue_size(),
-            "active_requests": interaction_handler.get_active_requests_count()
+            "active_requests": interaction_handler.get_active_requests_count(),
+            "per_user": interaction_handler.user_serializer.get_stats()
         },
+        "rag": get_rag_stats(),
+        "response_cache": response_cache.get_stats(),
+        "single_flight": chat_flights.get_stats(),
         "metrics_summary": metrics_collector.get_all_metrics_summary(300)  # Últimos 5 minutos
     }
 
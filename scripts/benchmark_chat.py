@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Rendimiento del pipeline de chat completo (recuperación, prompt y LLM) con el
+proveedor simulado, sin llamar a ninguna API
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Agregar el directorio padre al path para importar módulos del proyecto
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def print_header(title: str):
+    """Imprime un encabezado formateado"""
+    print("\n" + "="*72)
+    print(f"  {title}")
+    print("="*72)
+
+
+def configure_fake_provider(args):
+    """Fija el proveedor simulado antes de importar la configuración del proyecto"""
+    os.environ["MODEL_PROVIDER"] = "fake"
+    os.environ["FAKE_LLM_LATENCY_PROFILE"] = args.profile
+    os.environ["FAKE_LLM_LATENCY_SECONDS"] = str(args.latency)
+    os.environ["FAKE_LLM_ERROR_RATE"] = str(args.error_rate)
+    os.environ["FAKE_LLM_SEED"] = str(args.seed)
+    # Cada petición debe llegar al LLM
+    os.environ["RESPONSE_CACHE_ENABLED"] = "false"
+
+
+def isolate_storage(directory: str):
+    """
+    Redirige la memoria de usuarios y los contextos de consulta a un directorio
+    temporal para que el benchmark no ensucie data/ (ni los tiempos del perfil replay).
+    """
+    from src.core.chat import get_llm
+    from src.utils.context_storage import context_storage
+    from src.utils.persistent_memory import persistent_memory
+
+    # El perfil replay lee los tiempos reales al crear el modelo: antes de redirigir
+    get_llm()
+
+    persistent_memory.storage_dir = Path(directory) / "memory"
+    persistent_memory.storage_dir.mkdir(parents=True, exist_ok=True)
+    context_storage.storage_dir = Path(directory) / "contexts"
+    context_storage.storage_dir.mkdir(parents=True, exist_ok=True)
+    context_storage.contexts_file = context_storage.storage_dir / "query_contexts.jsonl"
+    context_storage.stats_file = context_storage.storage_dir / "query_stats.json"
+
+
+def seed_history(args):
+    """Precarga `--history` turnos en la memoria de cada usuario del benchmark"""
+    from src.utils.persistent_memory import persistent_memory
+
+    for i in range(args.requests):
+        memory = persistent_memory.get_user_memory(f"bench-{i}")
+        for turn in range(args.history):
+            memory.chat_memory.add_user_message(f"Pregunta anterior {turn} del usuario {i}")
+            memory.chat_memory.add_ai_message(f"Respuesta anterior {turn} al usuario {i}")
+
+
+async def run(args) -> tuple:
+    """Lanza las peticiones con la concurrencia indicada y mide cada una"""
+    from src.core.chat import achat
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(i: int):
+        nonlocal errors
+        async with semaphore:
+            start_time = time.perf_counter()
+            response = await achat(f"Pregunta de prueba número {i}", user_id=f"bench-{i}",
+                                   username="benchmark", history_limit=args.history)
+            latencies.append(time.perf_counter() - start_time)
+            if response.startswith("❌"):
+                errors += 1
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.requests)))
+    return latencies, errors, time.perf_counter() - start_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del chat con el proveedor de LLM simulado")
+    parser.add_argument("--requests", type=int, default=200, help="Número de peticiones")
+    parser.add_argument("--concurrency", type=int, default=32, help="Peticiones simultáneas")
+    parser.add_argument("--profile", choices=["fixed", "lognormal", "replay"], default="fixed",
+                        help="Perfil de latencia del LLM simulado")
+    parser.add_argument("--latency", type=float, default=1.0, help="Latencia fija o mediana (segundos)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probabilidad de error por llamada")
+    parser.add_argument("--history", type=int, default=0, help="Turnos de historial precargados por usuario")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    configure_fake_provider(args)
+    with tempfile.TemporaryDirectory(prefix="benchmark_chat_") as directory:
+        isolate_storage(directory)
+        seed_history(args)
+        latencies, errors, elapsed = asyncio.run(run(args))
+
+    print_header(f"CHAT CON LLM SIMULADO ({args.profile}, {args.latency}s, concurrencia {args.concurrency})")
+    print(f"Peticiones:      {len(latencies)} ({errors} con error)")
+    print(f"Tiempo total:    {elapsed:.2f}s")
+    print(f"Throughput:      {len(latencies) / elapsed:.2f} peticiones/s")
+    print(f"Latencia p50:    {np.percentile(latencies, 50):.3f}s")
+    print(f"Latencia p95:    {np.percentile(latencies, 95):.3f}s")
+    print(f"Latencia p99:    {np.percentile(latencies, 99):.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Reporte de recall vs latencia y memoria para cada tipo de índice FAISS
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+# Agregar el directorio padre al path para importar módulos del proyecto
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.rag.index_factory import INDEX_TYPES, create_index, apply_search_params
+
+
+def print_header(title: str):
+    """Imprime un encabezado formateado"""
+    print("\n" + "="*72)
+    print(f"  {title}")
+    print("="*72)
+
+
+def load_vectors(args) -> np.ndarray:
+    """Obtiene los vectores del corpus: sintéticos o de la base de conocimiento"""
+    if args.synthetic:
+        rng = np.random.default_rng(args.seed)
+        vectors = rng.standard_normal((args.synthetic, args.dimension)).astype(np.float32)
+        faiss.normalize_L2(vectors)
+        return vectors
+
+    from config.settings import KNOWLEDGE_DIR
+    from src.rag.embeddings import create_embeddings
+    from src.rag.ingestion import load_documents
+
+    documents = load_documents(KNOWLEDGE_DIR)
+    embeddings = create_embeddings()
+    return np.asarray(embeddings.embed_documents([doc.page_content for doc in documents]), dtype=np.float32)
+
+
+def benchmark(index_type: str, vectors: np.ndarray, queries: np.ndarray, ground_truth: np.ndarray, k: int) -> dict:
+    """Construye un índice, lo consulta y mide recall@k, latencia y memoria"""
+    start_time = time.time()
+    index = create_index(index_type, vectors.shape[1], len(vectors))
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    apply_search_params(index)
+    build_time = time.time() - start_time
+
+    latencies = []
+    found = np.empty_like(ground_truth)
+    for i, query in enumerate(queries):
+        query_start = time.perf_counter()
+        _, ids = index.search(query.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - query_start) * 1000)
+        found[i] = ids[0]
+
+    recall = np.mean([len(set(found[i]) & set(ground_truth[i])) / k for i in range(len(queries))])
+    return {
+        "index_type": index_type,
+        "resolved": type(index).__name__,
+        "build_s": build_time,
+        "recall": recall,
+        "avg_ms": float(np.mean(latencies)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "memory_mb": faiss.serialize_index(index).nbytes / (1024 * 1024),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara los tipos de índice FAISS del RAG")
+    parser.add_argument("--synthetic", type=int, default=0, help="Usar N vectores aleatorios en lugar de la base de conocimiento")
+    parser.add_argument("--dimension", type=int, default=384, help="Dimensión de los vectores sintéticos")
+    parser.add_argument("--queries", type=int, default=200, help="Número de consultas de prueba")
+    parser.add_argument("--k", type=int, default=5, help="Resultados por consulta")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    vectors = load_vectors(args)
+    k = min(args.k, len(vectors))
+
+    # Consultas: vectores del corpus con ruido para no coincidir exactamente
+    rng = np.random.default_rng(args.seed + 1)
+    sample = vectors[rng.integers(0, len(vectors), args.queries)]
+    queries = (sample + 0.05 * rng.standard_normal(sample.shape)).astype(np.float32)
+
+    # Referencia exacta
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, ground_truth = exact.search(queries, k)
+
+    print_header(f"RECALL@{k} VS LATENCIA ({len(vectors)} vectores, dimensión {vectors.shape[1]})")
+    print(f"{'Tipo':<8} {'Índice':<22} {'Build(s)':>9} {'Recall':>8} {'Media(ms)':>10} {'p95(ms)':>9} {'Memoria(MB)':>12}")
+    print("-" * 84)
+    for index_type in INDEX_TYPES:
+        result = benchmark(index_type, vectors, queries, ground_truth, k)
+        print(f"{result['index_type']:<8} {result['resolved']:<22} {result['build_s']:>9.2f} "
+              f"{result['recall']:>8.3f} {result['avg_ms']:>10.3f} {result['p95_ms']:>9.3f} "
+              f"{result['memory_mb']:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
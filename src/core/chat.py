@@ -2,62 +2,105 @@
 Módulo principal de chat con funcionalidades del bot
 """
 
-import os
+import asyncio
 import random
+import threading
 import time
-from pydantic import SecretStr
-from langchain_google_genai import ChatGoogleGenerativeAI
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+import numpy as np
 from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain.chains import create_retrieval_chain
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
-from langchain_ollama import ChatOllama
 from langchain.memory import ConversationBufferMemory
 
-from config.settings import MODEL_PROVIDER, MODEL_NAME
+from config.settings import (
+    MODEL_PROVIDER, MODEL_NAME, MODEL_FALLBACKS, HISTORY_LIMIT,
+    RESPONSE_CACHE_ENABLED, RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL, RESPONSE_CACHE_SIMILARITY,
+)
 
 # Importar desde la nueva estructura
-from src.rag.enhanced_rag import get_retriever, set_history, get_enhanced_documents
+from src.rag.enhanced_rag import (
+    get_enhanced_documents, get_enhanced_documents_batch, RetrievalContext, embed_text, get_knowledge_fingerprint,
+)
+from src.rag.entity_index import entity_tracker
+from src.core.llm_router import LLMProvider, LLMRouter, create_chat_model
+from src.core.prompt_builder import PromptBuilder, format_message, recent_messages
 from src.utils.logger import logger
+from src.utils.metrics import metrics_collector
+from src.utils.single_flight import SingleFlight
+from src.utils.deadline import Deadline, DeadlineExceeded, wait_with_deadline
 from src.utils.context_storage import context_storage, QueryContext
 from src.utils.persistent_memory import persistent_memory
 
 # Memoria global por usuario (mantener para compatibilidad)
 USER_MEMORIES = {}
 
-# Cache para LLM y chain (evita recrearlos en cada llamada)
+# Prompt de sistema; el historial y el contexto los arma el PromptBuilder
+SYSTEM_PROMPT = (
+    "Eres un asistente útil que responde preguntas basándose en el contexto proporcionado y el historial de la conversación. "
+    "IMPORTANTE: Si la pregunta hace referencia a alguien o algo mencionado anteriormente en la conversación, usa esa información del contexto para entender a qué se refiere la pregunta. "
+    "Intenta entender la pregunta y responderla con la información del contexto. "
+    "Trata de ser conciso y directo en la respuesta. "
+    "Si no sabes la respuesta de la pregunta, debes decir que no lo sabes y no intentes adivinar. "
+    "Contexto de la base de conocimiento: {context}\n"
+    "Historial de la conversación: {history}"
+)
+
+# Constructor del prompt con presupuesto de tokens
+prompt_builder = PromptBuilder(SYSTEM_PROMPT)
+
+# Cache para LLM y chain (evita recrearlos en cada llamada). Se crean una sola
+# vez y no se modifican: el estado de cada petición va en la entrada y el config
 _llm_cache = None
 _chain_cache = None
+_llm_lock = threading.Lock()
+_chain_lock = threading.Lock()
 
 def get_llm():
-    """Obtiene el LLM configurado, usando cache si está disponible."""
+    """
+    Obtiene el LLM configurado, usando cache si está disponible.
+
+    Con MODEL_FALLBACKS devuelve un LLMRouter que reparte las peticiones entre el
+    proveedor principal y los alternativos (hedging, failover y circuit breaker).
+    """
     global _llm_cache
     
     if _llm_cache is not None:
         logger.debug("Usando LLM cacheado")
         return _llm_cache
     
+    # Doble comprobación: solo el primer hilo crea el LLM
+    with _llm_lock:
+        if _llm_cache is None:
+            _llm_cache = _create_llm()
+    return _llm_cache
+
+def _create_llm():
+    """Crea el LLM del proveedor principal o el enrutador con los alternativos."""
     logger.info(f"Inicializando LLM con proveedor: {MODEL_PROVIDER}, modelo: {MODEL_NAME}")
     
-    if MODEL_PROVIDER == "ollama":
-        _llm_cache = ChatOllama(model=MODEL_NAME)
-        logger.info("LLM Ollama inicializado correctamente")
-    elif MODEL_PROVIDER == "openai":
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            logger.error("Falta OPENAI_API_KEY en el entorno")
-            raise ValueError("Error: Falta OPENAI_API_KEY en el entorno.")
-        _llm_cache = ChatOpenAI(model=MODEL_NAME, api_key=SecretStr(api_key))
-        logger.info("LLM OpenAI inicializado correctamente")
-    else:  # google
-        api_key = os.getenv("GOOGLE_API_KEY")
-        if not api_key:
-            logger.error("Falta GOOGLE_API_KEY en el entorno")
-            raise ValueError("Error: Falta GOOGLE_API_KEY en el entorno.")
-        _llm_cache = ChatGoogleGenerativeAI(model=MODEL_NAME, google_api_key=api_key)
-        logger.info("LLM Google inicializado correctamente")
+    try:
+        llm = create_chat_model(MODEL_PROVIDER, MODEL_NAME)
+    except ValueError as e:
+        logger.error(str(e))
+        raise
+    logger.info(f"LLM {MODEL_PROVIDER} inicializado correctamente")
     
-    return _llm_cache
+    if not MODEL_FALLBACKS:
+        return llm
+    
+    providers = [LLMProvider(f"{MODEL_PROVIDER}:{MODEL_NAME}", llm)]
+    for fallback in MODEL_FALLBACKS:
+        provider, _, model_name = fallback.partition(":")
+        try:
+            providers.append(LLMProvider(fallback, create_chat_model(provider, model_name)))
+        except ValueError as e:
+            # Un proveedor alternativo sin credenciales no impide arrancar
+            logger.warning(f"Proveedor alternativo {fallback} omitido: {e}")
+    
+    logger.info(f"Enrutador de LLM con proveedores: {[p.name for p in providers]}")
+    return LLMRouter(providers)
 
 def get_chain():
     """Obtiene el chain configurado, usando cache si está disponible."""
@@ -67,35 +110,153 @@ def get_chain():
         logger.debug("Usando chain cacheado")
         return _chain_cache
     
+    # Doble comprobación: solo el primer hilo crea el chain
+    with _chain_lock:
+        if _chain_cache is None:
+            _chain_cache = _create_chain()
+    return _chain_cache
+
+def _create_chain():
+    """Crea el chain de chat a partir del LLM configurado."""
     logger.info("Inicializando chain de chat")
     
     # Obtener LLM
     llm = get_llm()
     
-    # Crear prompt optimizado
-    system_prompt = (
-        "Eres un asistente útil que responde preguntas basándose en el contexto proporcionado y el historial de la conversación. "
-        "IMPORTANTE: Si la pregunta hace referencia a alguien o algo mencionado anteriormente en la conversación, usa esa información del contexto para entender a qué se refiere la pregunta. "
-        "Intenta entender la pregunta y responderla con la información del contexto. "
-        "Trata de ser conciso y directo en la respuesta. "
-        "Si no sabes la respuesta de la pregunta, debes decir que no lo sabes y no intentes adivinar. "
-        "Contexto de la base de conocimiento: {context}\n"
-        "Historial de la conversación: {history}"
-    )
-    
     chat_prompt = ChatPromptTemplate.from_messages([
-        ("system", system_prompt),
+        ("system", SYSTEM_PROMPT),
         ("human", "{input}"),
     ])
     
-    question_answer_chain = create_stuff_documents_chain(llm, chat_prompt)
-    
-    # Obtener el retriever mejorado
-    retriever = get_retriever()
-    _chain_cache = create_retrieval_chain(retriever, question_answer_chain)
+    # Solo el chain de "stuff documents": la recuperación se hace una única vez
+    # en chat() y los documentos elegidos se pasan directamente en "context"
+    chain = create_stuff_documents_chain(llm, chat_prompt)
     
     logger.info("Chain de chat inicializado correctamente")
-    return _chain_cache
+    return chain
+
+@dataclass
+class CachedResponse:
+    """Respuesta guardada en la caché semántica"""
+    vector: np.ndarray
+    response: str
+    documents_used: List[str]
+    expires_at: float
+
+
+class SemanticResponseCache:
+    """
+    Caché de respuestas para preguntas sin historial, buscada por similitud de embeddings.
+    
+    Las entradas se agrupan en particiones (servidor, roles, huella de la base de
+    conocimiento): una respuesta solo se reutiliza con el mismo contexto y una
+    recarga de la base invalida las anteriores. Expulsión LRU y expiración por TTL.
+    """
+    
+    def __init__(self, max_size: int = RESPONSE_CACHE_SIZE, ttl_seconds: float = RESPONSE_CACHE_TTL,
+                 similarity_threshold: float = RESPONSE_CACHE_SIMILARITY):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        # Entradas en orden LRU global y, por partición, prompt normalizado -> respuesta
+        self._entries: "OrderedDict[Tuple[Tuple, str], CachedResponse]" = OrderedDict()
+        self._partitions: Dict[Tuple, Dict[str, CachedResponse]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def normalize(vector: List[float]) -> np.ndarray:
+        """Normaliza un embedding para comparar por producto escalar (similitud coseno)"""
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else array
+    
+    def _remove(self, key: Tuple[Tuple, str]):
+        """Elimina una entrada de la caché (requiere el lock)"""
+        self._entries.pop(key, None)
+        partition, prompt_key = key
+        entries = self._partitions.get(partition)
+        if entries is not None:
+            entries.pop(prompt_key, None)
+            if not entries:
+                del self._partitions[partition]
+    
+    def get(self, partition: Tuple, prompt_key: str, vector: np.ndarray) -> Optional[CachedResponse]:
+        """
+        Busca la respuesta más parecida de la partición por encima del umbral.
+        
+        Args:
+            partition: Contexto en el que la respuesta es válida
+            prompt_key: Prompt normalizado (coincidencia exacta sin calcular similitudes)
+            vector: Embedding normalizado del prompt
+        """
+        now = time.time()
+        with self._lock:
+            entries = self._partitions.get(partition, {})
+            best_key, best = None, entries.get(prompt_key)
+            if best is not None:
+                best_key = prompt_key
+            elif entries:
+                keys = list(entries)
+                similarities = np.stack([entries[key].vector for key in keys]) @ vector
+                position = int(np.argmax(similarities))
+                if similarities[position] >= self.similarity_threshold:
+                    best_key, best = keys[position], entries[keys[position]]
+            
+            if best is not None and best.expires_at and best.expires_at <= now:
+                self._remove((partition, best_key))
+                best = None
+            
+            if best is None:
+                self.misses += 1
+                metrics_collector.increment_counter("chat_response_cache_misses")
+                return None
+            
+            self._entries.move_to_end((partition, best_key))
+            self.hits += 1
+            metrics_collector.increment_counter("chat_response_cache_hits")
+            return best
+    
+    def put(self, partition: Tuple, prompt_key: str, vector: np.ndarray, response: str,
+            documents_used: List[str]):
+        """Guarda una respuesta, expulsando la menos usada si la caché está llena"""
+        if self.max_size <= 0:
+            return
+        expires_at = time.time() + self.ttl_seconds if self.ttl_seconds > 0 else 0
+        entry = CachedResponse(vector, response, list(documents_used), expires_at)
+        key = (partition, prompt_key)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._partitions.setdefault(partition, {})[prompt_key] = entry
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+    
+    def clear(self):
+        """Vacía la caché"""
+        with self._lock:
+            self._entries.clear()
+            self._partitions.clear()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Obtiene estadísticas de uso de la caché"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate_percent": round(self.hits / total * 100, 2) if total else 0
+        }
+
+
+# Instancia global de la caché semántica de respuestas
+response_cache = SemanticResponseCache()
+
+# Instancia global del single-flight de respuestas sin historial (el tiempo límite
+# vencido es de cada petición: las que esperan a una que vence generan por su cuenta)
+chat_flights = SingleFlight(metrics_prefix="chat_single_flight", leader_errors=(DeadlineExceeded,))
 
 def tirar_dados():
     """Tira dos dados y retorna el resultado."""
@@ -147,6 +308,7 @@ def borrar_memoria_usuario(user_id: str) -> str:
     """
     try:
         success = persistent_memory.clear_user_memory(user_id)
+        entity_tracker.forget(user_id)
         if success:
             logger.info(f"Memoria borrada exitosamente para usuario {user_id}")
             return "🧹 ¡Memoria borrada! He olvidado todo lo que habíamos conversado. Empezamos de nuevo."
@@ -157,9 +319,216 @@ def borrar_memoria_usuario(user_id: str) -> str:
         logger.error(f"Error en borrar_memoria_usuario para {user_id}: {e}")
         return "❌ Error interno borrando la memoria."
 
-def chat(prompt: str, user_id: str = "default", roles=None, history_limit: int = 10, 
+@dataclass
+class ChatTurn:
+    """Estado de un turno de chat, compartido por chat() y achat()"""
+    prompt: str
+    user_id: str
+    roles: list
+    username: str
+    interaction_token: str
+    guild_id: Optional[str]
+    channel_id: Optional[str]
+    history_limit: int = HISTORY_LIMIT
+    deadline: Optional[Deadline] = None
+    start_time: float = field(default_factory=time.time)
+    memory: Any = None
+    chain: Any = None
+    inputs: Dict[str, Any] = field(default_factory=dict)
+    config: Dict[str, Any] = field(default_factory=dict)
+    documents_used: List[str] = field(default_factory=list)
+    messages: list = field(default_factory=list)
+    cached_response: Optional[str] = None
+    shared_key: Optional[Tuple[Tuple, str]] = None
+    cache_vector: Optional[np.ndarray] = None
+
+
+def _prepare_turn(turn: ChatTurn):
+    """
+    Carga la memoria del usuario y, si no hay historial, consulta la caché semántica.
+    """
+    user_id = turn.user_id
+
+    # Obtener memoria persistente del usuario
+    memory = persistent_memory.get_user_memory(user_id)
+    turn.memory = memory
+    logger.debug(f"Memoria persistente cargada para usuario {user_id}")
+
+    # Solo los últimos history_limit turnos participan en el prompt y la recuperación
+    turn.messages = recent_messages(memory.chat_memory.messages, turn.history_limit)
+    logger.debug(f"Historial de memoria para usuario {user_id}: {len(turn.messages)} mensajes")
+    
+    # Obtener chain (usando cache); es compartido por todos los workers y no se
+    # modifica: la memoria y el contexto del turno viajan en turn.inputs y turn.config
+    turn.chain = get_chain()
+    turn.config = {
+        "run_name": "chat",
+        "metadata": {"user_id": user_id, "guild_id": turn.guild_id, "channel_id": turn.channel_id},
+    }
+
+    # Sin historial la respuesta no depende del usuario: se puede compartir entre
+    # peticiones concurrentes y consultar en la caché semántica
+    if not memory.chat_memory.messages:
+        _set_shared_key(turn)
+        if RESPONSE_CACHE_ENABLED and turn.shared_key is not None:
+            _lookup_cached_response(turn)
+
+
+def _retrieval_context(turn: ChatTurn) -> RetrievalContext:
+    """
+    Contexto de recuperación del turno: historial reciente y entidades mencionadas.
+    """
+    # Las entidades se actualizan solo con los mensajes nuevos de la conversación
+    entities = entity_tracker.update(turn.user_id, turn.memory.chat_memory.messages)
+    history = "\n".join(format_message(message) for message in turn.messages)
+    return RetrievalContext(history=history, entities=entities, guild_id=turn.guild_id)
+
+
+def _build_prompt(turn: ChatTurn, relevant_docs: list):
+    """
+    Arma las entradas del chain dentro del presupuesto de tokens.
+    """
+    if relevant_docs:
+        logger.debug(f"Documentos relevantes encontrados: {len(relevant_docs)}")
+    else:
+        logger.debug("No se encontraron documentos relevantes")
+
+    # El historial va una sola vez
+    built = prompt_builder.build(turn.prompt, relevant_docs, turn.messages, turn.roles)
+    turn.inputs = built.inputs
+    turn.documents_used = [doc.metadata.get('source', 'unknown') for doc in built.documents]
+    metrics_collector.record_value("chat_prompt_tokens", built.total_tokens)
+    logger.debug(f"Prompt de ~{built.total_tokens} tokens: {built.tokens}, "
+                 f"{built.history_messages} mensajes de historial, {len(built.documents)} documentos")
+
+
+def _retrieve_context(turn: ChatTurn):
+    """
+    Recupera los documentos una sola vez por turno (con el historial si existe) y arma el prompt.
+    """
+    relevant_docs = get_enhanced_documents(turn.prompt, _retrieval_context(turn))
+    _build_prompt(turn, relevant_docs)
+
+
+def _set_shared_key(turn: ChatTurn):
+    """
+    Clave de las respuestas que no dependen del usuario: prompt normalizado más
+    el contexto compartido (servidor, roles y huella de la base de conocimiento).
+    """
+    try:
+        roles = tuple(sorted(str(role) for role in turn.roles or []))
+        partition = (turn.guild_id, roles, get_knowledge_fingerprint(turn.guild_id))
+    except Exception as e:
+        logger.warning(f"No se pudo calcular la clave compartida del prompt: {e}")
+        return
+    turn.shared_key = (partition, " ".join(turn.prompt.lower().split()))
+
+
+def _lookup_cached_response(turn: ChatTurn):
+    """
+    Busca una respuesta cacheada para el prompt; si no la hay, deja preparado el
+    embedding para guardar la respuesta generada.
+    """
+    partition, prompt_key = turn.shared_key
+    try:
+        vector = SemanticResponseCache.normalize(embed_text(turn.prompt))
+    except Exception as e:
+        logger.warning(f"No se pudo consultar la caché de respuestas: {e}")
+        return
+    
+    cached = response_cache.get(partition, prompt_key, vector)
+    if cached is not None:
+        logger.info(f"Respuesta servida desde la caché semántica para usuario {turn.user_id}")
+        turn.cached_response = cached.response
+        turn.documents_used = cached.documents_used
+        return
+    turn.cache_vector = vector
+
+
+def _store_turn_context(turn: ChatTurn, response: str):
+    """Almacena el contexto de la consulta para /context"""
+    context = QueryContext(
+        user_id=turn.user_id,
+        username=turn.username,
+        prompt=turn.prompt,
+        response=response,
+        timestamp=turn.start_time,
+        roles=turn.roles or [],
+        documents_used=turn.documents_used,
+        processing_time=time.time() - turn.start_time,
+        model_used=MODEL_NAME,
+        interaction_token=turn.interaction_token,
+        guild_id=turn.guild_id,
+        channel_id=turn.channel_id
+    )
+    context_storage.store_context(context)
+
+
+def _complete_turn(turn: ChatTurn, response_text: str) -> str:
+    """
+    Guarda el intercambio en la memoria del usuario y el contexto de la consulta.
+    """
+    logger.debug(f"Respuesta generada: {len(response_text)} caracteres")
+
+    # Actualizar memoria, conservando solo los últimos history_limit turnos
+    turn.memory.chat_memory.add_user_message(turn.prompt)
+    turn.memory.chat_memory.add_ai_message(response_text)
+    max_messages = max(0, turn.history_limit) * 2
+    trimmed = len(turn.memory.chat_memory.messages) - max_messages
+    if trimmed > 0:
+        del turn.memory.chat_memory.messages[:trimmed]
+        entity_tracker.trim(turn.user_id, trimmed)
+    logger.debug("Memoria actualizada")
+    
+    # Guardar memoria persistente
+    persistent_memory.save_user_memory(turn.user_id, turn.memory)
+    logger.debug("Memoria persistente guardada")
+
+    # Usar la respuesta directamente sin aviso
+    final_response = str(response_text)
+    
+    # Guardar en la caché semántica si el turno era elegible
+    if turn.cache_vector is not None:
+        partition, prompt_key = turn.shared_key
+        response_cache.put(partition, prompt_key, turn.cache_vector, final_response, turn.documents_used)
+    
+    # Almacenar contexto de la consulta
+    try:
+        _store_turn_context(turn, final_response)
+        logger.debug(f"Contexto almacenado para usuario {turn.user_id}")
+    except Exception as e:
+        logger.error(f"Error almacenando contexto: {e}")
+    
+    logger.info(f"Chat completado exitosamente para usuario {turn.user_id}")
+    return final_response
+
+
+def _check_deadline(turn: ChatTurn, stage: str):
+    """Abandona el turno si su tiempo límite ya venció"""
+    if turn.deadline is not None:
+        turn.deadline.check(stage)
+
+
+def _fail_turn(turn: ChatTurn, error: Exception) -> str:
+    """
+    Construye el mensaje de error y almacena el contexto de la consulta fallida.
+    """
+    error_msg = f"❌ Error procesando tu mensaje: {str(error)}"
+    logger.error(f"Error en chat para usuario {turn.user_id}: {error}", exc_info=True)
+    
+    # Almacenar contexto incluso en caso de error
+    try:
+        _store_turn_context(turn, error_msg)
+    except Exception as storage_error:
+        logger.error(f"Error almacenando contexto de error: {storage_error}")
+    
+    return error_msg
+
+
+def chat(prompt: str, user_id: str = "default", roles=None, history_limit: int = HISTORY_LIMIT, 
          username: str = "Unknown", interaction_token: str = "", guild_id: str = None, 
-         channel_id: str = None) -> str:
+         channel_id: str = None, on_token: Optional[Callable[[str], None]] = None,
+         deadline: Optional[Deadline] = None) -> str:
     """
     Función principal de chat que maneja las conversaciones con el bot.
     
@@ -167,140 +536,266 @@ def chat(prompt: str, user_id: str = "default", roles=None, history_limit: int =
         prompt (str): Mensaje del usuario
         user_id (str): ID del usuario para memoria
         roles (list): Roles del usuario en Discord
-        history_limit (int): Límite de historial a mantener
+        history_limit (int): Turnos de historial que se conservan y se envían al LLM
         username (str): Nombre del usuario
         interaction_token (str): Token de la interacción de Discord
         guild_id (str): ID del servidor de Discord
         channel_id (str): ID del canal de Discord
+        on_token (callable): Si se indica, la respuesta se genera en streaming y
+            se llama con cada fragmento a medida que llega
+        deadline (Deadline): Tiempo límite; se comprueba antes de la recuperación,
+            antes de llamar al LLM y entre fragmentos en streaming
         
     Returns:
         str: Respuesta del bot
-    """
-    global USER_MEMORIES
     
+    Raises:
+        DeadlineExceeded: Si el tiempo límite vence antes de tener la respuesta
+    """
     logger.info(f"Iniciando chat para usuario {user_id} con prompt: {prompt[:50]}...")
-    
-    # Variables para almacenar contexto
-    start_time = time.time()
-    documents_used = []
-    model_used = MODEL_NAME
+    turn = ChatTurn(prompt, user_id, roles, username, interaction_token, guild_id, channel_id, history_limit,
+                    deadline)
     
     try:
-        # Obtener memoria persistente del usuario
-        memory = persistent_memory.get_user_memory(user_id)
-        logger.debug(f"Memoria persistente cargada para usuario {user_id}")
-
-        # Obtener historial de memoria
-        mem_vars = memory.load_memory_variables({})
-        history = mem_vars.get("chat_history", "")
-        logger.debug(f"Historial de memoria para usuario {user_id}: {len(history)} caracteres")
-        
-        # Obtener chain (usando cache)
-        chain = get_chain()
-        
-        # Asignar memoria si el chain lo permite
-        if hasattr(chain, 'memory'):
-            chain.memory = memory
-
-        # Construir el prompt completo
-        roles_info = ""
-        if roles:
-            roles_info = f"Roles del usuario: {', '.join([str(r) for r in roles])}\n"
-            logger.debug(f"Roles del usuario {user_id}: {roles}")
-
-        if history:
-            full_prompt = f"{roles_info}{history}\nUSUARIO: {prompt}\n"
-        else:
-            full_prompt = f"{roles_info}USUARIO: {prompt}\n"
+        _prepare_turn(turn)
+        if turn.cached_response is not None:
+            return _complete_turn(turn, turn.cached_response)
 
-        # Crear el contexto con el historial
-        context_with_history = {
-            "input": full_prompt,
-            "history": history if history else "No hay historial previo."
-        }
+        def generate() -> Tuple[str, List[str]]:
+            _check_deadline(turn, "la recuperación")
+            _retrieve_context(turn)
+            
+            # Procesar con el chain
+            _check_deadline(turn, "la llamada al LLM")
+            logger.info("Procesando con el chain de chat")
+            if on_token is None:
+                # La llamada síncrona no se puede interrumpir: solo se comprueba antes
+                return turn.chain.invoke(turn.inputs, config=turn.config), turn.documents_used
+            chunks = []
+            for chunk in turn.chain.stream(turn.inputs, config=turn.config):
+                _check_deadline(turn, "terminar la respuesta")
+                chunks.append(chunk)
+                on_token(chunk)
+            return "".join(chunks), turn.documents_used
 
-        # Usar el retriever mejorado con el historial (solo si hay historial)
-        if history:
-            logger.debug("Configurando historial para RAG mejorado")
-            set_history(history)
-            relevant_docs = get_enhanced_documents(prompt)
-            if relevant_docs:
-                context_text = "\n".join([doc.page_content for doc in relevant_docs])
-                context_with_history["context"] = context_text
-                documents_used = [doc.metadata.get('source', 'unknown') for doc in relevant_docs]
-                logger.debug(f"Documentos relevantes encontrados: {len(relevant_docs)}")
-            else:
-                logger.debug("No se encontraron documentos relevantes")
-
-        # Procesar con el chain
-        logger.info("Procesando con el chain de chat")
-        result = chain.invoke(context_with_history)
-        response_text = result.get("answer") or str(result)
-        logger.debug(f"Respuesta generada: {len(response_text)} caracteres")
-
-        # Actualizar memoria
-        memory.chat_memory.add_user_message(prompt)
-        memory.chat_memory.add_ai_message(response_text)
-        logger.debug("Memoria actualizada")
+        # Las peticiones idénticas en curso comparten la recuperación y la llamada al LLM
+        if turn.shared_key is None:
+            response_text, _ = generate()
+        else:
+            response_text, turn.documents_used = chat_flights.do(turn.shared_key, generate)
+        return _complete_turn(turn, response_text)
         
-        # Guardar memoria persistente
-        persistent_memory.save_user_memory(user_id, memory)
-        logger.debug("Memoria persistente guardada")
+    except DeadlineExceeded as e:
+        logger.warning(f"Chat abandonado para usuario {user_id}: {e}")
+        raise
+    except Exception as e:
+        return _fail_turn(turn, e)
 
-        # Usar la respuesta directamente sin aviso
-        final_response = str(response_text)
-        
-        # Calcular tiempo de procesamiento
-        processing_time = time.time() - start_time
+
+async def achat(prompt: str, user_id: str = "default", roles=None, history_limit: int = HISTORY_LIMIT,
+                username: str = "Unknown", interaction_token: str = "", guild_id: str = None,
+                channel_id: str = None,
+                on_token: Optional[Callable[[str], Awaitable[None]]] = None,
+                deadline: Optional[Deadline] = None) -> str:
+    """
+    Variante asíncrona de chat(): la llamada al LLM usa `ainvoke` (o `astream` si se
+    indica `on_token`) y no ocupa un hilo mientras espera la respuesta del proveedor.
+    
+    La recuperación y la memoria persistente (CPU y disco) se ejecutan en el pool
+    de hilos por defecto para no bloquear el event loop. Mismos argumentos que chat();
+    al vencer `deadline` la generación en curso se cancela.
+    
+    Returns:
+        str: Respuesta del bot
+    
+    Raises:
+        DeadlineExceeded: Si el tiempo límite vence antes de tener la respuesta
+    """
+    logger.info(f"Iniciando chat asíncrono para usuario {user_id} con prompt: {prompt[:50]}...")
+    turn = ChatTurn(prompt, user_id, roles, username, interaction_token, guild_id, channel_id, history_limit,
+                    deadline)
+    
+    try:
+        await asyncio.to_thread(_prepare_turn, turn)
+        if turn.cached_response is not None:
+            return await asyncio.to_thread(_complete_turn, turn, turn.cached_response)
+
+        async def generate() -> Tuple[str, List[str]]:
+            _check_deadline(turn, "la recuperación")
+            await asyncio.to_thread(_retrieve_context, turn)
+            
+            _check_deadline(turn, "la llamada al LLM")
+            logger.info("Procesando con el chain de chat (async)")
+            if on_token is None:
+                return await turn.chain.ainvoke(turn.inputs, config=turn.config), turn.documents_used
+            chunks = []
+            async for chunk in turn.chain.astream(turn.inputs, config=turn.config):
+                chunks.append(chunk)
+                await on_token(chunk)
+            return "".join(chunks), turn.documents_used
+
+        # Las peticiones idénticas en curso comparten la recuperación y la llamada al LLM
+        # (al vencer el tiempo límite se cancela la generación, incluida la llamada al LLM)
+        if turn.shared_key is None:
+            response_text, _ = await wait_with_deadline(generate(), deadline, "la generación")
+        else:
+            response_text, turn.documents_used = await wait_with_deadline(
+                chat_flights.ado(turn.shared_key, generate), deadline, "la generación")
+        return await asyncio.to_thread(_complete_turn, turn, response_text)
         
-        # Almacenar contexto de la consulta
+    except DeadlineExceeded as e:
+        logger.warning(f"Chat abandonado para usuario {user_id}: {e}")
+        raise
+    except Exception as e:
+        return await asyncio.to_thread(_fail_turn, turn, e)
+
+
+def _start_batch(requests: List[Dict[str, Any]]) -> Tuple[List[ChatTurn], List[Any], Dict[Any, List[int]]]:
+    """
+    Prepara un lote de turnos: memoria y caché de cada uno y una sola recuperación
+    vectorizada para los que necesitan al LLM.
+    
+    Returns:
+        Tupla (turnos, resultado ya conocido de cada turno o None, grupos de turnos
+        a generar). Los turnos de un grupo comparten clave (misma pregunta sin
+        historial en el mismo contexto) y se generan una sola vez.
+    """
+    turns = [ChatTurn(**request) for request in requests]
+    outcomes: List[Any] = [None] * len(turns)
+    
+    groups: Dict[Any, List[int]] = {}
+    for i, turn in enumerate(turns):
         try:
-            context = QueryContext(
-                user_id=user_id,
-                username=username,
-                prompt=prompt,
-                response=final_response,
-                timestamp=start_time,
-                roles=roles or [],
-                documents_used=documents_used,
-                processing_time=processing_time,
-                model_used=model_used,
-                interaction_token=interaction_token,
-                guild_id=guild_id,
-                channel_id=channel_id
-            )
-            context_storage.store_context(context)
-            logger.debug(f"Contexto almacenado para usuario {user_id}")
+            _prepare_turn(turn)
+            if turn.cached_response is not None:
+                outcomes[i] = turn.cached_response
+                continue
+            _check_deadline(turn, "la recuperación")
         except Exception as e:
-            logger.error(f"Error almacenando contexto: {e}")
-        
-        logger.info(f"Chat completado exitosamente para usuario {user_id}")
-        return final_response
-        
+            outcomes[i] = e
+            continue
+        groups.setdefault(turn.shared_key or i, []).append(i)
+    
+    leaders = [turns[members[0]] for members in groups.values()]
+    try:
+        relevant_docs = get_enhanced_documents_batch([turn.prompt for turn in leaders],
+                                                     [_retrieval_context(turn) for turn in leaders])
+        for turn, docs in zip(leaders, relevant_docs):
+            _build_prompt(turn, docs)
     except Exception as e:
-        # Manejo de errores
-        error_msg = f"❌ Error procesando tu mensaje: {str(e)}"
-        logger.error(f"Error en chat para usuario {user_id}: {e}", exc_info=True)
-        
-        # Almacenar contexto incluso en caso de error
-        try:
-            processing_time = time.time() - start_time
-            context = QueryContext(
-                user_id=user_id,
-                username=username,
-                prompt=prompt,
-                response=error_msg,
-                timestamp=start_time,
-                roles=roles or [],
-                documents_used=documents_used,
-                processing_time=processing_time,
-                model_used=model_used,
-                interaction_token=interaction_token,
-                guild_id=guild_id,
-                channel_id=channel_id
-            )
-            context_storage.store_context(context)
-        except Exception as storage_error:
-            logger.error(f"Error almacenando contexto de error: {storage_error}")
-        
-        return error_msg
+        for members in groups.values():
+            for i in members:
+                outcomes[i] = e
+        return turns, outcomes, {}
+    
+    # Los turnos que ya vencieron no llegan al LLM; un grupo sigue mientras le
+    # quede algún turno vigente, que pasa a ser su primer turno
+    for key, members in list(groups.items()):
+        live = []
+        for i in members:
+            try:
+                _check_deadline(turns[i], "la llamada al LLM")
+                live.append(i)
+            except DeadlineExceeded as e:
+                outcomes[i] = e
+        if not live:
+            del groups[key]
+            continue
+        if live[0] != members[0]:
+            # El prompt armado es el mismo para todo el grupo (misma pregunta sin historial)
+            turns[live[0]].inputs = turns[members[0]].inputs
+            turns[live[0]].documents_used = turns[members[0]].documents_used
+        groups[key] = live
+    return turns, outcomes, groups
+
+
+def _batch_configs(turns: List[ChatTurn], groups: Dict[Any, List[int]], max_concurrency: int) -> Tuple[list, list]:
+    """Entradas y configs del chain para el primer turno de cada grupo"""
+    leaders = [turns[members[0]] for members in groups.values()]
+    configs = [{**turn.config, "max_concurrency": max_concurrency} for turn in leaders]
+    return [turn.inputs for turn in leaders], configs
+
+
+def _finish_batch(turns: List[ChatTurn], outcomes: List[Any], groups: Dict[Any, List[int]],
+                  outputs: List[Any], check_deadlines: bool = False) -> List[Union[str, DeadlineExceeded]]:
+    """
+    Reparte las respuestas generadas a los turnos de cada grupo y completa cada turno.
+    
+    Con `check_deadlines`, los turnos cuyo tiempo límite venció durante la generación
+    se abandonan aunque su grupo tenga respuesta (la esperaba otro turno vigente).
+    """
+    for members, output in zip(groups.values(), outputs):
+        for i in members:
+            outcomes[i] = output
+            turns[i].documents_used = turns[members[0]].documents_used
+            if check_deadlines and not isinstance(output, Exception):
+                try:
+                    _check_deadline(turns[i], "terminar la respuesta")
+                except DeadlineExceeded as e:
+                    outcomes[i] = e
+    
+    results: List[Union[str, DeadlineExceeded]] = []
+    for turn, outcome in zip(turns, outcomes):
+        if isinstance(outcome, DeadlineExceeded):
+            logger.warning(f"Chat abandonado para usuario {turn.user_id}: {outcome}")
+            results.append(outcome)
+        elif isinstance(outcome, Exception):
+            results.append(_fail_turn(turn, outcome))
+        else:
+            results.append(_complete_turn(turn, outcome))
+    return results
+
+
+def chat_batch(requests: List[Dict[str, Any]], max_concurrency: int = 8) -> List[Union[str, DeadlineExceeded]]:
+    """
+    Procesa varios mensajes a la vez: recuperación vectorizada para todos y una
+    llamada `chain.batch` con como mucho `max_concurrency` generaciones simultáneas.
+    
+    Args:
+        requests: Argumentos de cada turno (prompt, user_id, roles, username,
+            interaction_token, guild_id, channel_id y, opcionalmente, history_limit y deadline)
+        max_concurrency: Llamadas al LLM en paralelo dentro del lote
+    
+    Returns:
+        List: Respuesta de cada mensaje, en el mismo orden, o DeadlineExceeded si venció
+    """
+    logger.info(f"Iniciando chat en lote con {len(requests)} mensajes")
+    turns, outcomes, groups = _start_batch(requests)
+    outputs = []
+    if groups:
+        inputs, configs = _batch_configs(turns, groups, max_concurrency)
+        logger.info(f"Procesando {len(inputs)} generaciones con el chain de chat (batch)")
+        outputs = get_chain().batch(inputs, config=configs, return_exceptions=True)
+    return _finish_batch(turns, outcomes, groups, outputs)
+
+
+async def achat_batch(requests: List[Dict[str, Any]],
+                      max_concurrency: int = 8) -> List[Union[str, DeadlineExceeded]]:
+    """
+    Variante asíncrona de chat_batch() con una llamada `ainvoke` por grupo y como
+    mucho `max_concurrency` en paralelo. La preparación y la recuperación se
+    ejecutan en el pool de hilos; la generación de cada grupo se cancela cuando
+    vence el tiempo límite más tardío de sus turnos.
+    """
+    logger.info(f"Iniciando chat asíncrono en lote con {len(requests)} mensajes")
+    turns, outcomes, groups = await asyncio.to_thread(_start_batch, requests)
+    outputs = []
+    if groups:
+        inputs, configs = _batch_configs(turns, groups, max_concurrency)
+        chain = get_chain()
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def generate(members: List[int], group_inputs: Dict[str, Any], config: Dict[str, Any]) -> Any:
+            deadlines = [turns[i].deadline for i in members]
+            deadline = None if None in deadlines else max(deadlines, key=lambda d: d.expires_at)
+            try:
+                async with semaphore:
+                    return await wait_with_deadline(chain.ainvoke(group_inputs, config=config),
+                                                    deadline, "la generación en lote")
+            except Exception as e:
+                return e
+
+        logger.info(f"Procesando {len(inputs)} generaciones con el chain de chat (ainvoke)")
+        outputs = await asyncio.gather(*(generate(members, group_inputs, config) for members, group_inputs, config
+                                         in zip(groups.values(), inputs, configs)))
+    return await asyncio.to_thread(_finish_batch, turns, outcomes, groups, outputs, True)
@@ -0,0 +1,155 @@
+"""
+Modelo de chat simulado para pruebas de rendimiento sin llamar a un proveedor real
+"""
+
+import asyncio
+import math
+import random
+import re
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+from pydantic import PrivateAttr
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from config.settings import (
+    FAKE_LLM_LATENCY_PROFILE,
+    FAKE_LLM_LATENCY_SECONDS,
+    FAKE_LLM_LATENCY_SIGMA,
+    FAKE_LLM_FIRST_TOKEN_SHARE,
+    FAKE_LLM_ERROR_RATE,
+    FAKE_LLM_RESPONSES,
+    FAKE_LLM_REPLAY_LIMIT,
+    FAKE_LLM_SEED,
+)
+from src.utils.logger import logger
+
+LATENCY_PROFILES = ("fixed", "lognormal", "replay")
+
+
+class FakeLLMError(RuntimeError):
+    """Error inyectado por el modelo simulado"""
+
+
+def load_replay_latencies(limit: int = FAKE_LLM_REPLAY_LIMIT) -> List[float]:
+    """
+    Tiempos de procesamiento registrados en el almacenamiento de contextos (/context).
+    """
+    from src.utils.context_storage import context_storage
+    return [context.processing_time for context in context_storage.get_all_contexts(limit)
+            if context.processing_time > 0]
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Modelo de chat con latencia, errores y respuestas configurables.
+
+    La latencia de cada llamada sale del perfil elegido: `fixed` (siempre
+    `latency_seconds`), `lognormal` (mediana `latency_seconds` y dispersión
+    `latency_sigma`) o `replay` (muestreo de tiempos reales registrados). En
+    streaming el primer token llega tras `first_token_share` de esa latencia y el
+    resto se reparte entre los demás tokens. Con `seed` la secuencia es reproducible.
+    """
+
+    latency_profile: str = FAKE_LLM_LATENCY_PROFILE
+    latency_seconds: float = FAKE_LLM_LATENCY_SECONDS
+    latency_sigma: float = FAKE_LLM_LATENCY_SIGMA
+    first_token_share: float = FAKE_LLM_FIRST_TOKEN_SHARE
+    error_rate: float = FAKE_LLM_ERROR_RATE
+    responses: List[str] = list(FAKE_LLM_RESPONSES)
+    replay_latencies: List[float] = []
+    seed: Optional[int] = FAKE_LLM_SEED
+
+    _rng: random.Random = PrivateAttr()
+    _calls: int = PrivateAttr(default=0)
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        if self.latency_profile not in LATENCY_PROFILES:
+            raise ValueError(f"Perfil de latencia desconocido: {self.latency_profile}. "
+                             f"Opciones: {', '.join(LATENCY_PROFILES)}")
+        if self.latency_profile == "replay" and not self.replay_latencies:
+            self.replay_latencies = load_replay_latencies()
+            if not self.replay_latencies:
+                logger.warning("No hay tiempos registrados para el perfil replay; se usa latencia fija")
+                self.latency_profile = "fixed"
+        self._rng = random.Random(self.seed)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def _sample_latency(self) -> float:
+        """Latencia total de una llamada según el perfil"""
+        if self.latency_profile == "lognormal":
+            return self._rng.lognormvariate(math.log(max(self.latency_seconds, 1e-6)), self.latency_sigma)
+        if self.latency_profile == "replay":
+            return self._rng.choice(self.replay_latencies)
+        return self.latency_seconds
+
+    def _plan(self) -> tuple:
+        """Latencia, respuesta y si la llamada debe fallar"""
+        self._calls += 1
+        latency = self._sample_latency()
+        response = self.responses[(self._calls - 1) % len(self.responses)] if self.responses else ""
+        fails = self._rng.random() < self.error_rate
+        return latency, response, fails
+
+    @staticmethod
+    def _tokens(text: str) -> List[str]:
+        """Divide la respuesta en tokens (palabras con su espacio)"""
+        return re.findall(r"\S+\s*", text) or [text]
+
+    def _token_delays(self, latency: float, tokens: List[str]) -> List[float]:
+        """Espera antes de cada token: el primero tras su parte de la latencia, el resto repartido"""
+        first = latency * self.first_token_share
+        rest = (latency - first) / max(len(tokens) - 1, 1)
+        return [first] + [rest] * (len(tokens) - 1)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        latency, response, fails = self._plan()
+        time.sleep(latency)
+        if fails:
+            raise FakeLLMError("Error simulado del proveedor")
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=response))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                         **kwargs: Any) -> ChatResult:
+        latency, response, fails = self._plan()
+        await asyncio.sleep(latency)
+        if fails:
+            raise FakeLLMError("Error simulado del proveedor")
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=response))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None,
+                **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        latency, response, fails = self._plan()
+        tokens = self._tokens(response)
+        for position, (delay, token) in enumerate(zip(self._token_delays(latency, tokens), tokens)):
+            time.sleep(delay)
+            if fails and position == 0:
+                raise FakeLLMError("Error simulado del proveedor")
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        latency, response, fails = self._plan()
+        tokens = self._tokens(response)
+        for position, (delay, token) in enumerate(zip(self._token_delays(latency, tokens), tokens)):
+            await asyncio.sleep(delay)
+            if fails and position == 0:
+                raise FakeLLMError("Error simulado del proveedor")
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
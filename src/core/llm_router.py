@@ -0,0 +1,386 @@
+"""
+Enrutador de proveedores de LLM con peticiones de respaldo (hedging), failover
+y circuit breaker por proveedor
+"""
+
+import asyncio
+import concurrent.futures
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+import numpy as np
+from pydantic import SecretStr
+from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables import Runnable, RunnableConfig
+from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_openai import ChatOpenAI
+from langchain_ollama import ChatOllama
+
+from config.settings import (
+    LLM_HEDGE_PERCENTILE,
+    LLM_HEDGE_INITIAL_DELAY_SECONDS,
+    LLM_HEDGE_MIN_SAMPLES,
+    LLM_CIRCUIT_FAILURE_THRESHOLD,
+    LLM_CIRCUIT_RESET_SECONDS,
+)
+from src.core.fake_llm import FakeChatModel, LATENCY_PROFILES
+from src.utils.logger import logger
+from src.utils.metrics import metrics_collector
+
+# Marca de fin de stream sin ningún fragmento
+_END_OF_STREAM = object()
+
+ALL_CIRCUITS_OPEN_MESSAGE = "Todos los proveedores de LLM están fallando (circuitos abiertos)"
+
+
+def create_chat_model(provider: str, model_name: str) -> BaseChatModel:
+    """
+    Crea el modelo de chat de un proveedor.
+
+    Args:
+        provider: ollama, openai, gemini o fake
+        model_name: Modelo específico del proveedor (en fake, opcionalmente el perfil de latencia)
+
+    Returns:
+        BaseChatModel: Modelo de LangChain
+
+    Raises:
+        ValueError: Si falta la API key del proveedor
+    """
+    if provider == "fake":
+        if model_name in LATENCY_PROFILES:
+            return FakeChatModel(latency_profile=model_name)
+        return FakeChatModel()
+    if provider == "ollama":
+        return ChatOllama(model=model_name)
+    if provider == "openai":
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise ValueError("Error: Falta OPENAI_API_KEY en el entorno.")
+        return ChatOpenAI(model=model_name, api_key=SecretStr(api_key))
+
+    # google
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        raise ValueError("Error: Falta GOOGLE_API_KEY en el entorno.")
+    return ChatGoogleGenerativeAI(model=model_name, google_api_key=api_key)
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker por proveedor: tras `failure_threshold` errores seguidos se abre
+    durante `reset_seconds` y después deja pasar una petición de prueba.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = LLM_CIRCUIT_FAILURE_THRESHOLD,
+                 reset_seconds: float = LLM_CIRCUIT_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """closed, open o half_open"""
+        if self.consecutive_failures < self.failure_threshold:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_seconds:
+            return "open"
+        return "half_open"
+
+    def allow_request(self) -> bool:
+        """Indica si se puede enviar una petición al proveedor"""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open":
+                # Una sola petición de prueba por periodo: se vuelve a armar el temporizador
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        """Cierra el circuito tras una respuesta correcta"""
+        with self._lock:
+            if self.consecutive_failures >= self.failure_threshold:
+                logger.info(f"Circuito del proveedor {self.name} cerrado")
+            self.consecutive_failures = 0
+
+    def record_failure(self):
+        """Cuenta un error y abre el circuito al llegar al umbral"""
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                metrics_collector.increment_counter("llm_circuit_open_total", labels={"provider": self.name})
+                logger.warning(f"Circuito del proveedor {self.name} abierto durante {self.reset_seconds}s "
+                               f"tras {self.consecutive_failures} errores seguidos")
+
+
+class LLMProvider:
+    """Un modelo de chat con su circuit breaker y su historial de latencias"""
+
+    def __init__(self, name: str, model: BaseChatModel):
+        self.name = name
+        self.model = model
+        self.breaker = CircuitBreaker(name)
+        # Latencias de respuestas completas y de primer token (streaming), en segundos
+        self._latencies = {"invoke": deque(maxlen=200), "stream": deque(maxlen=200)}
+
+    def record_latency(self, seconds: float, mode: str = "invoke"):
+        self._latencies[mode].append(seconds)
+        metrics_collector.record_value("llm_request_time_ms", seconds * 1000,
+                                       labels={"provider": self.name, "mode": mode})
+
+    def hedge_delay(self, mode: str = "invoke") -> float:
+        """Espera antes de lanzar una petición de respaldo: el percentil configurado de la latencia"""
+        latencies = self._latencies[mode]
+        if len(latencies) < LLM_HEDGE_MIN_SAMPLES:
+            return LLM_HEDGE_INITIAL_DELAY_SECONDS
+        return float(np.percentile(latencies, LLM_HEDGE_PERCENTILE))
+
+
+class LLMRouter(Runnable):
+    """
+    Runnable que reparte las llamadas entre varios proveedores de LLM.
+
+    Se usa el primer proveedor con el circuito cerrado; si tarda más que su
+    percentil de latencia (`LLM_HEDGE_PERCENTILE`) se lanza la misma petición al
+    siguiente, se usa la primera respuesta y se cancela la otra. Si un proveedor
+    falla se pasa al siguiente de inmediato. En streaming la carrera es por el
+    primer token. La versión síncrona no puede cancelar la petición perdedora
+    (se descarta su resultado).
+    """
+
+    def __init__(self, providers: List[LLMProvider]):
+        if not providers:
+            raise ValueError("El enrutador de LLM necesita al menos un proveedor")
+        self.providers = providers
+        self._executor = concurrent.futures.ThreadPoolExecutor(thread_name_prefix="LLMHedge")
+
+    @staticmethod
+    def _next_provider(candidates: List[LLMProvider]) -> Optional[LLMProvider]:
+        """
+        Saca de `candidates` el siguiente proveedor con el circuito cerrado (o en prueba).
+
+        El circuit breaker se consulta solo para el proveedor que se va a llamar: en
+        half_open cada consulta gasta la petición de prueba y rearma el temporizador.
+        """
+        while candidates:
+            provider = candidates.pop(0)
+            if provider.breaker.allow_request():
+                return provider
+        return None
+
+    def _call(self, provider: LLMProvider, input: Any, config: Optional[RunnableConfig], **kwargs) -> Any:
+        """Llamada síncrona a un proveedor registrando latencia y errores"""
+        start_time = time.monotonic()
+        try:
+            result = provider.model.invoke(input, config, **kwargs)
+        except Exception:
+            provider.breaker.record_failure()
+            raise
+        provider.breaker.record_success()
+        provider.record_latency(time.monotonic() - start_time)
+        return result
+
+    async def _acall(self, provider: LLMProvider, input: Any, config: Optional[RunnableConfig], **kwargs) -> Any:
+        """Llamada asíncrona a un proveedor registrando latencia y errores"""
+        start_time = time.monotonic()
+        try:
+            result = await provider.model.ainvoke(input, config, **kwargs)
+        except asyncio.CancelledError:
+            raise  # Petición perdedora de una carrera: no cuenta como error
+        except Exception:
+            provider.breaker.record_failure()
+            raise
+        provider.breaker.record_success()
+        provider.record_latency(time.monotonic() - start_time)
+        return result
+
+    @staticmethod
+    def _log_backup(reason: str, provider: LLMProvider):
+        """Registra el lanzamiento de una petición de respaldo o de failover"""
+        metric = "llm_hedged_requests_total" if reason == "hedge" else "llm_failovers_total"
+        metrics_collector.increment_counter(metric, labels={"provider": provider.name})
+        logger.info(f"Petición de {'respaldo' if reason == 'hedge' else 'failover'} al proveedor {provider.name}")
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        candidates = list(self.providers)
+        futures = {}
+        last_error: Optional[BaseException] = None
+
+        def launch(reason: Optional[str] = None) -> Optional[float]:
+            provider = self._next_provider(candidates)
+            if provider is None:
+                return None
+            if reason:
+                self._log_backup(reason, provider)
+            futures[self._executor.submit(self._call, provider, input, config, **kwargs)] = provider
+            return provider.hedge_delay()
+
+        delay = launch()
+        if not futures:
+            raise RuntimeError(ALL_CIRCUITS_OPEN_MESSAGE)
+        while futures:
+            done, _ = concurrent.futures.wait(futures, timeout=delay if candidates else None,
+                                              return_when=concurrent.futures.FIRST_COMPLETED)
+            if not done:
+                delay = launch("hedge")
+                continue
+            for future in done:
+                provider = futures.pop(future)
+                if future.exception() is None:
+                    for pending in futures:
+                        pending.cancel()
+                    if provider is not self.providers[0]:
+                        metrics_collector.increment_counter("llm_hedge_wins_total", labels={"provider": provider.name})
+                    return future.result()
+                last_error = future.exception()
+                logger.warning(f"Error del proveedor {provider.name}: {last_error}")
+            if not futures and candidates:
+                delay = launch("failover")
+        raise last_error
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        candidates = list(self.providers)
+        tasks = {}
+        last_error: Optional[BaseException] = None
+
+        def launch(reason: Optional[str] = None) -> Optional[float]:
+            provider = self._next_provider(candidates)
+            if provider is None:
+                return None
+            if reason:
+                self._log_backup(reason, provider)
+            tasks[asyncio.create_task(self._acall(provider, input, config, **kwargs))] = provider
+            return provider.hedge_delay()
+
+        delay = launch()
+        if not tasks:
+            raise RuntimeError(ALL_CIRCUITS_OPEN_MESSAGE)
+        try:
+            while tasks:
+                done, _ = await asyncio.wait(tasks, timeout=delay if candidates else None,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    delay = launch("hedge")
+                    continue
+                for task in done:
+                    provider = tasks.pop(task)
+                    if task.exception() is None:
+                        if provider is not self.providers[0]:
+                            metrics_collector.increment_counter("llm_hedge_wins_total",
+                                                                labels={"provider": provider.name})
+                        return task.result()
+                    last_error = task.exception()
+                    logger.warning(f"Error del proveedor {provider.name}: {last_error}")
+                if not tasks and candidates:
+                    delay = launch("failover")
+            raise last_error
+        finally:
+            # Cancelar las peticiones que perdieron la carrera
+            for task in tasks:
+                task.cancel()
+
+    def stream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Iterator[Any]:
+        # Sin hedging: failover al siguiente proveedor si falla antes del primer token
+        candidates = list(self.providers)
+        last_error: Optional[BaseException] = None
+        while True:
+            provider = self._next_provider(candidates)
+            if provider is None:
+                break
+            start_time = time.monotonic()
+            iterator = iter(provider.model.stream(input, config, **kwargs))
+            try:
+                first = next(iterator, _END_OF_STREAM)
+            except Exception as e:
+                provider.breaker.record_failure()
+                last_error = e
+                logger.warning(f"Error del proveedor {provider.name}: {e}")
+                continue
+            provider.breaker.record_success()
+            provider.record_latency(time.monotonic() - start_time, "stream")
+            if first is not _END_OF_STREAM:
+                yield first
+                yield from iterator
+            return
+        raise last_error or RuntimeError(ALL_CIRCUITS_OPEN_MESSAGE)
+
+    async def _afirst_chunk(self, provider: LLMProvider, stream: AsyncIterator) -> Any:
+        """Espera el primer fragmento de un stream registrando latencia y errores"""
+        start_time = time.monotonic()
+        try:
+            chunk = await stream.__anext__()
+        except StopAsyncIteration:
+            chunk = _END_OF_STREAM
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            provider.breaker.record_failure()
+            raise
+        provider.breaker.record_success()
+        provider.record_latency(time.monotonic() - start_time, "stream")
+        return chunk
+
+    async def astream(self, input: Any, config: Optional[RunnableConfig] = None,
+                      **kwargs: Any) -> AsyncIterator[Any]:
+        candidates = list(self.providers)
+        tasks = {}
+        last_error: Optional[BaseException] = None
+        winner = None
+
+        def launch(reason: Optional[str] = None) -> Optional[float]:
+            provider = self._next_provider(candidates)
+            if provider is None:
+                return None
+            if reason:
+                self._log_backup(reason, provider)
+            stream = provider.model.astream(input, config, **kwargs).__aiter__()
+            tasks[asyncio.create_task(self._afirst_chunk(provider, stream))] = (provider, stream)
+            return provider.hedge_delay("stream")
+
+        delay = launch()
+        if not tasks:
+            raise RuntimeError(ALL_CIRCUITS_OPEN_MESSAGE)
+        try:
+            while tasks and winner is None:
+                done, _ = await asyncio.wait(tasks, timeout=delay if candidates else None,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    delay = launch("hedge")
+                    continue
+                for task in done:
+                    provider, stream = tasks.pop(task)
+                    if task.exception() is None and winner is None:
+                        winner = (provider, stream, task.result())
+                    elif task.exception() is not None:
+                        last_error = task.exception()
+                        logger.warning(f"Error del proveedor {provider.name}: {last_error}")
+                if winner is None and not tasks and candidates:
+                    delay = launch("failover")
+        finally:
+            # Cancelar los streams que perdieron la carrera por el primer token
+            for task, (_, stream) in tasks.items():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                await stream.aclose()
+
+        if winner is None:
+            raise last_error
+
+        provider, stream, first = winner
+        if provider is not self.providers[0]:
+            metrics_collector.increment_counter("llm_hedge_wins_total", labels={"provider": provider.name})
+        if first is _END_OF_STREAM:
+            return
+        yield first
+        async for chunk in stream:
+            yield chunk
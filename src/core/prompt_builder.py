@@ -0,0 +1,168 @@
+"""
+Construcción del prompt del chat con un presupuesto de tokens
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+from langchain.schema import BaseMessage, Document, HumanMessage
+
+from config.settings import (
+    HISTORY_LIMIT,
+    PROMPT_TOKEN_BUDGET,
+    PROMPT_MAX_QUESTION_TOKENS,
+    PROMPT_CONTEXT_SHARE,
+)
+
+# Estimación sin tokenizador: suficiente para acotar el tamaño del prompt
+CHARS_PER_TOKEN = 4
+
+# Separador que usa el chain de "stuff documents" entre documentos
+DOCUMENT_SEPARATOR = "\n\n"
+
+NO_HISTORY_TEXT = "No hay historial previo."
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estima los tokens de un texto (redondeando hacia arriba).
+    """
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Recorta un texto para que no supere `max_tokens`, cortando en un espacio si es posible.
+    """
+    max_chars = max(0, max_tokens) * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    if max_chars <= 1:
+        return ""
+    cut = text[:max_chars - 1]
+    if " " in cut:
+        cut = cut.rsplit(" ", 1)[0]
+    return cut + "…"
+
+
+def format_message(message: BaseMessage) -> str:
+    """
+    Formatea un mensaje de la memoria como una línea del historial.
+    """
+    speaker = "USUARIO" if isinstance(message, HumanMessage) else "ASISTENTE"
+    return f"{speaker}: {message.content}"
+
+
+def recent_messages(messages: Sequence[BaseMessage], history_limit: int = HISTORY_LIMIT) -> List[BaseMessage]:
+    """
+    Últimos `history_limit` turnos (pregunta y respuesta) de la conversación.
+    """
+    if history_limit <= 0:
+        return []
+    return list(messages[-history_limit * 2:])
+
+
+@dataclass
+class BuiltPrompt:
+    """Entradas del chain y tokens estimados de cada parte del prompt"""
+    inputs: Dict[str, object]
+    documents: List[Document]
+    history_messages: int
+    tokens: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(self.tokens.values())
+
+
+class PromptBuilder:
+    """
+    Reparte un presupuesto de tokens entre el prompt de sistema, la pregunta, los
+    documentos recuperados y los turnos recientes.
+
+    El orden es fijo: la pregunta (acotada) y el sistema se reservan primero, los
+    documentos reciben `context_share` del resto en orden de relevancia y el
+    historial usa lo que quede, del turno más reciente al más antiguo. El
+    historial va una sola vez, en `{history}`; `{input}` lleva solo la pregunta.
+    """
+
+    def __init__(self, system_prompt: str, token_budget: int = PROMPT_TOKEN_BUDGET,
+                 max_question_tokens: int = PROMPT_MAX_QUESTION_TOKENS,
+                 context_share: float = PROMPT_CONTEXT_SHARE):
+        self.system_prompt = system_prompt
+        self.token_budget = token_budget
+        self.max_question_tokens = max_question_tokens
+        self.context_share = context_share
+        # Texto fijo del prompt de sistema, sin las variables
+        self.system_tokens = estimate_tokens(system_prompt.replace("{context}", "").replace("{history}", ""))
+
+    def _select_documents(self, documents: Sequence[Document], budget: int) -> List[Document]:
+        """Documentos en orden de relevancia hasta agotar el presupuesto; el último se recorta"""
+        selected = []
+        remaining = budget
+        for doc in documents:
+            cost = estimate_tokens(doc.page_content) + estimate_tokens(DOCUMENT_SEPARATOR)
+            if cost <= remaining:
+                selected.append(doc)
+                remaining -= cost
+                continue
+            content = truncate_to_tokens(doc.page_content, remaining - estimate_tokens(DOCUMENT_SEPARATOR))
+            if content:
+                selected.append(Document(page_content=content, metadata=doc.metadata))
+            break
+        return selected
+
+    def _select_history(self, messages: Sequence[BaseMessage], budget: int) -> List[str]:
+        """Líneas del historial, de la más reciente hacia atrás, que caben en el presupuesto"""
+        lines = []
+        remaining = budget
+        for message in reversed(messages):
+            line = format_message(message)
+            cost = estimate_tokens(line) + 1  # Salto de línea
+            if cost > remaining:
+                break
+            lines.append(line)
+            remaining -= cost
+        lines.reverse()
+        return lines
+
+    def build(self, question: str, documents: Sequence[Document], messages: Sequence[BaseMessage],
+              roles: Optional[Sequence] = None) -> BuiltPrompt:
+        """
+        Construye las entradas del chain dentro del presupuesto.
+
+        Args:
+            question: Pregunta actual del usuario
+            documents: Documentos recuperados, ordenados por relevancia
+            messages: Turnos recientes de la conversación (ya limitados por history_limit)
+            roles: Roles del usuario en Discord
+
+        Returns:
+            BuiltPrompt: Entradas para el chain (`input`, `history`, `context`)
+        """
+        roles_info = ""
+        if roles:
+            roles_info = f"Roles del usuario: {', '.join([str(r) for r in roles])}\n"
+        question_text = f"{roles_info}USUARIO: {truncate_to_tokens(question, self.max_question_tokens)}\n"
+        question_tokens = estimate_tokens(question_text)
+
+        remaining = max(0, self.token_budget - self.system_tokens - question_tokens)
+        context_docs = self._select_documents(documents, int(remaining * self.context_share))
+        context_tokens = sum(estimate_tokens(doc.page_content) + estimate_tokens(DOCUMENT_SEPARATOR)
+                             for doc in context_docs)
+
+        # El historial aprovecha también lo que no usaron los documentos
+        history_lines = self._select_history(messages, remaining - context_tokens)
+        history_text = "\n".join(history_lines) if history_lines else NO_HISTORY_TEXT
+
+        return BuiltPrompt(
+            inputs={"input": question_text, "history": history_text, "context": context_docs},
+            documents=context_docs,
+            history_messages=len(history_lines),
+            tokens={
+                "system": self.system_tokens,
+                "question": question_tokens,
+                "context": context_tokens,
+                "history": estimate_tokens(history_text),
+            }
+        )
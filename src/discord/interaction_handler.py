@@ -5,15 +5,34 @@ Manejador mejorado de interacciones de Discord con ACK diferido robusto
 import asyncio
 import threading
 import time
+import aiohttp
 import requests
-from typing import Dict, Any, Optional, Callable
+from typing import Dict, Any, List, Optional, Callable, Tuple
 from dataclasses import dataclass
 from enum import Enum
 import queue
 from src.utils.logger import logger
 from src.utils.metrics import metrics_collector
+from src.utils.deadline import Deadline, DeadlineExceeded
+from src.utils.keyed_serializer import KeyedSerializer
+from src.discord.streaming import StreamingMessageEditor, fit_message
 from config.discord_settings import DiscordConfig
 
+# Mensaje que recibe el usuario cuando su petición falla definitivamente
+ERROR_MESSAGE_DATA = {
+    "content": "❌ Lo siento, hubo un error procesando tu mensaje. Por favor, inténtalo de nuevo en unos momentos.",
+    "flags": 64  # Ephemeral flag
+}
+
+# Mensaje que recibe el usuario cuando su petición supera el tiempo límite
+TIMEOUT_MESSAGE_DATA = {
+    "content": "⏱️ Lo siento, tu mensaje tardó demasiado en procesarse. Por favor, inténtalo de nuevo.",
+    "flags": 64  # Ephemeral flag
+}
+
+# Los tokens de interacción de Discord dejan de valer 15 minutos después del ACK
+INTERACTION_TOKEN_TTL_SECONDS = 15 * 60
+
 class InteractionStatus(Enum):
     """Estados posibles de una interacción"""
     PENDING = "pending"
@@ -37,6 +56,9 @@ class InteractionRequest:
     retry_count: int = 0
     max_retries: int = 3
     status: InteractionStatus = InteractionStatus.PENDING
+    # Tiempo límite para generar la respuesta y validez del token para enviarla
+    deadline: Optional[Deadline] = None
+    token_deadline: Optional[Deadline] = None
 
 class DiscordInteractionHandler:
     """
@@ -51,17 +73,41 @@ class DiscordInteractionHandler:
         self.max_retries = config["max_retries"]
         self.retry_delays = config["retry_delays"]
         self.queue_max_size = config["queue_max_size"]
+        self.async_mode = config["async_mode"]
+        self.async_workers = config["async_workers"]
+        self.max_concurrent_generations = config["max_concurrent_generations"]
+        self.batch_mode = config["batch_mode"]
+        self.batch_queue_threshold = config["batch_queue_threshold"]
+        self.batch_max_size = config["batch_max_size"]
+        self.batch_max_concurrency = config["batch_max_concurrency"]
+        
+        response_config = DiscordConfig.get_response_config()
+        self.stream_responses = response_config["stream_responses"]
+        self.stream_edit_interval = response_config["stream_edit_interval_seconds"]
+        self.max_response_length = response_config["max_response_length"]
+        self.response_timeout = min(response_config["default_timeout_seconds"], INTERACTION_TOKEN_TTL_SECONDS)
         
         self.request_queue = queue.Queue(maxsize=self.queue_max_size)
         self.active_requests: Dict[str, InteractionRequest] = {}
+        # Las peticiones de un mismo usuario se procesan en serie (comparten memoria)
+        self.user_serializer = KeyedSerializer()
         self.processing_threads = []
         self.running = False
         
-        # Iniciar workers
-        self._start_workers()
+        # Estado del modo asíncrono (se crea en start_async_workers, dentro del event loop)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._async_queue: Optional[asyncio.Queue] = None
+        self._generation_semaphore: Optional[asyncio.Semaphore] = None
+        self._http_session: Optional[aiohttp.ClientSession] = None
+        self._async_tasks = []
+        self._inflight_generations = 0
         
-        # Iniciar limpieza automática de métricas
-        self._start_metrics_cleanup()
+        # Iniciar workers (en modo asíncrono se inician al arrancar FastAPI)
+        if not self.async_mode:
+            self._start_workers()
+            
+            # Iniciar limpieza automática de métricas (necesita running=True)
+            self._start_metrics_cleanup()
     
     def _start_workers(self):
         """Inicia los workers para procesar las peticiones"""
@@ -79,12 +125,135 @@ class DiscordInteractionHandler:
             try:
                 # Obtener petición de la cola con timeout
                 request = self.request_queue.get(timeout=1)
-                self._process_request(request)
-                self.request_queue.task_done()
             except queue.Empty:
                 continue
+            
+            if not self._acquire_user(request):
+                continue
+            
+            batch = self._drain_batch(request, self.request_queue)
+            if len(batch) == 1:
+                self._serve_user(request)
+                continue
+            
+            try:
+                self._process_batch(batch)
+            except Exception as e:
+                logger.error(f"Error en worker loop: {e}")
+            for request in batch:
+                self.request_queue.task_done()
+                following = self.user_serializer.release(request.user_id)
+                if following is not None:
+                    self._serve_user(following)
+    
+    def _acquire_user(self, request: InteractionRequest) -> bool:
+        """
+        Reserva al usuario de la petición. Si otro worker ya lo atiende, la petición
+        espera en la cola del usuario y devuelve False.
+        """
+        if self.user_serializer.acquire(request.user_id, request):
+            return True
+        metrics_collector.increment_counter("discord_requests_serialized")
+        logger.debug(f"Petición de {request.user_id} en espera de la anterior del mismo usuario")
+        return False
+    
+    def _serve_user(self, request: InteractionRequest):
+        """Procesa una petición y las que el usuario acumule mientras tanto"""
+        while request is not None:
+            try:
+                self._process_request(request)
             except Exception as e:
                 logger.error(f"Error en worker loop: {e}")
+            finally:
+                self.request_queue.task_done()
+            request = self.user_serializer.release(request.user_id)
+    
+    def _drain_batch(self, first: InteractionRequest, request_queue) -> List[InteractionRequest]:
+        """
+        Con la cola por encima del umbral, toma más peticiones para procesarlas en
+        lote (solo las de usuarios que nadie está atendiendo).
+        """
+        batch = [first]
+        if not self.batch_mode or request_queue.qsize() < self.batch_queue_threshold:
+            return batch
+        while len(batch) < self.batch_max_size:
+            try:
+                request = request_queue.get_nowait()
+            except (queue.Empty, asyncio.QueueEmpty):
+                break
+            if self._acquire_user(request):
+                batch.append(request)
+        return batch
+    
+    def _start_batch(self, batch: List[InteractionRequest]) -> Tuple[List[InteractionRequest], List[InteractionRequest]]:
+        """
+        Marca las peticiones del lote como en proceso y descarta las vencidas.
+        
+        Returns:
+            Tupla (peticiones dentro de su tiempo límite, peticiones vencidas a las que avisar)
+        """
+        metrics_collector.record_value("discord_batch_size", len(batch))
+        logger.info(f"Procesando lote de {len(batch)} peticiones (cola: {self.get_queue_size()})")
+        live, expired = [], []
+        for request in batch:
+            request.status = InteractionStatus.PROCESSING
+            self.active_requests[f"{request.interaction_token}_{request.user_id}"] = request
+            metrics_collector.increment_counter("discord_interactions_total", labels={"command": "chat"})
+            if request.deadline is None or not request.deadline.expired:
+                live.append(request)
+            elif self._mark_expired(request, "Tiempo límite superado antes de procesar la petición"):
+                expired.append(request)
+        return live, expired
+    
+    @staticmethod
+    def _chat_arguments(request: InteractionRequest) -> Dict[str, Any]:
+        """Argumentos de chat_batch/achat_batch para una petición"""
+        return {
+            "prompt": request.prompt,
+            "user_id": request.user_id,
+            "roles": request.roles,
+            "username": request.username,
+            "interaction_token": request.interaction_token,
+            "guild_id": request.guild_id,
+            "channel_id": request.channel_id,
+            "deadline": request.deadline,
+        }
+    
+    def _complete_request(self, request: InteractionRequest, start_time: float):
+        """Registra una petición respondida correctamente"""
+        request.status = InteractionStatus.COMPLETED
+        metrics_collector.increment_counter("discord_interactions_success", labels={"command": "chat"})
+        metrics_collector.record_response_time("discord_response_time_ms", start_time, labels={"command": "chat"})
+        logger.info(f"Petición {request.interaction_token}_{request.user_id} completada exitosamente "
+                    f"en {time.time() - start_time:.2f}s")
+    
+    def _process_batch(self, batch: List[InteractionRequest]):
+        """Procesa un lote: recuperación vectorizada y `chain.batch` para todas las peticiones"""
+        start_time = time.time()
+        live, expired = self._start_batch(batch)
+        for request in expired:
+            self._send_error_message(request, "Tiempo límite superado", TIMEOUT_MESSAGE_DATA)
+        if not live:
+            return
+        
+        # Importar aquí para evitar dependencias circulares
+        from src.core.chat import chat_batch
+        
+        try:
+            responses = chat_batch([self._chat_arguments(request) for request in live], self.batch_max_concurrency)
+        except Exception as e:
+            logger.error(f"Error procesando lote: {e}")
+            for request in live:
+                self._handle_request_failure(request, str(e))
+            return
+        
+        for request, response in zip(live, responses):
+            if isinstance(response, DeadlineExceeded):
+                self._handle_expired_request(request, str(response))
+            elif self._send_discord_response(request, response):
+                self._complete_request(request, start_time)
+            else:
+                self._handle_delivery_failure(request)
     
     def _process_request(self, request: InteractionRequest):
         """Procesa una petición individual"""
@@ -101,6 +270,8 @@ class DiscordInteractionHandler:
             metrics_collector.record_value("discord_queue_size", self.request_queue.qsize())
             
             logger.info(f"Procesando petición {request_id} (intento {request.retry_count + 1})")
+            if request.deadline is not None:
+                request.deadline.check("procesar la petición")
             
             # Importar aquí para evitar dependencias circulares
             from src.core.chat import chat
@@ -114,7 +285,8 @@ class DiscordInteractionHandler:
                 username=request.username,
                 interaction_token=request.interaction_token,
                 guild_id=request.guild_id,
-                channel_id=request.channel_id
+                channel_id=request.channel_id,
+                deadline=request.deadline
             )
             processing_time = time.time() - chat_start_time
             
@@ -130,8 +302,11 @@ class DiscordInteractionHandler:
                 metrics_collector.record_response_time("discord_response_time_ms", start_time, labels={"command": "chat"})
                 logger.info(f"Petición {request_id} completada exitosamente en {total_time:.2f}s")
             else:
-                raise Exception("Error enviando respuesta a Discord")
+                # La respuesta ya está generada y guardada: no se vuelve a generar
+                self._handle_delivery_failure(request)
                 
+        except DeadlineExceeded as e:
+            self._handle_expired_request(request, str(e))
         except Exception as e:
             logger.error(f"Error procesando petición {request_id}: {e}")
             metrics_collector.increment_counter("discord_interactions_failed", labels={"command": "chat", "error": str(e)[:50]})
@@ -142,8 +317,11 @@ class DiscordInteractionHandler:
         url = f"https://discord.com/api/v10/webhooks/{request.application_id}/{request.interaction_token}"
         
         for attempt in range(request.max_retries):
+            if not self._token_valid(request):
+                logger.warning(f"Token de interacción caducado, se descarta la respuesta de {request.user_id}")
+                return False
             try:
-                data = {"content": content}
+                data = {"content": fit_message(content, self.max_response_length)}
                 response = requests.post(
                     url, 
                     json=data, 
@@ -159,6 +337,9 @@ class DiscordInteractionHandler:
                     return True
                 elif response.status_code == 429:  # Rate limit
                     retry_after = int(response.headers.get("Retry-After", 1))
+                    if not self._token_valid(request, retry_after):
+                        logger.warning(f"Rate limit de {retry_after}s más allá de la validez del token")
+                        return False
                     logger.warning(f"Rate limit alcanzado, esperando {retry_after}s")
                     time.sleep(retry_after)
                     continue
@@ -173,16 +354,27 @@ class DiscordInteractionHandler:
             # Esperar antes del siguiente intento
             if attempt < request.max_retries - 1:
                 delay = self.retry_delays[min(attempt, len(self.retry_delays) - 1)]
+                if not self._token_valid(request, delay):
+                    break
                 logger.info(f"Reintentando en {delay}s...")
                 time.sleep(delay)
         
         return False
     
-    def _handle_request_failure(self, request: InteractionRequest, error: str):
-        """Maneja el fallo de una petición"""
+    def _next_retry_delay(self, request: InteractionRequest) -> Optional[float]:
+        """
+        Registra el fallo de una petición y decide si se reintenta.
+        
+        Returns:
+            Optional[float]: Segundos hasta el reintento, o None si el fallo es definitivo
+        """
         request_id = f"{request.interaction_token}_{request.user_id}"
         
-        if request.retry_count < request.max_retries:
+        delay = self.retry_delays[min(request.retry_count, len(self.retry_delays) - 1)]
+        if request.deadline is not None and delay >= request.deadline.remaining():
+            # El reintento llegaría después del tiempo límite
+            logger.warning(f"Sin tiempo para reintentar la petición {request_id} antes de su tiempo límite")
+        elif request.retry_count < request.max_retries:
             # Reintentar
             request.retry_count += 1
             request.status = InteractionStatus.RETRYING
@@ -190,34 +382,78 @@ class DiscordInteractionHandler:
             # Registrar reintento
             metrics_collector.increment_counter("discord_retry_count", labels={"command": "chat"})
             
-            delay = self.retry_delays[min(request.retry_count - 1, len(self.retry_delays) - 1)]
             logger.info(f"Reintentando petición {request_id} en {delay}s (intento {request.retry_count})")
-            
+            return delay
+        
+        # Fallo definitivo
+        request.status = InteractionStatus.FAILED
+        logger.error(f"Petición {request_id} falló definitivamente después de {request.max_retries} intentos")
+        return None
+    
+    def _handle_request_failure(self, request: InteractionRequest, error: str):
+        """Maneja el fallo de una petición"""
+        delay = self._next_retry_delay(request)
+        if delay is not None:
             # Programar reintento
             threading.Timer(delay, self._retry_request, args=[request]).start()
         else:
-            # Fallo definitivo
-            request.status = InteractionStatus.FAILED
-            logger.error(f"Petición {request_id} falló definitivamente después de {request.max_retries} intentos")
-            
             # Enviar mensaje de error
             self._send_error_message(request, error)
     
     def _retry_request(self, request: InteractionRequest):
         """Reintenta una petición fallida"""
+        if request.deadline is not None and request.deadline.expired:
+            self._handle_expired_request(request, "Tiempo límite superado antes del reintento")
+            return
         request.status = InteractionStatus.PENDING
         self.request_queue.put(request)
     
-    def _send_error_message(self, request: InteractionRequest, error: str):
+    def _token_valid(self, request: InteractionRequest, wait_seconds: float = 0) -> bool:
+        """Indica si el token de la interacción seguirá valiendo dentro de `wait_seconds`"""
+        return request.token_deadline is None or request.token_deadline.remaining() > wait_seconds
+    
+    def _mark_expired(self, request: InteractionRequest, reason: str) -> bool:
+        """
+        Marca como fallida una petición que superó su tiempo límite.
+        
+        Returns:
+            bool: True si el token sigue valiendo y se puede avisar al usuario
+        """
+        request.status = InteractionStatus.FAILED
+        metrics_collector.increment_counter("discord_interactions_expired", labels={"command": "chat"})
+        logger.warning(f"Petición {request.interaction_token}_{request.user_id} descartada: {reason}")
+        return self._token_valid(request)
+    
+    def _handle_expired_request(self, request: InteractionRequest, reason: str):
+        """Descarta una petición vencida (sin reintentos) y avisa al usuario si aún es posible"""
+        if self._mark_expired(request, reason):
+            self._send_error_message(request, reason, TIMEOUT_MESSAGE_DATA)
+    
+    def _mark_delivery_failed(self, request: InteractionRequest) -> bool:
+        """
+        Marca como fallida una petición cuya respuesta no se pudo entregar. El envío
+        ya agotó sus propios reintentos; la petición no vuelve a la cola porque
+        generarla de nuevo repetiría el turno en la memoria del usuario.
+        
+        Returns:
+            bool: True si el token sigue valiendo y se puede avisar al usuario
+        """
+        request.status = InteractionStatus.FAILED
+        metrics_collector.increment_counter("discord_interactions_failed", labels={"command": "chat", "error": "send"})
+        logger.error(f"No se pudo entregar la respuesta de la petición {request.interaction_token}_{request.user_id}")
+        return self._token_valid(request)
+    
+    def _handle_delivery_failure(self, request: InteractionRequest):
+        """Descarta una respuesta que no se pudo enviar y avisa al usuario si aún es posible"""
+        if self._mark_delivery_failed(request):
+            self._send_error_message(request, "Error enviando respuesta a Discord")
+    
+    def _send_error_message(self, request: InteractionRequest, error: str,
+                            message_data: Dict[str, Any] = ERROR_MESSAGE_DATA):
         """Envía un mensaje de error al usuario"""
         try:
             url = f"https://discord.com/api/v10/webhooks/{request.application_id}/{request.interaction_token}"
-            error_data = {
-                "content": "❌ Lo siento, hubo un error procesando tu mensaje. Por favor, inténtalo de nuevo en unos momentos.",
-                "flags": 64  # Ephemeral flag
-            }
-            
-            response = requests.post(url, json=error_data, timeout=10)
+            response = requests.post(url, json=message_data, timeout=10)
             if response.status_code == 200:
                 logger.info(f"Mensaje de error enviado para petición {request.interaction_token}")
             else:
@@ -226,6 +462,322 @@ class DiscordInteractionHandler:
         except Exception as e:
             logger.error(f"Error enviando mensaje de error: {e}")
     
+    # ------------------------------------------------------------------
+    # Modo asíncrono: pool de corrutinas en el event loop de FastAPI
+    # ------------------------------------------------------------------
+    
+    async def start_async_workers(self):
+        """
+        Inicia el pool de consumidores asíncronos en el event loop actual.
+        
+        Cada consumidor procesa peticiones de la cola con `achat`; un semáforo
+        limita las generaciones del LLM en curso.
+        """
+        if not self.async_mode or self._async_tasks:
+            return
+        
+        self.running = True
+        self._loop = asyncio.get_running_loop()
+        self._async_queue = asyncio.Queue(maxsize=self.queue_max_size)
+        self._generation_semaphore = asyncio.Semaphore(self.max_concurrent_generations)
+        self._http_session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=self.request_timeout),
+            headers={"User-Agent": "PythonBots-Discord/1.0"}
+        )
+        for i in range(self.async_workers):
+            task = asyncio.create_task(self._async_worker_loop(), name=f"DiscordAsyncWorker-{i}")
+            self._async_tasks.append(task)
+        logger.info(f"Iniciados {self.async_workers} consumidores asíncronos "
+                    f"(máximo {self.max_concurrent_generations} generaciones simultáneas)")
+        
+        # Iniciar limpieza automática de métricas
+        self._start_metrics_cleanup()
+    
+    async def _async_worker_loop(self):
+        """Loop principal de un consumidor asíncrono"""
+        while self.running:
+            request = await self._async_queue.get()
+            
+            if not self._acquire_user(request):
+                continue
+            
+            batch = self._drain_batch(request, self._async_queue)
+            if len(batch) == 1:
+                await self._aserve_user(request)
+                continue
+            
+            try:
+                await self._aprocess_batch(batch)
+            except Exception as e:
+                logger.error(f"Error en consumidor asíncrono: {e}")
+            following = []
+            for request in batch:
+                self._async_queue.task_done()
+                next_request = self.user_serializer.release(request.user_id)
+                if next_request is not None:
+                    following.append(next_request)
+            await asyncio.gather(*(self._aserve_user(request) for request in following))
+    
+    async def _aserve_user(self, request: InteractionRequest):
+        """Procesa una petición y las que el usuario acumule mientras tanto (versión asíncrona)"""
+        while request is not None:
+            try:
+                await self._aprocess_request(request)
+            except Exception as e:
+                logger.error(f"Error en consumidor asíncrono: {e}")
+            finally:
+                self._async_queue.task_done()
+            request = self.user_serializer.release(request.user_id)
+    
+    async def _acquire_generation_permits(self, wanted: int) -> int:
+        """
+        Reserva hasta `wanted` permisos de generación: espera el primero y toma los
+        demás solo si están libres (esperarlos todos podría bloquear unos lotes con otros).
+        
+        Returns:
+            int: Permisos reservados (al menos 1), que el llamador debe liberar
+        """
+        await self._generation_semaphore.acquire()
+        permits = 1
+        while permits < wanted and not self._generation_semaphore.locked():
+            await self._generation_semaphore.acquire()
+            permits += 1
+        return permits
+    
+    async def _aprocess_batch(self, batch: List[InteractionRequest]):
+        """Procesa un lote con `chain.abatch`; las respuestas se envían en paralelo"""
+        start_time = time.time()
+        live, expired = self._start_batch(batch)
+        await asyncio.gather(*(self._asend_error_message(request, "Tiempo límite superado", TIMEOUT_MESSAGE_DATA)
+                               for request in expired))
+        if not live:
+            return
+        
+        # Importar aquí para evitar dependencias circulares
+        from src.core.chat import achat_batch
+        
+        # Cada generación simultánea del lote ocupa un permiso del semáforo
+        permits = await self._acquire_generation_permits(min(len(live), self.batch_max_concurrency))
+        self._inflight_generations += permits
+        metrics_collector.record_value("discord_inflight_generations", self._inflight_generations)
+        try:
+            responses = await achat_batch([self._chat_arguments(request) for request in live], permits)
+        except Exception as e:
+            logger.error(f"Error procesando lote: {e}")
+            responses = None
+            error = str(e)
+        finally:
+            self._inflight_generations -= permits
+            for _ in range(permits):
+                self._generation_semaphore.release()
+        if responses is None:
+            for request in live:
+                await self._ahandle_request_failure(request, error)
+            return
+        
+        async def deliver(request: InteractionRequest, response):
+            if isinstance(response, DeadlineExceeded):
+                await self._ahandle_expired_request(request, str(response))
+            elif await self._asend_discord_response(request, response):
+                self._complete_request(request, start_time)
+            else:
+                await self._ahandle_delivery_failure(request)
+        
+        await asyncio.gather(*(deliver(request, response) for request, response in zip(live, responses)))
+    
+    async def _aprocess_request(self, request: InteractionRequest):
+        """Procesa una petición individual sin ocupar un hilo durante la generación"""
+        request_id = f"{request.interaction_token}_{request.user_id}"
+        start_time = time.time()
+        editor = None
+        
+        try:
+            # Actualizar estado
+            request.status = InteractionStatus.PROCESSING
+            self.active_requests[request_id] = request
+            
+            # Registrar métricas
+            metrics_collector.increment_counter("discord_interactions_total", labels={"command": "chat"})
+            metrics_collector.record_value("discord_queue_size", self._async_queue.qsize())
+            
+            logger.info(f"Procesando petición {request_id} (intento {request.retry_count + 1})")
+            if request.deadline is not None:
+                request.deadline.check("procesar la petición")
+            
+            # Importar aquí para evitar dependencias circulares
+            from src.core.chat import achat
+            
+            # En streaming se edita el mensaje original ("pensando...") con el texto parcial
+            if self.stream_responses:
+                editor = StreamingMessageEditor(
+                    self._http_session, self._original_message_url(request),
+                    self.stream_edit_interval, self.max_response_length, start_time
+                )
+            
+            async with self._generation_semaphore:
+                self._inflight_generations += 1
+                metrics_collector.record_value("discord_inflight_generations", self._inflight_generations)
+                try:
+                    chat_start_time = time.time()
+                    respuesta = await achat(
+                        request.prompt,
+                        user_id=request.user_id,
+                        roles=request.roles,
+                        username=request.username,
+                        interaction_token=request.interaction_token,
+                        guild_id=request.guild_id,
+                        channel_id=request.channel_id,
+                        on_token=editor.on_token if editor else None,
+                        deadline=request.deadline
+                    )
+                    processing_time = time.time() - chat_start_time
+                finally:
+                    self._inflight_generations -= 1
+            
+            logger.info(f"Chat procesado en {processing_time:.2f}s para usuario {request.user_id}")
+            
+            # Enviar respuesta a Discord (en streaming, como última edición del mensaje original)
+            if editor:
+                await editor.close()
+                logger.debug(f"Ediciones en streaming para {request_id}: {editor.edits}")
+            success = await self._asend_discord_response(request, respuesta, edit_original=editor is not None)
+            
+            if success:
+                request.status = InteractionStatus.COMPLETED
+                total_time = time.time() - start_time
+                metrics_collector.increment_counter("discord_interactions_success", labels={"command": "chat"})
+                metrics_collector.record_response_time("discord_response_time_ms", start_time, labels={"command": "chat"})
+                logger.info(f"Petición {request_id} completada exitosamente en {total_time:.2f}s")
+            else:
+                # La respuesta ya está generada y guardada: no se vuelve a generar
+                await self._ahandle_delivery_failure(request)
+                
+        except DeadlineExceeded as e:
+            if editor:
+                # Quitar el cursor del texto parcial antes del aviso de tiempo agotado
+                await editor.finish_interrupted()
+            await self._ahandle_expired_request(request, str(e))
+        except Exception as e:
+            logger.error(f"Error procesando petición {request_id}: {e}")
+            metrics_collector.increment_counter("discord_interactions_failed", labels={"command": "chat", "error": str(e)[:50]})
+            await self._ahandle_request_failure(request, str(e))
+    
+    def _original_message_url(self, request: InteractionRequest) -> str:
+        """URL del mensaje original de la interacción (el "pensando..." del ACK diferido)"""
+        return (f"https://discord.com/api/v10/webhooks/{request.application_id}/"
+                f"{request.interaction_token}/messages/@original")
+    
+    async def _asend_discord_response(self, request: InteractionRequest, content: str,
+                                      edit_original: bool = False) -> bool:
+        """
+        Envía la respuesta a Discord con reintentos (versión asíncrona)
+        
+        Args:
+            request: Petición de la interacción
+            content: Texto de la respuesta
+            edit_original: Editar el mensaje original en lugar de crear un mensaje de seguimiento
+        """
+        if edit_original:
+            url = self._original_message_url(request)
+            method = "PATCH"
+        else:
+            url = f"https://discord.com/api/v10/webhooks/{request.application_id}/{request.interaction_token}"
+            method = "POST"
+        
+        # Mismo recorte que el texto parcial del streaming: Discord rechaza los mensajes más largos
+        content = fit_message(content, self.max_response_length)
+        for attempt in range(request.max_retries):
+            if not self._token_valid(request):
+                logger.warning(f"Token de interacción caducado, se descarta la respuesta de {request.user_id}")
+                return False
+            try:
+                async with self._http_session.request(method, url, json={"content": content}) as response:
+                    if response.status == 200:
+                        logger.info(f"Respuesta enviada exitosamente a Discord (intento {attempt + 1})")
+                        return True
+                    elif response.status == 429:  # Rate limit
+                        retry_after = float(response.headers.get("Retry-After", 1))
+                        if not self._token_valid(request, retry_after):
+                            logger.warning(f"Rate limit de {retry_after}s más allá de la validez del token")
+                            return False
+                        logger.warning(f"Rate limit alcanzado, esperando {retry_after}s")
+                        await asyncio.sleep(retry_after)
+                        continue
+                    else:
+                        logger.warning(f"Error HTTP {response.status} enviando respuesta (intento {attempt + 1})")
+                        
+            except asyncio.TimeoutError:
+                logger.warning(f"Timeout enviando respuesta (intento {attempt + 1})")
+            except aiohttp.ClientError as e:
+                logger.warning(f"Error de red enviando respuesta (intento {attempt + 1}): {e}")
+            
+            # Esperar antes del siguiente intento
+            if attempt < request.max_retries - 1:
+                delay = self.retry_delays[min(attempt, len(self.retry_delays) - 1)]
+                if not self._token_valid(request, delay):
+                    break
+                logger.info(f"Reintentando en {delay}s...")
+                await asyncio.sleep(delay)
+        
+        return False
+    
+    async def _ahandle_request_failure(self, request: InteractionRequest, error: str):
+        """Maneja el fallo de una petición en modo asíncrono"""
+        delay = self._next_retry_delay(request)
+        if delay is not None:
+            self._loop.call_later(delay, self._aretry_request, request)
+        else:
+            await self._asend_error_message(request, error)
+    
+    async def _ahandle_expired_request(self, request: InteractionRequest, reason: str):
+        """Descarta una petición vencida (versión asíncrona)"""
+        if self._mark_expired(request, reason):
+            await self._asend_error_message(request, reason, TIMEOUT_MESSAGE_DATA)
+    
+    async def _ahandle_delivery_failure(self, request: InteractionRequest):
+        """Descarta una respuesta que no se pudo enviar (versión asíncrona)"""
+        if self._mark_delivery_failed(request):
+            await self._asend_error_message(request, "Error enviando respuesta a Discord")
+    
+    def _aretry_request(self, request: InteractionRequest):
+        """Vuelve a encolar una petición fallida (se ejecuta en el event loop)"""
+        if request.deadline is not None and request.deadline.expired:
+            asyncio.create_task(self._ahandle_expired_request(request, "Tiempo límite superado antes del reintento"))
+            return
+        request.status = InteractionStatus.PENDING
+        try:
+            self._async_queue.put_nowait(request)
+        except asyncio.QueueFull:
+            logger.error(f"Cola llena, se descarta el reintento de {request.interaction_token}_{request.user_id}")
+    
+    async def _asend_error_message(self, request: InteractionRequest, error: str,
+                                   message_data: Dict[str, Any] = ERROR_MESSAGE_DATA):
+        """Envía un mensaje de error al usuario (versión asíncrona)"""
+        try:
+            url = f"https://discord.com/api/v10/webhooks/{request.application_id}/{request.interaction_token}"
+            async with self._http_session.post(url, json=message_data,
+                                               timeout=aiohttp.ClientTimeout(total=10)) as response:
+                if response.status == 200:
+                    logger.info(f"Mensaje de error enviado para petición {request.interaction_token}")
+                else:
+                    logger.error(f"No se pudo enviar mensaje de error: {response.status}")
+                    
+        except Exception as e:
+            logger.error(f"Error enviando mensaje de error: {e}")
+    
+    async def shutdown_async(self):
+        """Detiene el pool de consumidores asíncronos y cierra la sesión HTTP"""
+        if not self._async_tasks:
+            return
+        self.running = False
+        for task in self._async_tasks:
+            task.cancel()
+        await asyncio.gather(*self._async_tasks, return_exceptions=True)
+        self._async_tasks.clear()
+        if self._http_session is not None:
+            await self._http_session.close()
+        logger.info("Consumidores asíncronos detenidos")
+    
     def submit_interaction(self, interaction_data: Dict[str, Any], prompt: str) -> bool:
         """
         Envía una interacción para procesamiento asíncrono
@@ -251,7 +803,8 @@ class DiscordInteractionHandler:
                 logger.error("Datos de interacción incompletos")
                 return False
             
-            # Crear petición
+            # Crear petición, con tiempo límite contado desde su recepción
+            received_at = time.time()
             request = InteractionRequest(
                 interaction_token=interaction_token,
                 application_id=application_id,
@@ -259,18 +812,29 @@ class DiscordInteractionHandler:
                 username=username,
                 roles=roles,
                 prompt=prompt,
-                timestamp=time.time(),
+                timestamp=received_at,
                 guild_id=guild_id,
                 channel_id=channel_id,
-                max_retries=self.max_retries
+                max_retries=self.max_retries,
+                deadline=Deadline.after(self.response_timeout, received_at),
+                token_deadline=Deadline.after(INTERACTION_TOKEN_TTL_SECONDS, received_at)
             )
             
             # Enviar a la cola
-            self.request_queue.put(request)
+            if self.async_mode:
+                if self._async_queue is None:
+                    logger.error("Los consumidores asíncronos no están iniciados")
+                    return False
+                # submit_interaction se llama desde el event loop: put_nowait es seguro
+                self._async_queue.put_nowait(request)
+                active_workers = len([t for t in self._async_tasks if not t.done()])
+            else:
+                self.request_queue.put(request)
+                active_workers = len([t for t in self.processing_threads if t.is_alive()])
             
             # Registrar métricas
-            metrics_collector.record_value("discord_queue_size", self.request_queue.qsize())
-            metrics_collector.record_value("discord_active_workers", len([t for t in self.processing_threads if t.is_alive()]))
+            metrics_collector.record_value("discord_queue_size", self.get_queue_size())
+            metrics_collector.record_value("discord_active_workers", active_workers)
             
             logger.info(f"Interacción enviada a cola para usuario {user_id}: {prompt[:50]}...")
             return True
@@ -287,6 +851,8 @@ class DiscordInteractionHandler:
     
     def get_queue_size(self) -> int:
         """Obtiene el tamaño actual de la cola"""
+        if self._async_queue is not None:
+            return self._async_queue.qsize()
         return self.request_queue.qsize()
     
     def get_active_requests_count(self) -> int:
@@ -0,0 +1,114 @@
+"""
+Edición progresiva del mensaje original de una interacción mientras el LLM genera la respuesta
+"""
+
+import asyncio
+import time
+from typing import Optional
+
+import aiohttp
+
+from src.utils.logger import logger
+from src.utils.metrics import metrics_collector
+
+# Indicador de que la respuesta sigue generándose
+STREAMING_CURSOR = " ▌"
+
+# Marca de una respuesta parcial que ya no se va a completar
+INTERRUPTED_MARK = " […]"
+
+
+def fit_message(text: str, max_length: int) -> str:
+    """Recorta un texto para que quepa en un mensaje de Discord, marcando el corte"""
+    if len(text) <= max_length:
+        return text
+    return text[:max_length - 1] + "…"
+
+
+class StreamingMessageEditor:
+    """
+    Acumula los tokens generados y edita el mensaje original de la interacción
+    (`PATCH /webhooks/{app}/{token}/messages/@original`) como mucho una vez por
+    intervalo, con una sola edición en curso y respetando los 429 de Discord.
+    """
+
+    def __init__(self, session: aiohttp.ClientSession, url: str, interval_seconds: float,
+                 max_length: int = 2000, start_time: Optional[float] = None):
+        """
+        Args:
+            session: Sesión HTTP compartida
+            url: URL del mensaje original de la interacción
+            interval_seconds: Tiempo mínimo entre ediciones
+            max_length: Longitud máxima del mensaje en Discord
+            start_time: Inicio de la petición, para medir el tiempo hasta el primer token
+        """
+        self.session = session
+        self.url = url
+        self.interval_seconds = interval_seconds
+        self.max_length = max_length
+        self.start_time = start_time or time.time()
+
+        self.text = ""
+        self.edits = 0
+        self._first_token = True
+        self._last_edit = 0.0
+        self._not_before = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def _display(self, text: str) -> str:
+        """Recorta el texto parcial para que quepa en un mensaje de Discord"""
+        if len(text) + len(STREAMING_CURSOR) <= self.max_length:
+            return text + STREAMING_CURSOR
+        return fit_message(text, self.max_length)
+
+    async def on_token(self, chunk: str):
+        """Recibe un fragmento de la respuesta y programa una edición si toca"""
+        if self._first_token:
+            self._first_token = False
+            metrics_collector.record_response_time("discord_time_to_first_token_ms", self.start_time)
+
+        self.text += chunk
+        if self._task is not None and not self._task.done():
+            return  # Ya hay una edición en curso; la siguiente incluirá este texto
+
+        now = time.monotonic()
+        if now >= max(self._last_edit + self.interval_seconds, self._not_before):
+            # La edición no bloquea la generación
+            self._task = asyncio.create_task(self._edit(self._display(self.text)))
+
+    async def _edit(self, content: str) -> bool:
+        """Edita el mensaje original con el contenido indicado"""
+        self._last_edit = time.monotonic()
+        try:
+            async with self.session.patch(self.url, json={"content": content}) as response:
+                if response.status == 429:
+                    retry_after = float(response.headers.get("Retry-After", 1))
+                    self._not_before = time.monotonic() + retry_after
+                    logger.debug(f"Rate limit editando mensaje en streaming, pausa de {retry_after}s")
+                    return False
+                if response.status != 200:
+                    logger.debug(f"Error HTTP {response.status} editando mensaje en streaming")
+                    return False
+                self.edits += 1
+                return True
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.debug(f"Error de red editando mensaje en streaming: {e}")
+            return False
+
+    async def close(self):
+        """Espera a la edición en curso antes de publicar la respuesta final"""
+        if self._task is not None and not self._task.done():
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def finish_interrupted(self) -> bool:
+        """
+        Deja el mensaje original en un estado final cuando la generación se abandona:
+        el texto parcial sin el cursor y marcado como incompleto.
+
+        Returns:
+            bool: True si no hacía falta editar o la edición se hizo
+        """
+        await self.close()
+        if not self.text:
+            return True  # No llegó ningún fragmento: no hay texto parcial que cerrar
+        return await self._edit(self.text[:self.max_length - len(INTERRUPTED_MARK)] + INTERRUPTED_MARK)
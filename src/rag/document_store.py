@@ -0,0 +1,156 @@
+"""
+Almacén de documentos compacto basado en offsets y mapeado en memoria (mmap),
+compartido en modo solo lectura por todos los procesos que lo abren
+"""
+
+import json
+import mmap
+from array import array
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Union
+
+import numpy as np
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain.schema import Document
+
+DOCUMENTS_FILE = "documents.bin"
+OFFSETS_FILE = "offsets.npy"
+IDS_FILE = "ids.npy"
+SORTED_IDS_FILE = "sorted_ids.npy"
+SORTED_ROWS_FILE = "sorted_rows.npy"
+
+# Los IDs de documento son hashes hexadecimales de longitud fija (ver document_id)
+ID_DTYPE = "S16"
+
+
+class DocumentStoreWriter:
+    """
+    Escribe documentos en formato compacto y en streaming: los registros van a un
+    solo archivo y al cerrar se guardan los arrays de offsets e IDs
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self._file = open(self.directory / DOCUMENTS_FILE, 'wb')
+        self._offsets = array('q', [0])
+        self._ids: List[str] = []
+
+    def __enter__(self) -> "DocumentStoreWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, doc_id: str, doc: Document):
+        """Añade un documento en la siguiente fila (debe coincidir con su posición en FAISS)"""
+        record = json.dumps({"text": doc.page_content, "metadata": doc.metadata}, ensure_ascii=False)
+        data = record.encode('utf-8')
+        self._file.write(data)
+        self._offsets.append(self._offsets[-1] + len(data))
+        self._ids.append(doc_id)
+
+    def close(self):
+        """Cierra el archivo de registros y escribe los arrays de offsets e IDs"""
+        if self._file.closed:
+            return
+        self._file.close()
+        id_array = np.array(self._ids, dtype=ID_DTYPE)
+        order = np.argsort(id_array, kind="stable")
+        np.save(self.directory / OFFSETS_FILE, np.frombuffer(self._offsets, dtype=np.int64))
+        np.save(self.directory / IDS_FILE, id_array)
+        np.save(self.directory / SORTED_IDS_FILE, id_array[order])
+        np.save(self.directory / SORTED_ROWS_FILE, order.astype(np.int64))
+
+
+class MmapDocstore(Docstore, AddableMixin):
+    """
+    Docstore de solo lectura sobre archivos mapeados en memoria.
+
+    Los documentos añadidos o borrados durante una recarga se guardan en una capa
+    en memoria hasta que el índice se vuelve a escribir en disco.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        with open(self.directory / DOCUMENTS_FILE, 'rb') as f:
+            size = f.seek(0, 2)
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self.offsets = np.load(self.directory / OFFSETS_FILE, mmap_mode='r')
+        self.ids = np.load(self.directory / IDS_FILE, mmap_mode='r')
+        self._sorted_ids = np.load(self.directory / SORTED_IDS_FILE, mmap_mode='r')
+        self._sorted_rows = np.load(self.directory / SORTED_ROWS_FILE, mmap_mode='r')
+
+        self._added: Dict[str, Document] = {}
+        self._deleted: set = set()
+
+    def __len__(self) -> int:
+        return len(self.ids) - len(self._deleted) + len(self._added)
+
+    def _row(self, doc_id: str) -> Optional[int]:
+        """Busca la fila de un ID por búsqueda binaria en el array ordenado"""
+        key = doc_id.encode('ascii')
+        position = int(np.searchsorted(self._sorted_ids, key))
+        if position < len(self._sorted_ids) and self._sorted_ids[position] == key:
+            return int(self._sorted_rows[position])
+        return None
+
+    def read_row(self, row: int) -> Document:
+        """Lee y decodifica el documento de una fila"""
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        record = json.loads(bytes(self._data[start:end]).decode('utf-8'))
+        return Document(page_content=record["text"], metadata=record["metadata"])
+
+    def search(self, search: str) -> Union[str, Document]:
+        """Obtiene un documento por su ID"""
+        if search in self._added:
+            return self._added[search]
+        if search in self._deleted:
+            return f"ID {search} not found."
+        row = self._row(search)
+        if row is None:
+            return f"ID {search} not found."
+        return self.read_row(row)
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        """Añade documentos a la capa en memoria"""
+        for doc_id, doc in texts.items():
+            self._deleted.discard(doc_id)
+            self._added[doc_id] = doc
+
+    def delete(self, ids: List) -> None:
+        """Marca documentos como borrados"""
+        for doc_id in ids:
+            if self._added.pop(doc_id, None) is None:
+                self._deleted.add(doc_id)
+
+    def copy(self) -> "MmapDocstore":
+        """Copia que comparte el mapeo pero no la capa de cambios"""
+        clone = object.__new__(MmapDocstore)
+        clone.__dict__.update(self.__dict__)
+        clone._added = dict(self._added)
+        clone._deleted = set(self._deleted)
+        return clone
+
+
+class RowIdMapping(Mapping):
+    """
+    Mapa posición FAISS -> ID de documento leído del array de IDs mapeado, sin copiarlo a memoria
+    """
+
+    def __init__(self, ids: np.ndarray):
+        self.ids = ids
+
+    def __getitem__(self, position: int) -> str:
+        if not 0 <= position < len(self.ids):
+            raise KeyError(position)
+        return self.ids[position].decode('ascii')
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(len(self.ids)))
+
+    def __len__(self) -> int:
+        return len(self.ids)
@@ -0,0 +1,96 @@
+"""
+Agrupador de embeddings de consultas concurrentes en lotes (micro-batching)
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Tuple
+
+from src.utils.logger import logger
+from src.utils.metrics import metrics_collector
+
+
+class EmbeddingBatcher:
+    """
+    Reúne las consultas que llegan desde distintos workers durante una ventana corta
+    y las codifica en una sola pasada del modelo
+    """
+
+    def __init__(self, embed_batch: Callable[[List[str]], List[List[float]]],
+                 window_ms: float = 5, max_batch_size: int = 32):
+        """
+        Args:
+            embed_batch: Función que codifica una lista de textos en una sola llamada
+            window_ms: Tiempo máximo de espera para completar un lote
+            max_batch_size: Número máximo de textos por lote
+        """
+        self.embed_batch = embed_batch
+        self.window_seconds = window_ms / 1000
+        self.max_batch_size = max_batch_size
+
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        """Inicia el hilo despachador la primera vez que se usa"""
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                thread = threading.Thread(target=self._dispatch_loop, name="EmbeddingBatcher")
+                thread.daemon = True
+                thread.start()
+                self._thread = thread
+                logger.info(f"Agrupador de embeddings iniciado (ventana {self.window_seconds * 1000:.0f}ms, "
+                            f"lote máximo {self.max_batch_size})")
+
+    def embed(self, text: str, timeout: Optional[float] = None) -> List[float]:
+        """
+        Codifica un texto esperando a que se procese su lote.
+
+        Args:
+            text: Texto a codificar
+            timeout: Tiempo máximo de espera en segundos
+
+        Returns:
+            List[float]: Vector del texto
+        """
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future.result(timeout=timeout)
+
+    def _collect_batch(self) -> List[Tuple[str, Future]]:
+        """Espera la primera petición y acumula las que lleguen durante la ventana"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window_seconds
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _dispatch_loop(self):
+        """Loop principal del despachador de lotes"""
+        while True:
+            batch = self._collect_batch()
+
+            # Las consultas idénticas dentro del lote se codifican una sola vez
+            unique_texts = list(dict.fromkeys(text for text, _ in batch))
+            try:
+                vectors = self.embed_batch(unique_texts)
+                by_text = dict(zip(unique_texts, vectors))
+                for text, future in batch:
+                    future.set_result(list(by_text[text]))
+                metrics_collector.record_value("rag_embedding_batch_size", len(unique_texts))
+            except Exception as e:
+                logger.error(f"Error codificando lote de {len(unique_texts)} consultas: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
@@ -0,0 +1,89 @@
+"""
+Modelo de embeddings del RAG con caché de consultas
+"""
+
+import re
+from typing import List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+from config.settings import (
+    EMBEDDING_MODEL,
+    EMBEDDING_BATCHING_ENABLED,
+    EMBEDDING_BATCH_WINDOW_MS,
+    EMBEDDING_BATCH_MAX_SIZE,
+    RAG_QUERY_EMBEDDING_CACHE_SIZE,
+    RAG_QUERY_EMBEDDING_CACHE_TTL,
+)
+from src.rag.embedding_batcher import EmbeddingBatcher
+from src.utils.cache import LRUCache
+from src.utils.logger import logger
+
+
+def normalize_query(text: str) -> str:
+    """
+    Normaliza una consulta para usarla como clave de caché.
+    """
+    return re.sub(r'\s+', ' ', text).strip().lower()
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """
+    Envoltorio de un modelo de embeddings que cachea los vectores de las consultas
+    y agrupa en lotes los fallos de caché concurrentes
+    """
+
+    def __init__(self, base: Embeddings, model_name: str = EMBEDDING_MODEL,
+                 cache_size: int = RAG_QUERY_EMBEDDING_CACHE_SIZE,
+                 cache_ttl: float = RAG_QUERY_EMBEDDING_CACHE_TTL,
+                 batcher: Optional[EmbeddingBatcher] = None):
+        self.base = base
+        self.model_name = model_name
+        self.batcher = batcher
+        self.cache = LRUCache(cache_size, cache_ttl, metrics_prefix="rag_query_embedding_cache")
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Los documentos se indexan una sola vez, no se cachean"""
+        return self.base.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        """Obtiene el embedding de una consulta, usando la caché si es posible"""
+        key = (self.model_name, normalize_query(text))
+        vector = self.cache.get(key)
+        if vector is None:
+            if self.batcher is not None:
+                vector = self.batcher.embed(text)
+            else:
+                vector = self.base.embed_query(text)
+            self.cache.put(key, vector)
+        return list(vector)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embebe varias consultas a la vez: las que no están en caché se codifican en
+        una sola llamada al modelo.
+        """
+        keys = [(self.model_name, normalize_query(text)) for text in texts]
+        vectors = [self.cache.get(key) for key in keys]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            computed = self.base.embed_documents([texts[i] for i in missing])
+            for i, vector in zip(missing, computed):
+                vectors[i] = vector
+                self.cache.put(keys[i], vector)
+        return [list(vector) for vector in vectors]
+
+
+def create_embeddings() -> CachedQueryEmbeddings:
+    """
+    Crea el modelo de embeddings (importación diferida: cargar el modelo es costoso).
+    """
+    from langchain_huggingface import HuggingFaceEmbeddings
+    logger.info(f"Inicializando modelo de embeddings: {EMBEDDING_MODEL}")
+    base = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+
+    batcher = None
+    if EMBEDDING_BATCHING_ENABLED:
+        batcher = EmbeddingBatcher(base.embed_documents, EMBEDDING_BATCH_WINDOW_MS, EMBEDDING_BATCH_MAX_SIZE)
+
+    return CachedQueryEmbeddings(base, batcher=batcher)
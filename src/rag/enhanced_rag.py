@@ -2,118 +2,192 @@
 Módulo RAG mejorado para manejar mejor el contexto y las referencias a entidades
 """
 
-from pathlib import Path
-from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain.schema import Document
+from dataclasses import dataclass
+from typing import List, Optional
 import re
+from config.settings import (
+    RAG_K_RESULTS, RAG_RELOAD_POLL_SECONDS, RAG_HYBRID_SEARCH, RAG_RRF_K,
+    RAG_RETRIEVAL_CACHE_SIZE, RAG_RETRIEVAL_CACHE_TTL,
+)
+from src.rag.embeddings import create_embeddings, normalize_query
+from src.rag.knowledge_base import KnowledgeBaseRetriever
+from src.rag.knowledge_registry import KnowledgeBaseRegistry
+from src.rag.lexical_index import reciprocal_rank_fusion, strip_accents
+from src.rag.entity_index import extract_entities, entity_key
+from src.utils.cache import LRUCache
 from src.utils.logger import logger
 
-# Actualizar la ruta para la nueva estructura
-BASE_PATH = Path(__file__).parent.parent.parent / "data" / "base.txt"
-
-def load_documents():
-    """
-    Carga base.txt y lo convierte en una lista de Documentos para LangChain.
-    """
-    if not BASE_PATH.exists():
-        logger.warning("No se encontró base.txt")
-        return []
-    
-    try:
-        with open(BASE_PATH, 'r', encoding='utf-8') as f:
-            documents = [Document(page_content=line.strip()) for line in f if line.strip() and not line.strip().startswith('#')]
-        logger.info(f"Documentos cargados exitosamente: {len(documents)} documentos")
-        return documents
-    except Exception as e:
-        logger.error(f"Error cargando documentos: {e}")
-        return []
+# Palabras que indican que la consulta se refiere a alguien o algo ya mencionado
+PERSON_INDICATORS = {'quien', 'cuando', 'donde', 'que', 'como'}
 
 def extract_entities_from_history(history: str) -> list:
     """
     Extrae entidades mencionadas en el historial de conversación.
     """
-    entities = []
-    if history and isinstance(history, str):
-        # Buscar nombres propios (palabras que empiezan con mayúscula)
-        words = re.findall(r'\b[A-Z][a-z]+\b', history)
-        entities.extend(words)
-        logger.debug(f"Entidades extraídas del historial: {entities}")
-    return list(set(entities))
+    entities = extract_entities(history) if isinstance(history, str) else []
+    logger.debug(f"Entidades extraídas del historial: {entities}")
+    return entities
 
-def enhance_query_with_context(query: str, history: str) -> str:
+@dataclass
+class RetrievalContext:
+    """Contexto de una petición de recuperación (propio de cada petición, nunca global)"""
+    history: str = ""
+    entities: Optional[List[str]] = None
+    guild_id: Optional[str] = None
+    
+    def get_entities(self) -> List[str]:
+        """Obtiene las entidades del historial, extrayéndolas si no se proporcionaron"""
+        if self.entities is None:
+            self.entities = extract_entities_from_history(self.history)
+        return self.entities
+
+def enhance_query_with_context(query: str, history: str, entities: Optional[List[str]] = None) -> str:
     """
     Mejora la consulta agregando contexto del historial.
+    
+    Las entidades deben venir ordenadas de la menos a la más reciente; con ellas
+    la mejora cuesta unas pocas búsquedas en conjuntos, sin recorrer el historial.
     """
-    if not history or not isinstance(history, str):
+    if entities is None:
+        entities = extract_entities_from_history(history)
+    if not entities:
         return query
     
-    # Extraer entidades del historial
-    entities = extract_entities_from_history(history)
+    query_words = set(re.findall(r'\w+', strip_accents(query.lower())))
     
     # Si la consulta no menciona una entidad específica pero hay entidades en el historial
     # y la consulta parece referirse a una persona, agregar la entidad más reciente
-    if entities and not any(entity.lower() in query.lower() for entity in entities):
-        # Detectar si la consulta se refiere a una persona
-        person_indicators = ['quién', 'quien', 'cuándo', 'cuando', 'dónde', 'donde', 'qué', 'que', 'cómo', 'como']
-        if any(indicator in query.lower() for indicator in person_indicators):
-            # Agregar la entidad más reciente al contexto
+    if not query_words & {entity_key(entity) for entity in entities}:
+        if query_words & PERSON_INDICATORS:
             enhanced_query = f"{query} (refiriéndose a {entities[-1]})"
             logger.debug(f"Consulta mejorada: '{query}' -> '{enhanced_query}'")
             return enhanced_query
     
     return query
 
-logger.info("Inicializando embeddings y vectorstore")
-embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-documents = load_documents()
-vectorstore = FAISS.from_documents(documents, embeddings)
+# Bases de conocimiento por servidor con la global como respaldo. El índice
+# global se carga en segundo plano (start_warmup); los de servidores, en su primer uso
+knowledge_registry = KnowledgeBaseRegistry(create_embeddings)
+knowledge_base = knowledge_registry.global_knowledge_base
 
-# Configurar un retriever básico
-base_retriever = vectorstore.as_retriever(search_kwargs={"k": 5})
-logger.info("Vectorstore y retriever inicializados correctamente")
+# Retriever que sigue al índice vigente aunque se recargue en caliente
+base_retriever = KnowledgeBaseRetriever(knowledge_base=knowledge_base)
 
-# Variable global para almacenar el historial
-_current_history = ""
+# Resultados de la búsqueda vectorial y léxica por (huella del índice, consulta, k).
+# La huella cambia con cada recarga o reconstrucción, lo que invalida las entradas
+retrieval_cache = LRUCache(RAG_RETRIEVAL_CACHE_SIZE, RAG_RETRIEVAL_CACHE_TTL,
+                           metrics_prefix="rag_retrieval_cache")
+
+def _retrieval_key(snapshot, enhanced_query: str, k: int) -> tuple:
+    """Clave de la caché de recuperación; la huella cambia con cada recarga del índice"""
+    return (snapshot.fingerprint, normalize_query(enhanced_query), k, RAG_HYBRID_SEARCH)
+
+def _lexical_search(snapshot, enhanced_query: str, k: int) -> list:
+    """IDs de la búsqueda léxica: coincidencias exactas de nombres y palabras clave"""
+    if not RAG_HYBRID_SEARCH:
+        return []
+    return [doc_id for doc_id, _ in snapshot.lexical_index.search(enhanced_query, k)]
 
-def set_history(history: str):
+def _search(snapshot, enhanced_query: str, k: int) -> tuple:
     """
-    Establece el historial de conversación para el contexto.
+    Búsqueda vectorial y léxica de una consulta, cacheada por huella del índice.
+    
+    Returns:
+        Tupla (documentos de la búsqueda vectorial, IDs de la búsqueda léxica)
     """
-    global _current_history
-    _current_history = history
-    logger.debug(f"Historial establecido: {len(history)} caracteres")
+    cache_key = _retrieval_key(snapshot, enhanced_query, k)
+    cached = retrieval_cache.get(cache_key)
+    if cached is not None:
+        logger.debug("Resultados de recuperación obtenidos de la caché")
+        return cached
+    
+    vector_docs = snapshot.retriever.invoke(enhanced_query)
+    logger.debug(f"Documentos encontrados por búsqueda vectorial: {len(vector_docs)}")
+    
+    result = (vector_docs, _lexical_search(snapshot, enhanced_query, k))
+    retrieval_cache.put(cache_key, result)
+    return result
+
+def _combine_results(snapshot, context: RetrievalContext, vector_docs: list, lexical_ids: list) -> list:
+    """Fusiona los resultados vectoriales y léxicos (o de entidades del historial) con RRF"""
+    if not RAG_HYBRID_SEARCH:
+        return vector_docs[:RAG_K_RESULTS]
+    
+    # Si la consulta no tiene coincidencias léxicas, usar los documentos de las
+    # entidades del historial (la más reciente primero) del mapa precalculado
+    if not lexical_ids:
+        for entity in reversed(context.get_entities()):
+            entity_ids = snapshot.entity_index.lookup(entity, RAG_K_RESULTS)
+            if entity_ids:
+                logger.debug(f"Documentos encontrados con entidad '{entity}': {len(entity_ids)}")
+                lexical_ids = entity_ids
+                break
+    lexical_docs = snapshot.get_documents(lexical_ids)
+    logger.debug(f"Documentos encontrados por búsqueda léxica: {len(lexical_docs)}")
+    
+    docs = reciprocal_rank_fusion([lexical_docs, vector_docs], RAG_K_RESULTS, RAG_RRF_K)
+    logger.debug(f"Total de documentos retornados: {len(docs)}")
+    return docs
 
-def get_enhanced_documents(query: str) -> list:
+def get_enhanced_documents(query: str, context: Optional[RetrievalContext] = None) -> list:
     """
     Obtiene documentos relevantes considerando el contexto del historial.
+    
+    Args:
+        query: Consulta del usuario
+        context: Historial, entidades y servidor de esta petición (None si no hay historial)
     """
-    global _current_history
+    context = context or RetrievalContext()
     
     logger.debug(f"Buscando documentos para query: '{query}'")
     
     # Mejorar la consulta con el contexto
-    enhanced_query = enhance_query_with_context(query, _current_history)
-    
-    # Obtener documentos del retriever base usando invoke (método actualizado)
-    docs = base_retriever.invoke(enhanced_query)
-    logger.debug(f"Documentos encontrados con query original: {len(docs)}")
-    
-    # Si no hay documentos relevantes y hay entidades en el historial,
-    # intentar buscar con las entidades del historial
-    if not docs and _current_history:
-        entities = extract_entities_from_history(_current_history)
-        if entities:
-            logger.debug(f"Intentando búsqueda con entidades: {entities}")
-            for entity in entities:
-                entity_docs = base_retriever.invoke(entity)
-                if entity_docs:
-                    docs.extend(entity_docs)
-                    logger.debug(f"Documentos encontrados con entidad '{entity}': {len(entity_docs)}")
-                    break
-    
-    logger.debug(f"Total de documentos retornados: {len(docs[:5])}")
-    return docs[:5]  # Limitar a 5 documentos
+    enhanced_query = enhance_query_with_context(query, context.history, context.get_entities())
+    
+    # Tomar el snapshot una sola vez para que una recarga no mezcle índices
+    snapshot = knowledge_registry.get(context.guild_id).snapshot
+    
+    # Búsqueda vectorial y léxica (las consultas repetidas no llegan a FAISS)
+    vector_docs, lexical_ids = _search(snapshot, enhanced_query, RAG_K_RESULTS)
+    return _combine_results(snapshot, context, vector_docs, lexical_ids)
+
+def get_enhanced_documents_batch(queries: List[str], contexts: List[Optional[RetrievalContext]]) -> List[list]:
+    """
+    Variante de get_enhanced_documents() para varias consultas: los embeddings que
+    faltan se calculan en una sola llamada al modelo y cada índice se consulta con
+    una sola búsqueda FAISS para todas sus consultas.
+    
+    Args:
+        queries: Consultas de los usuarios
+        contexts: Contexto de cada consulta (mismo orden)
+    
+    Returns:
+        List[list]: Documentos relevantes de cada consulta
+    """
+    contexts = [context or RetrievalContext() for context in contexts]
+    enhanced = [enhance_query_with_context(query, context.history, context.get_entities())
+                for query, context in zip(queries, contexts)]
+    snapshots = [knowledge_registry.get(context.guild_id).snapshot for context in contexts]
+    keys = [_retrieval_key(snapshot, query, RAG_K_RESULTS) for snapshot, query in zip(snapshots, enhanced)]
+    
+    results = [retrieval_cache.get(key) for key in keys]
+    misses = [i for i, result in enumerate(results) if result is None]
+    if misses:
+        vectors = knowledge_registry.get_embeddings().embed_queries([enhanced[i] for i in misses])
+        
+        # Una búsqueda por índice (servidor) con todas sus consultas
+        groups = {}
+        for i, vector in zip(misses, vectors):
+            groups.setdefault(id(snapshots[i]), []).append((i, vector))
+        for group in groups.values():
+            snapshot = snapshots[group[0][0]]
+            found = snapshot.search_by_vectors([vector for _, vector in group], RAG_K_RESULTS)
+            for (i, _), vector_docs in zip(group, found):
+                results[i] = (vector_docs, _lexical_search(snapshot, enhanced[i], RAG_K_RESULTS))
+                retrieval_cache.put(keys[i], results[i])
+    
+    logger.debug(f"Recuperación en lote: {len(queries)} consultas, {len(misses)} fuera de la caché")
+    return [_combine_results(snapshots[i], contexts[i], *results[i]) for i in range(len(queries))]
 
 # Función para obtener el retriever básico (compatible con LangChain)
 def get_retriever():
@@ -121,3 +195,47 @@ def get_retriever():
     Retorna el retriever básico de FAISS.
     """
     return base_retriever
+
+def start_warmup():
+    """
+    Inicia la carga del modelo de embeddings y del índice en segundo plano.
+    """
+    knowledge_registry.start_warmup(RAG_RELOAD_POLL_SECONDS)
+
+def is_rag_ready() -> bool:
+    """
+    Indica si el sistema RAG terminó de calentarse.
+    """
+    return knowledge_base.is_ready()
+
+def get_rag_stats() -> dict:
+    """
+    Obtiene estadísticas del sistema RAG (estado del índice y cachés).
+    """
+    stats = {
+        "ready": knowledge_base.is_ready(),
+        "index_version": knowledge_base.version,
+        "guilds": knowledge_registry.get_stats(),
+        "retrieval_cache": retrieval_cache.get_stats(),
+    }
+    if knowledge_registry.embeddings_loaded:
+        stats["query_embedding_cache"] = knowledge_registry.get_embeddings().cache.get_stats()
+    return stats
+
+def get_knowledge_fingerprint(guild_id: Optional[str] = None) -> str:
+    """
+    Huella de la base de conocimiento vigente de un servidor (o la global); cambia con cada recarga.
+    """
+    return knowledge_registry.get(guild_id).snapshot.fingerprint
+
+def embed_text(text: str) -> List[float]:
+    """
+    Embebe un texto con el modelo del RAG (con su caché y agrupación de consultas).
+    """
+    return knowledge_registry.get_embeddings().embed_query(text)
+
+def reload_knowledge_base(guild_id: Optional[str] = None) -> dict:
+    """
+    Recarga la base de conocimiento de un servidor (o la global) de forma incremental.
+    """
+    return knowledge_registry.reload(guild_id)
@@ -0,0 +1,237 @@
+"""
+Índices de entidades: mapa entidad -> documentos de la base de conocimiento
+y seguimiento incremental de las entidades de cada conversación
+"""
+
+import re
+import sys
+import threading
+from array import array
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain.schema import BaseMessage, Document
+
+from config.settings import ENTITY_TRACKER_MAX_CONVERSATIONS
+from src.rag.document_store import IDS_FILE
+from src.rag.lexical_index import STOPWORDS, strip_accents
+from src.rag.term_table import MmapTermTable, write_term_table
+from src.utils.logger import logger
+
+# Prefijo de los archivos del mapa de entidades guardado junto al índice FAISS
+ENTITY_PREFIX = "entity"
+
+# Nombres propios: palabras que empiezan con mayúscula (incluye tildes y ñ)
+ENTITY_PATTERN = re.compile(r'\b[A-ZÁÉÍÓÚÑ][a-záéíóúñü]+\b')
+
+# Palabras que suelen ir en mayúscula al inicio de una frase sin ser entidades
+NON_ENTITY_WORDS = STOPWORDS | {
+    "hola", "soy", "este", "esta", "eso", "eres", "gracias", "si", "no", "bot", "muy", "bien",
+    "hay", "puedo", "puedes", "claro", "lo", "siento",
+}
+
+
+def entity_key(entity: str) -> str:
+    """
+    Normaliza una entidad para usarla como clave (Joaquín -> joaquin).
+    """
+    return strip_accents(entity).lower()
+
+
+def extract_entities(text: str) -> List[str]:
+    """
+    Extrae las entidades de un texto en orden de aparición, sin repetir.
+    """
+    entities = OrderedDict()
+    for match in ENTITY_PATTERN.findall(text or ""):
+        key = entity_key(match)
+        if key not in NON_ENTITY_WORDS:
+            entities.pop(key, None)
+            entities[key] = match
+    return list(entities.values())
+
+
+class EntityDocumentIndex:
+    """
+    Mapa precalculado de entidades a los IDs de los documentos que las mencionan
+    """
+
+    def __init__(self):
+        self.entity_documents: Dict[str, List[str]] = defaultdict(list)
+
+    @classmethod
+    def build(cls, documents: Iterable[Document]) -> "EntityDocumentIndex":
+        """Construye el mapa a partir de los documentos de la base de conocimiento"""
+        index = cls()
+        for doc in documents:
+            index.add(doc)
+        return index
+
+    def add(self, doc: Document):
+        """Registra las entidades que menciona un documento con `metadata["id"]`"""
+        for entity in extract_entities(doc.page_content):
+            self.entity_documents[entity_key(entity)].append(doc.metadata["id"])
+
+    def lookup(self, entity: str, limit: Optional[int] = None) -> List[str]:
+        """Obtiene los IDs de los documentos que mencionan una entidad (como mucho `limit`)"""
+        return self.entity_documents.get(entity_key(entity), [])[:limit]
+
+    def __contains__(self, entity: str) -> bool:
+        return entity_key(entity) in self.entity_documents
+
+    def memory_usage(self) -> int:
+        """
+        Estimación en bytes de la memoria del proceso que ocupa el mapa (los IDs
+        de documento se comparten con el índice léxico y no se cuentan aquí).
+        """
+        return sys.getsizeof(self.entity_documents) + sum(
+            sys.getsizeof(entity) + sys.getsizeof(doc_ids) for entity, doc_ids in self.entity_documents.items()
+        )
+
+
+class EntityIndexWriter:
+    """
+    Acumula el mapa de entidades mientras se escribe el almacén de documentos y lo
+    guarda en formato mapeable; cada entidad apunta a filas del almacén
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self._postings: Dict[str, Dict[str, array]] = {}
+        self._rows = 0
+
+    def add(self, doc: Document):
+        """Añade el documento de la siguiente fila del almacén"""
+        for entity in extract_entities(doc.page_content):
+            postings = self._postings.get(entity_key(entity))
+            if postings is None:
+                postings = self._postings[entity_key(entity)] = {"rows": array('i')}
+            postings["rows"].append(self._rows)
+        self._rows += 1
+
+    def close(self):
+        """Escribe la tabla de entidades"""
+        write_term_table(self.directory, ENTITY_PREFIX, self._postings, {"rows": "int32"})
+
+
+class MmapEntityIndex:
+    """
+    Mapa de entidades de solo lectura sobre los archivos de EntityIndexWriter,
+    mapeados en memoria y compartidos entre procesos. Misma interfaz que EntityDocumentIndex.
+    """
+
+    def __init__(self, directory: Path):
+        directory = Path(directory)
+        self._table = MmapTermTable(directory, ENTITY_PREFIX, ["rows"])
+        self.doc_ids = np.load(directory / IDS_FILE, mmap_mode='r')
+
+    def lookup(self, entity: str, limit: Optional[int] = None) -> List[str]:
+        """Obtiene los IDs de los documentos que mencionan una entidad (como mucho `limit`)"""
+        postings = self._table.postings(entity_key(entity))
+        if postings is None:
+            return []
+        return [self.doc_ids[row].decode('ascii') for row in postings[0][:limit]]
+
+    def __contains__(self, entity: str) -> bool:
+        return self._table.postings(entity_key(entity)) is not None
+
+    def memory_usage(self) -> int:
+        """Memoria propia del proceso: ninguna, sus páginas son las de los archivos del índice"""
+        return 0
+
+
+@dataclass
+class _ConversationEntities:
+    """Entidades de una conversación y hasta qué mensaje se procesaron"""
+    processed_messages: int = 0
+    last_message: Optional[str] = None
+    # Mensajes recortados del inicio de la memoria (las posiciones son absolutas)
+    trimmed_messages: int = 0
+    # Clave -> (entidad, posición del último mensaje que la menciona), de la menos a la más reciente
+    entities: "OrderedDict[str, Tuple[str, int]]" = field(default_factory=OrderedDict)
+
+
+class ConversationEntityTracker:
+    """
+    Mantiene las entidades de cada conversación procesando solo los mensajes nuevos.
+
+    Conserva como mucho `max_conversations` conversaciones (las de uso más reciente);
+    la de un usuario olvidado se reconstruye desde su memoria en el siguiente turno.
+    """
+
+    def __init__(self, max_conversations: int = ENTITY_TRACKER_MAX_CONVERSATIONS):
+        self.max_conversations = max_conversations
+        self._conversations: "OrderedDict[str, _ConversationEntities]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def update(self, user_id: str, messages: Sequence[BaseMessage]) -> List[str]:
+        """
+        Actualiza las entidades del usuario con los mensajes añadidos desde la última llamada.
+
+        Args:
+            user_id: ID del usuario
+            messages: Mensajes completos de la memoria del usuario
+
+        Returns:
+            List[str]: Entidades ordenadas de la menos a la más reciente
+        """
+        with self._lock:
+            state = self._conversations.get(user_id)
+
+            # Los recortes se notifican con trim(); si aun así la memoria no coincide
+            # (se borró o se editó por fuera), reconstruir desde cero
+            if (state is None or state.processed_messages > len(messages) or
+                    (state.processed_messages and
+                     messages[state.processed_messages - 1].content != state.last_message)):
+                state = _ConversationEntities()
+                self._conversations[user_id] = state
+                while len(self._conversations) > self.max_conversations:
+                    self._conversations.popitem(last=False)
+            self._conversations.move_to_end(user_id)
+
+            for position, message in enumerate(messages[state.processed_messages:],
+                                               start=state.trimmed_messages + state.processed_messages):
+                for entity in extract_entities(str(message.content)):
+                    key = entity_key(entity)
+                    state.entities.pop(key, None)
+                    state.entities[key] = (entity, position)
+
+            if messages:
+                state.processed_messages = len(messages)
+                state.last_message = messages[-1].content
+
+            return [entity for entity, _ in state.entities.values()]
+
+    def trim(self, user_id: str, count: int):
+        """
+        Registra que se quitaron los `count` mensajes más antiguos de la memoria del
+        usuario: se descartan las entidades que solo aparecían en ellos, sin volver a
+        procesar el resto.
+        """
+        if count <= 0:
+            return
+        with self._lock:
+            state = self._conversations.get(user_id)
+            if state is None:
+                return
+            state.trimmed_messages += count
+            state.processed_messages = max(0, state.processed_messages - count)
+            # Las entidades están ordenadas por su última mención: las recortadas van primero
+            while state.entities:
+                key, (_, position) = next(iter(state.entities.items()))
+                if position >= state.trimmed_messages:
+                    break
+                del state.entities[key]
+
+    def forget(self, user_id: str):
+        """Olvida las entidades de un usuario"""
+        with self._lock:
+            self._conversations.pop(user_id, None)
+        logger.debug(f"Entidades olvidadas para usuario {user_id}")
+
+
+# Instancia global del seguimiento de entidades por conversación
+entity_tracker = ConversationEntityTracker()
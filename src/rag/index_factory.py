@@ -0,0 +1,145 @@
+"""
+Construcción de índices FAISS exactos y aproximados (HNSW, IVF, IVF-PQ, SQ8)
+"""
+
+import math
+import time
+from typing import Any, Dict, Optional
+
+import faiss
+import numpy as np
+
+from config.settings import RAG_INDEX_TYPE, RAG_INDEX_PARAMS
+from src.utils.logger import logger
+
+INDEX_TYPES = ("flat", "hnsw", "ivf", "ivfpq", "sq8")
+
+# Tipos de índice en los que se puede borrar en el sitio durante la recarga incremental.
+# Sus remove_ids compactan las etiquetas como espera FAISS.delete() de LangChain; los IVF
+# no las compactan (las posiciones de index_to_docstore_id dejarían de coincidir) y HNSW
+# no admite borrados, así que ambos se reconstruyen completos.
+REMOVABLE_INDEX_TYPES = ("flat", "sq8")
+
+# Puntos de entrenamiento mínimos por centroide que recomienda FAISS
+MIN_POINTS_PER_CENTROID = 39
+
+
+def index_signature(index_type: str = RAG_INDEX_TYPE, params: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Describe el tipo de índice y sus parámetros (forma parte de la huella del índice).
+    """
+    params = params if params is not None else RAG_INDEX_PARAMS
+    relevant = {key: value for key, value in sorted(params.items()) if not key.startswith("search_")}
+    return f"{index_type}:{relevant}"
+
+
+def supports_removal(index_type: str) -> bool:
+    """
+    Indica si el tipo de índice permite borrar vectores sin reconstruirlo.
+    """
+    return index_type in REMOVABLE_INDEX_TYPES
+
+
+def _resolve_index_type(index_type: str, num_vectors: int, dimension: int, params: Dict[str, Any]) -> str:
+    """Degrada a un índice más simple si no hay datos suficientes para entrenar el pedido"""
+    if index_type not in INDEX_TYPES:
+        logger.warning(f"Tipo de índice desconocido '{index_type}', se usará 'flat'")
+        return "flat"
+
+    if index_type in ("ivf", "ivfpq") and num_vectors < MIN_POINTS_PER_CENTROID:
+        logger.info(f"Solo {num_vectors} vectores: insuficientes para entrenar IVF, se usará 'flat'")
+        return "flat"
+
+    if index_type == "ivfpq":
+        if dimension % params["pq_m"] != 0:
+            logger.warning(f"La dimensión {dimension} no es divisible por pq_m={params['pq_m']}, se usará 'ivf'")
+            return "ivf"
+        if num_vectors < 2 ** params["pq_nbits"]:
+            logger.info(f"Solo {num_vectors} vectores: insuficientes para entrenar PQ, se usará 'ivf'")
+            return "ivf"
+
+    return index_type
+
+
+def create_index(index_type: str, dimension: int, num_vectors: int,
+                 params: Optional[Dict[str, Any]] = None) -> faiss.Index:
+    """
+    Crea un índice FAISS vacío del tipo indicado.
+
+    Args:
+        index_type: flat, hnsw, ivf, ivfpq o sq8
+        dimension: Dimensión de los vectores
+        num_vectors: Número de vectores que se van a indexar (dimensiona IVF)
+        params: Parámetros del índice (ver RAG_INDEX_PARAMS)
+
+    Returns:
+        faiss.Index: Índice sin entrenar
+    """
+    params = {**RAG_INDEX_PARAMS, **(params or {})}
+    index_type = _resolve_index_type(index_type, num_vectors, dimension, params)
+
+    if index_type == "hnsw":
+        return faiss.IndexHNSWFlat(dimension, params["hnsw_m"])
+    if index_type == "sq8":
+        return faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_8bit)
+
+    if index_type in ("ivf", "ivfpq"):
+        # nlist acotado para que cada centroide tenga puntos de entrenamiento suficientes
+        nlist = max(1, min(params["ivf_nlist"], num_vectors // MIN_POINTS_PER_CENTROID,
+                           int(4 * math.sqrt(num_vectors))))
+        quantizer = faiss.IndexFlatL2(dimension)
+        if index_type == "ivf":
+            return faiss.IndexIVFFlat(quantizer, dimension, nlist)
+        return faiss.IndexIVFPQ(quantizer, dimension, nlist, params["pq_m"], params["pq_nbits"])
+
+    return faiss.IndexFlatL2(dimension)
+
+
+def apply_search_params(index: faiss.Index, params: Optional[Dict[str, Any]] = None):
+    """
+    Ajusta los parámetros de búsqueda (nprobe, efSearch) que equilibran recall y latencia.
+    """
+    params = {**RAG_INDEX_PARAMS, **(params or {})}
+    try:
+        ivf = faiss.extract_index_ivf(index)
+        ivf.nprobe = min(params["search_nprobe"], ivf.nlist)
+    except RuntimeError:
+        pass  # No es un índice IVF
+    if hasattr(index, "hnsw"):
+        index.hnsw.efSearch = params["search_ef"]
+
+
+def training_sample_size(index_type: str, params: Optional[Dict[str, Any]] = None) -> int:
+    """
+    Número de vectores que se acumulan para entrenar el índice antes de añadir el resto
+    (0 si el tipo no requiere entrenamiento).
+    """
+    params = {**RAG_INDEX_PARAMS, **(params or {})}
+    return params["train_size"] if index_type in ("ivf", "ivfpq", "sq8") else 0
+
+
+def create_trained_index(vectors: np.ndarray, index_type: str = RAG_INDEX_TYPE,
+                         params: Optional[Dict[str, Any]] = None) -> faiss.Index:
+    """
+    Crea un índice, lo entrena con la muestra si el tipo lo requiere y le añade la muestra.
+
+    Args:
+        vectors: Primeros vectores del corpus (muestra de entrenamiento)
+        index_type: Tipo de índice (ver INDEX_TYPES)
+        params: Parámetros del índice
+
+    Returns:
+        faiss.Index: Índice listo para seguir añadiendo vectores
+    """
+    if vectors.ndim != 2 or not len(vectors):
+        raise ValueError("No hay documentos para indexar")
+
+    index = create_index(index_type, vectors.shape[1], len(vectors), params)
+    if not index.is_trained:
+        start_time = time.time()
+        index.train(vectors)
+        logger.info(f"Índice {type(index).__name__} entrenado con {len(vectors)} vectores "
+                    f"en {time.time() - start_time:.2f}s")
+    index.add(vectors)
+    apply_search_params(index, params)
+    return index
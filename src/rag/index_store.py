@@ -0,0 +1,317 @@
+"""
+Almacenamiento persistente del índice FAISS en disco
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Iterable, Optional, Tuple
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+from langchain.schema import Document
+
+from config.settings import INDEX_DIR, EMBEDDING_MODEL, RAG_INDEX_TYPE, RAG_EMBED_BATCH_SIZE
+from src.rag.index_factory import (
+    apply_search_params, create_trained_index, index_signature, training_sample_size
+)
+from src.rag.document_store import DocumentStoreWriter, MmapDocstore, RowIdMapping
+from src.rag.entity_index import EntityIndexWriter, MmapEntityIndex
+from src.rag.ingestion import batched
+from src.rag.lexical_index import LexicalIndexWriter, MmapInvertedIndex
+from src.utils.logger import logger
+
+MANIFEST_FILE = "manifest.json"
+INDEX_FILE = "index.faiss"
+
+# Lectura del índice mapeada en memoria y de solo lectura: las páginas se
+# comparten entre todos los workers de uvicorn que abren el mismo archivo
+MMAP_READ_FLAGS = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY | getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+
+
+def compute_fingerprint(documents: Iterable[Document], model_name: str = EMBEDDING_MODEL,
+                        index_config: str = "") -> str:
+    """
+    Calcula la huella de la base de conocimiento, el modelo de embeddings y el tipo de índice.
+
+    Args:
+        documents: Documentos que forman la base de conocimiento (se recorren en streaming)
+        model_name: Nombre del modelo de embeddings
+        index_config: Descripción del tipo de índice y sus parámetros
+
+    Returns:
+        str: Hash SHA-256 en hexadecimal
+    """
+    digest = hashlib.sha256()
+    digest.update(model_name.encode('utf-8'))
+    digest.update(index_config.encode('utf-8'))
+    for doc in documents:
+        digest.update(b'\0')
+        digest.update(doc.page_content.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class CorpusWriter:
+    """
+    Escribe en una sola pasada el almacén de documentos y los índices léxico y de
+    entidades, con las mismas filas que las posiciones del índice FAISS
+    """
+
+    def __init__(self, directory: Path):
+        self.documents = DocumentStoreWriter(directory)
+        self.lexical = LexicalIndexWriter(directory)
+        self.entities = EntityIndexWriter(directory)
+
+    def __enter__(self) -> "CorpusWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.documents.close()
+        if exc_type is None:
+            self.lexical.close()
+            self.entities.close()
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def add(self, doc_id: str, doc: Document):
+        """Añade un documento en la siguiente fila"""
+        self.documents.add(doc_id, doc)
+        self.lexical.add(doc)
+        self.entities.add(doc)
+
+
+class IndexStore:
+    """
+    Guarda y recupera el vectorstore FAISS para evitar re-embeddings en cada arranque.
+
+    El índice, los documentos y los índices léxico y de entidades se guardan en
+    formato mapeable en memoria; el docstore de FAISS solo resuelve IDs y lee el
+    texto bajo demanda.
+    """
+
+    def __init__(self, index_dir: Path = INDEX_DIR, model_name: str = EMBEDDING_MODEL,
+                 index_type: str = RAG_INDEX_TYPE):
+        self.index_dir = Path(index_dir)
+        self.model_name = model_name
+        self.index_type = index_type
+        self.manifest_path = self.index_dir / MANIFEST_FILE
+
+    def fingerprint(self, documents: Iterable[Document]) -> str:
+        """Calcula la huella de los documentos con la configuración de este almacén"""
+        return compute_fingerprint(documents, self.model_name, index_signature(self.index_type))
+
+    def disk_usage(self) -> int:
+        """Tamaño en bytes de los archivos del índice guardado (0 si no existe)"""
+        if not self.index_dir.exists():
+            return 0
+        return sum(path.stat().st_size for path in self.index_dir.iterdir() if path.is_file())
+
+    def _read_manifest(self) -> Optional[dict]:
+        """Lee el manifiesto del índice guardado, si existe"""
+        if not self.manifest_path.exists():
+            return None
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Manifiesto del índice ilegible: {e}")
+            return None
+
+    def load(self, fingerprint: str, embeddings: Embeddings) -> Optional[FAISS]:
+        """
+        Carga el índice guardado si coincide con la huella indicada.
+
+        Args:
+            fingerprint: Huella esperada de la base de conocimiento
+            embeddings: Modelo de embeddings para las consultas
+
+        Returns:
+            FAISS o None si no hay un índice válido en disco
+        """
+        manifest = self._read_manifest()
+        if not manifest:
+            logger.info("No hay índice persistido, se construirá uno nuevo")
+            return None
+
+        if manifest.get("fingerprint") != fingerprint or manifest.get("model_name") != self.model_name:
+            logger.info("La base de conocimiento o el modelo cambiaron, el índice persistido está obsoleto")
+            return None
+
+        try:
+            vectorstore = self._open(embeddings)
+            logger.info(f"Índice cargado desde disco: {manifest.get('document_count', 0)} documentos")
+            return vectorstore
+        except Exception as e:
+            logger.error(f"Error cargando índice desde disco: {e}")
+            return None
+
+    def _open(self, embeddings: Embeddings) -> FAISS:
+        """Abre el índice y el almacén de documentos mapeados en memoria"""
+        index_path = str(self.index_dir / INDEX_FILE)
+        try:
+            index = faiss.read_index(index_path, MMAP_READ_FLAGS)
+        except RuntimeError as e:
+            # No todos los tipos de índice admiten mmap: cargarlo en memoria
+            logger.warning(f"El índice no admite mmap ({e}), se carga en memoria")
+            index = faiss.read_index(index_path)
+        apply_search_params(index)
+
+        docstore = MmapDocstore(self.index_dir)
+        return FAISS(
+            embedding_function=embeddings,
+            index=index,
+            docstore=docstore,
+            index_to_docstore_id=RowIdMapping(docstore.ids)
+        )
+
+    def open_text_indexes(self, fingerprint: str) -> Optional[Tuple[MmapInvertedIndex, MmapEntityIndex]]:
+        """
+        Abre mapeados los índices léxico y de entidades guardados junto al índice
+        FAISS, si corresponden a la huella indicada.
+
+        Returns:
+            Tupla (índice léxico, mapa de entidades), o None si no están en disco
+            (índice guardado por una versión anterior o que no se pudo guardar)
+        """
+        manifest = self._read_manifest()
+        if not manifest or manifest.get("fingerprint") != fingerprint:
+            return None
+        try:
+            return MmapInvertedIndex(self.index_dir), MmapEntityIndex(self.index_dir)
+        except (OSError, ValueError) as e:
+            logger.info(f"Índices léxico y de entidades no disponibles en disco: {e}")
+            return None
+
+    def _temp_dir(self) -> Path:
+        """Crea un directorio temporal vacío por proceso: varios workers pueden guardar a la vez"""
+        temp_dir = self.index_dir.with_name(f"{self.index_dir.name}.tmp{os.getpid()}")
+        if temp_dir.exists():
+            shutil.rmtree(temp_dir)
+        temp_dir.mkdir(parents=True)
+        return temp_dir
+
+    def _commit(self, temp_dir: Path, index: faiss.Index, fingerprint: str, document_count: int):
+        """Escribe el índice y el manifiesto y reemplaza el directorio anterior"""
+        faiss.write_index(index, str(temp_dir / INDEX_FILE))
+
+        manifest = {
+            "fingerprint": fingerprint,
+            "model_name": self.model_name,
+            "index_type": self.index_type,
+            "document_count": document_count,
+            "created_at": time.time()
+        }
+        with open(temp_dir / MANIFEST_FILE, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+        # Reemplazar el índice anterior solo cuando el nuevo está completo.
+        # Los procesos que ya lo tenían mapeado conservan su copia hasta remapear.
+        if self.index_dir.exists():
+            shutil.rmtree(self.index_dir, ignore_errors=True)
+        temp_dir.rename(self.index_dir)
+        logger.info(f"Índice guardado en: {self.index_dir}")
+
+    def save(self, vectorstore: FAISS, fingerprint: str, document_count: int) -> bool:
+        """
+        Guarda el índice y su manifiesto en disco de forma atómica.
+
+        Args:
+            vectorstore: Vectorstore a persistir
+            fingerprint: Huella de la base de conocimiento indexada
+            document_count: Número de documentos indexados
+
+        Returns:
+            bool: True si se guardó correctamente
+        """
+        try:
+            temp_dir = self._temp_dir()
+            mapping = vectorstore.index_to_docstore_id
+            with CorpusWriter(temp_dir) as writer:
+                for position in range(len(mapping)):
+                    writer.add(mapping[position], vectorstore.docstore.search(mapping[position]))
+            self._commit(temp_dir, vectorstore.index, fingerprint, document_count)
+            return True
+        except Exception as e:
+            logger.error(f"Error guardando índice en disco: {e}")
+            return False
+
+    def build(self, documents: Iterable[Document], embeddings: Embeddings, fingerprint: str,
+              batch_size: int = RAG_EMBED_BATCH_SIZE) -> FAISS:
+        """
+        Construye el índice desde cero en streaming y lo guarda en disco.
+
+        Los documentos se embeben por lotes; los tipos que requieren entrenamiento
+        acumulan solo una muestra acotada antes de crear el índice. El texto se
+        escribe directamente en el almacén de documentos, sin copia en memoria, y
+        los índices léxico y de entidades se construyen en la misma pasada.
+
+        Args:
+            documents: Documentos de la base de conocimiento (iterable, se recorre una vez)
+            embeddings: Modelo de embeddings
+            fingerprint: Huella de los documentos
+            batch_size: Documentos embebidos por lote
+
+        Returns:
+            FAISS: Vectorstore mapeado desde disco
+        """
+        logger.info(f"Construyendo índice '{self.index_type}' en lotes de {batch_size} documentos")
+        start_time = time.time()
+        train_size = training_sample_size(self.index_type)
+
+        temp_dir = self._temp_dir()
+        index = None
+        sample = []
+        count = 0
+        with CorpusWriter(temp_dir) as writer:
+            for batch in batched(documents, batch_size):
+                vectors = np.asarray(embeddings.embed_documents([doc.page_content for doc in batch]),
+                                     dtype=np.float32)
+                # Las filas del almacén siguen el mismo orden que las posiciones en FAISS
+                for doc in batch:
+                    writer.add(doc.metadata["id"], doc)
+                count += len(batch)
+
+                if index is not None:
+                    index.add(vectors)
+                    continue
+                sample.append(vectors)
+                if sum(len(part) for part in sample) >= train_size:
+                    index = create_trained_index(np.vstack(sample), self.index_type)
+                    sample = []
+                logger.debug(f"Documentos embebidos: {count}")
+
+            if index is None:
+                # Corpus más pequeño que la muestra de entrenamiento
+                if not sample:
+                    raise ValueError("No hay documentos para indexar")
+                index = create_trained_index(np.vstack(sample), self.index_type)
+
+        self._commit(temp_dir, index, fingerprint, count)
+        logger.info(f"Índice construido con {count} documentos en {time.time() - start_time:.2f}s")
+        return self._open(embeddings)
+
+    def persist(self, vectorstore: FAISS, fingerprint: str, document_count: int) -> FAISS:
+        """
+        Guarda un vectorstore construido en memoria y lo reabre mapeado desde disco,
+        liberando la copia en memoria de vectores y documentos.
+
+        Returns:
+            FAISS: Vectorstore mapeado, o el original si no se pudo guardar
+        """
+        if not self.save(vectorstore, fingerprint, document_count):
+            return vectorstore
+        try:
+            return self._open(vectorstore.embedding_function)
+        except Exception as e:
+            logger.error(f"Error reabriendo el índice guardado: {e}")
+            return vectorstore
+
+
+# Instancia global del almacén de índices
+index_store = IndexStore()
@@ -0,0 +1,185 @@
+"""
+Pipeline de ingesta en streaming para los archivos de texto y Markdown de la base de conocimiento
+"""
+
+import hashlib
+from dataclasses import dataclass, field
+from itertools import islice
+from pathlib import Path
+from typing import Iterable, Iterator, List, Sequence, Tuple
+
+from langchain.schema import Document
+
+from config.settings import (
+    KNOWLEDGE_DIR,
+    KNOWLEDGE_EXTENSIONS,
+    KNOWLEDGE_EXCLUDE_DIRS,
+    RAG_LINE_MODE_EXTENSIONS,
+    RAG_CHUNK_SIZE,
+    RAG_CHUNK_OVERLAP,
+)
+from src.utils.logger import logger
+
+
+def document_id(content: str) -> str:
+    """
+    Genera un ID estable para un documento a partir de su contenido.
+    """
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()[:16]
+
+
+def batched(items: Iterable, size: int) -> Iterator[list]:
+    """
+    Agrupa un iterable en listas de como máximo `size` elementos.
+    """
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class TextChunker:
+    """
+    Divide texto en fragmentos de tamaño acotado con solapamiento, leyendo por párrafos
+    """
+
+    def __init__(self, chunk_size: int = RAG_CHUNK_SIZE, chunk_overlap: int = RAG_CHUNK_OVERLAP):
+        if chunk_overlap >= chunk_size:
+            raise ValueError("chunk_overlap debe ser menor que chunk_size")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+
+    def _overlap_tail(self, words: List[str]) -> List[str]:
+        """Últimas palabras del fragmento que caben en el solapamiento"""
+        tail, length = [], 0
+        for word in reversed(words):
+            length += len(word) + 1
+            if length > self.chunk_overlap:
+                break
+            tail.insert(0, word)
+        return tail
+
+    def chunk(self, lines: Iterable[str]) -> Iterator[Tuple[str, int]]:
+        """
+        Genera fragmentos a partir de las líneas de un archivo.
+
+        Args:
+            lines: Líneas del archivo (se consumen en streaming)
+
+        Returns:
+            Iterador de tuplas (texto del fragmento, línea inicial)
+        """
+        words: List[str] = []
+        length = 0
+        start_line = 1
+
+        for line_number, line in enumerate(lines, 1):
+            line_words = line.split()
+            if not words:
+                start_line = line_number
+
+            for word in line_words:
+                if length + len(word) + 1 > self.chunk_size and words:
+                    yield " ".join(words), start_line
+                    words = self._overlap_tail(words)
+                    length = sum(len(w) + 1 for w in words)
+                    start_line = line_number
+                words.append(word)
+                length += len(word) + 1
+
+            # Un párrafo que llena el fragmento lo cierra para no partir el siguiente
+            if not line_words and length >= self.chunk_size - self.chunk_overlap and words:
+                yield " ".join(words), start_line
+                words, length = [], 0
+
+        if words:
+            yield " ".join(words), start_line
+
+
+@dataclass
+class KnowledgeSource:
+    """
+    Conjunto de archivos que forman una base de conocimiento
+    """
+    directory: Path = KNOWLEDGE_DIR
+    extensions: Sequence[str] = KNOWLEDGE_EXTENSIONS
+    exclude_dirs: Sequence[str] = KNOWLEDGE_EXCLUDE_DIRS
+    line_mode_extensions: Sequence[str] = RAG_LINE_MODE_EXTENSIONS
+    chunker: TextChunker = field(default_factory=TextChunker)
+
+    def iter_files(self) -> List[Path]:
+        """Lista los archivos de la base de conocimiento en orden estable"""
+        directory = Path(self.directory)
+        if directory.is_file():
+            return [directory]
+        if not directory.exists():
+            return []
+        files = []
+        for path in directory.rglob("*"):
+            relative_parts = path.relative_to(directory).parts[:-1]
+            if any(part in self.exclude_dirs or part.startswith(".") for part in relative_parts):
+                continue
+            if path.is_file() and path.suffix.lower() in self.extensions:
+                files.append(path)
+        return sorted(files)
+
+    def signature(self) -> Tuple:
+        """Firma barata (rutas, tamaños y fechas) para detectar cambios sin leer los archivos"""
+        signature = []
+        for path in self.iter_files():
+            try:
+                stat = path.stat()
+                signature.append((str(path), stat.st_size, stat.st_mtime))
+            except FileNotFoundError:
+                continue
+        return tuple(signature)
+
+    def _source_name(self, path: Path) -> str:
+        """Nombre relativo del archivo para los metadatos"""
+        directory = Path(self.directory)
+        if directory.is_file():
+            return path.name
+        return path.relative_to(directory).as_posix()
+
+    def _iter_file(self, path: Path) -> Iterator[Tuple[str, int]]:
+        """Genera (texto, línea) de un archivo según su formato"""
+        with open(path, 'r', encoding='utf-8') as f:
+            if path.suffix.lower() in self.line_mode_extensions:
+                # Un hecho por línea; las líneas que empiezan con '#' son comentarios
+                for line_number, line in enumerate(f, 1):
+                    content = line.strip()
+                    if content and not content.startswith('#'):
+                        yield content, line_number
+            else:
+                yield from self.chunker.chunk(f)
+
+    def iter_documents(self) -> Iterator[Document]:
+        """
+        Genera los documentos de todos los archivos sin cargarlos completos en memoria.
+
+        Los fragmentos repetidos se emiten una sola vez (el ID depende del contenido).
+        """
+        seen_ids = set()
+        for path in self.iter_files():
+            source = self._source_name(path)
+            try:
+                for content, line_number in self._iter_file(path):
+                    doc_id = document_id(content)
+                    if doc_id in seen_ids:
+                        continue
+                    seen_ids.add(doc_id)
+                    yield Document(page_content=content,
+                                   metadata={"id": doc_id, "source": source, "line": line_number})
+            except Exception as e:
+                logger.error(f"Error leyendo {source}: {e}")
+
+
+def load_documents(path: Path) -> List[Document]:
+    """
+    Carga un archivo o directorio de base de conocimiento como lista de Documentos para LangChain.
+    """
+    documents = list(KnowledgeSource(directory=path).iter_documents())
+    logger.info(f"Documentos cargados exitosamente: {len(documents)} documentos")
+    return documents
@@ -0,0 +1,339 @@
+"""
+Base de conocimiento con recarga incremental y en caliente del índice FAISS
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Any, Callable, List, Optional, Tuple, Union
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from langchain.schema import Document
+
+from config.settings import RAG_K_RESULTS, RAG_EMBED_BATCH_SIZE
+from src.rag.index_store import IndexStore, index_store
+from src.rag.index_factory import supports_removal
+from src.rag.ingestion import KnowledgeSource, batched
+from src.rag.document_store import MmapDocstore
+from src.rag.lexical_index import InvertedIndex, MmapInvertedIndex
+from src.rag.entity_index import EntityDocumentIndex, MmapEntityIndex
+from src.utils.logger import logger
+from src.utils.metrics import metrics_collector
+
+
+@dataclass(frozen=True)
+class IndexSnapshot:
+    """Estado inmutable del índice que se intercambia atómicamente en cada recarga"""
+    vectorstore: FAISS
+    retriever: BaseRetriever
+    lexical_index: Union[InvertedIndex, MmapInvertedIndex]
+    entity_index: Union[EntityDocumentIndex, MmapEntityIndex]
+    version: int
+    fingerprint: str
+    # Memoria del proceso de los índices léxico y de entidades (0 si están mapeados)
+    memory_bytes: int = 0
+
+    def get_documents(self, doc_ids: List[str]) -> List[Document]:
+        """Resuelve IDs de documento contra el docstore del vectorstore"""
+        documents = []
+        for doc_id in doc_ids:
+            doc = self.vectorstore.docstore.search(doc_id)
+            if isinstance(doc, Document):
+                documents.append(doc)
+        return documents
+
+    def search_by_vectors(self, vectors: List[List[float]], k: int) -> List[List[Document]]:
+        """
+        Búsqueda vectorial de varias consultas en una sola llamada a FAISS.
+
+        Args:
+            vectors: Embeddings de las consultas
+            k: Documentos por consulta
+
+        Returns:
+            List[List[Document]]: Documentos de cada consulta, del más al menos parecido
+        """
+        if not vectors:
+            return []
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if getattr(self.vectorstore, "_normalize_L2", False):
+            faiss.normalize_L2(matrix)
+        _, rows = self.vectorstore.index.search(matrix, k)
+
+        results = []
+        for query_rows in rows:
+            doc_ids = []
+            for row in query_rows:
+                if row < 0:
+                    continue  # Menos de k resultados
+                doc_id = self.vectorstore.index_to_docstore_id.get(int(row))
+                if doc_id is not None:
+                    doc_ids.append(doc_id)
+            results.append(self.get_documents(doc_ids))
+        return results
+
+
+class KnowledgeBase:
+    """
+    Base de conocimiento respaldada por FAISS con recarga incremental
+    """
+
+    def __init__(self, source: KnowledgeSource, embeddings_factory: Callable[[], Embeddings],
+                 store: IndexStore = index_store, k: int = RAG_K_RESULTS):
+        self.source = source
+        self.store = store
+        self.k = k
+
+        # El modelo de embeddings se crea al cargar, no al construir el objeto
+        self.embeddings_factory = embeddings_factory
+        self.embeddings: Optional[Embeddings] = None
+
+        # Snapshot actual; los lectores lo toman una sola vez por consulta
+        self._snapshot: Optional[IndexSnapshot] = None
+        self._ready = threading.Event()
+        self._warmup_thread = None
+
+        # Lock para serializar cargas y recargas (las búsquedas no lo usan)
+        self._reload_lock = threading.Lock()
+        self._source_signature: Tuple = ()
+        self._watcher_thread = None
+        self._watcher_running = False
+
+    @property
+    def snapshot(self) -> IndexSnapshot:
+        """Obtiene el snapshot actual del índice, cargándolo si todavía no existe"""
+        if self._snapshot is None:
+            self.load()
+        return self._snapshot
+
+    def is_ready(self) -> bool:
+        """Indica si el índice ya está cargado y listo para consultas"""
+        return self._ready.is_set()
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """Espera a que termine el calentamiento del índice"""
+        return self._ready.wait(timeout)
+
+    @property
+    def version(self) -> int:
+        """Versión del índice, incrementada en cada recarga con cambios"""
+        return self._snapshot.version if self._snapshot else 0
+
+    def memory_usage(self) -> int:
+        """
+        Estimación en bytes de la memoria que ocupa el índice cargado: el tamaño de
+        sus archivos, que es lo que termina residente al consultarlo, más los
+        índices léxico y de entidades si se construyeron en memoria.
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            return 0
+        return self.store.disk_usage() + snapshot.memory_bytes
+
+    def _publish(self, vectorstore: FAISS, fingerprint: str):
+        """Publica un nuevo snapshot reemplazando la referencia en una sola asignación"""
+        # Los índices léxico y de entidades se guardan junto al índice FAISS y se
+        # abren mapeados (compartidos entre workers)
+        text_indexes = self.store.open_text_indexes(fingerprint)
+        if text_indexes is not None:
+            lexical_index, entity_index = text_indexes
+        else:
+            # Sin ellos en disco se llenan en memoria en una sola pasada por los archivos
+            logger.info("Índices léxico y de entidades no guardados, se construyen en memoria")
+            lexical_index = InvertedIndex()
+            entity_index = EntityDocumentIndex()
+            for doc in self.source.iter_documents():
+                lexical_index.add(doc)
+                entity_index.add(doc)
+
+        version = self.version + 1
+        self._snapshot = IndexSnapshot(
+            vectorstore=vectorstore,
+            retriever=vectorstore.as_retriever(search_kwargs={"k": self.k}),
+            lexical_index=lexical_index,
+            entity_index=entity_index,
+            version=version,
+            fingerprint=fingerprint,
+            memory_bytes=lexical_index.memory_usage() + entity_index.memory_usage()
+        )
+        logger.info(f"Índice publicado (versión {version}, {len(vectorstore.index_to_docstore_id)} documentos)")
+
+    def load(self):
+        """Carga el índice desde disco o lo construye si la base de conocimiento cambió"""
+        with self._reload_lock:
+            # Otro hilo pudo terminar la carga mientras esperábamos el lock
+            if self._snapshot is not None:
+                return
+
+            if self.embeddings is None:
+                self.embeddings = self.embeddings_factory()
+
+            self._source_signature = self.source.signature()
+            fingerprint = self.store.fingerprint(self.source.iter_documents())
+            vectorstore = self.store.load(fingerprint, self.embeddings)
+            if vectorstore is None:
+                vectorstore = self.store.build(self.source.iter_documents(), self.embeddings, fingerprint)
+            self._publish(vectorstore, fingerprint)
+            self._ready.set()
+
+    def start_warmup(self, watch_interval_seconds: float = 0):
+        """
+        Carga el índice en segundo plano para no bloquear el arranque del servidor.
+
+        Args:
+            watch_interval_seconds: Intervalo de vigilancia de los archivos fuente tras la carga
+        """
+        if self._warmup_thread is not None:
+            return
+
+        def warmup():
+            start_time = time.time()
+            try:
+                self.load()
+                metrics_collector.record_response_time("rag_warmup_time_ms", start_time)
+                logger.info(f"Calentamiento del RAG completado en {time.time() - start_time:.2f}s")
+                self.start_watcher(watch_interval_seconds)
+            except Exception as e:
+                logger.error(f"Error en el calentamiento del RAG: {e}", exc_info=True)
+
+        self._warmup_thread = threading.Thread(target=warmup, name="RAGWarmup")
+        self._warmup_thread.daemon = True
+        self._warmup_thread.start()
+        logger.info("Calentamiento del RAG iniciado en segundo plano")
+
+    @staticmethod
+    def _clone_vectorstore(vectorstore: FAISS) -> FAISS:
+        """Copia el vectorstore para modificarlo sin afectar a las búsquedas en curso"""
+        docstore = vectorstore.docstore
+        if isinstance(docstore, MmapDocstore):
+            docstore = docstore.copy()
+        else:
+            docstore = InMemoryDocstore(dict(docstore._dict))
+
+        return FAISS(
+            embedding_function=vectorstore.embedding_function,
+            # clone_index de un índice mapeado devuelve una vista de solo lectura:
+            # serializarlo obliga a copiar los vectores a memoria propia
+            index=faiss.deserialize_index(faiss.serialize_index(vectorstore.index)),
+            docstore=docstore,
+            index_to_docstore_id=dict(vectorstore.index_to_docstore_id),
+            distance_strategy=vectorstore.distance_strategy
+        )
+
+    def reload(self) -> Dict[str, Any]:
+        """
+        Recarga la base de conocimiento embebiendo solo los documentos nuevos.
+
+        Returns:
+            Dict con el número de documentos añadidos y eliminados y la versión resultante
+        """
+        with self._reload_lock:
+            if self._snapshot is None:
+                logger.info("La base de conocimiento aún no está cargada, se omite la recarga")
+                return {"added": 0, "removed": 0, "version": 0, "changed": False}
+
+            start_time = time.time()
+            self._source_signature = self.source.signature()
+            snapshot = self._snapshot
+
+            fingerprint = self.store.fingerprint(self.source.iter_documents())
+            if fingerprint == snapshot.fingerprint:
+                logger.info("Recarga de la base de conocimiento: sin cambios")
+                return {"added": 0, "removed": 0, "version": snapshot.version, "changed": False}
+
+            # Solo se retienen los IDs y los documentos nuevos, no el corpus completo
+            indexed_ids = set(snapshot.vectorstore.index_to_docstore_id.values())
+            current_ids = set()
+            added = []
+            for doc in self.source.iter_documents():
+                current_ids.add(doc.metadata["id"])
+                if doc.metadata["id"] not in indexed_ids:
+                    added.append(doc)
+            removed = list(indexed_ids - current_ids)
+
+            # Otro worker pudo haber guardado ya el índice actualizado: solo remapearlo
+            vectorstore = self.store.load(fingerprint, self.embeddings)
+            if vectorstore is not None:
+                logger.info("Índice actualizado encontrado en disco, se reutiliza")
+            elif removed and not supports_removal(self.store.index_type):
+                # HNSW e IVF no permiten borrar vectores de forma consistente: reconstruir completo
+                logger.info(f"El índice '{self.store.index_type}' no admite borrados, se reconstruye completo")
+                vectorstore = self.store.build(self.source.iter_documents(), self.embeddings, fingerprint)
+            else:
+                vectorstore = self._clone_vectorstore(snapshot.vectorstore)
+                if removed:
+                    vectorstore.delete(removed)
+                for batch in batched(added, RAG_EMBED_BATCH_SIZE):
+                    vectorstore.add_documents(batch, ids=[doc.metadata["id"] for doc in batch])
+                vectorstore = self.store.persist(vectorstore, fingerprint, len(current_ids))
+
+            self._publish(vectorstore, fingerprint)
+
+            metrics_collector.increment_counter("rag_reloads_total")
+            metrics_collector.record_response_time("rag_reload_time_ms", start_time)
+            logger.info(f"Base de conocimiento recargada: +{len(added)} / -{len(removed)} documentos "
+                        f"en {time.time() - start_time:.2f}s")
+            return {"added": len(added), "removed": len(removed), "version": self.version, "changed": True}
+
+    def reload_if_modified(self) -> Optional[Dict[str, Any]]:
+        """Recarga la base de conocimiento solo si algún archivo fuente cambió"""
+        if self.source.signature() == self._source_signature:
+            return None
+        return self.reload()
+
+    def start_watcher(self, interval_seconds: float):
+        """
+        Inicia un hilo que vigila los archivos fuente (rutas, tamaños y fechas de modificación).
+
+        Args:
+            interval_seconds: Intervalo de sondeo; 0 o negativo lo deshabilita
+        """
+        if interval_seconds <= 0 or self._watcher_running:
+            return
+
+        def watch_loop():
+            while self._watcher_running:
+                time.sleep(interval_seconds)
+                try:
+                    self.reload_if_modified()
+                except Exception as e:
+                    logger.error(f"Error recargando la base de conocimiento: {e}")
+
+        self._watcher_running = True
+        self._watcher_thread = threading.Thread(target=watch_loop, name="KnowledgeBaseWatcher")
+        self._watcher_thread.daemon = True
+        self._watcher_thread.start()
+        logger.info(f"Vigilancia de {self.source.directory} iniciada (cada {interval_seconds}s)")
+
+    def stop_watcher(self):
+        """Detiene el hilo de vigilancia"""
+        self._watcher_running = False
+
+    def unload(self):
+        """
+        Descarga el índice de memoria; se volverá a abrir desde disco en el próximo uso.
+
+        Las consultas en curso conservan su snapshot hasta terminar.
+        """
+        with self._reload_lock:
+            self.stop_watcher()
+            self._snapshot = None
+            self._ready.clear()
+            self._source_signature = ()
+
+
+class KnowledgeBaseRetriever(BaseRetriever):
+    """
+    Retriever que delega siempre en el snapshot vigente de la base de conocimiento
+    """
+
+    knowledge_base: Any
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.knowledge_base.snapshot.retriever.invoke(query)
@@ -0,0 +1,193 @@
+"""
+Registro de bases de conocimiento por servidor de Discord, con carga diferida
+y descarga LRU bajo un presupuesto de memoria
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from langchain_core.embeddings import Embeddings
+
+from config.settings import GUILD_KNOWLEDGE_DIR, GUILD_INDEX_DIRNAME, RAG_GUILD_MEMORY_BUDGET_MB
+from src.rag.index_store import IndexStore, index_store
+from src.rag.ingestion import KnowledgeSource
+from src.rag.knowledge_base import KnowledgeBase
+from src.utils.logger import logger
+from src.utils.metrics import metrics_collector
+
+
+class KnowledgeBaseRegistry:
+    """
+    Bases de conocimiento de cada servidor con la global como respaldo.
+
+    Un servidor tiene base propia si existe `GUILD_KNOWLEDGE_DIR/<guild_id>/`.
+    Su índice se abre en el primer uso y, si los índices residentes superan el
+    presupuesto de memoria, se descargan los usados hace más tiempo. Todas las
+    bases comparten el mismo modelo de embeddings.
+    """
+
+    def __init__(self, embeddings_factory: Callable[[], Embeddings],
+                 guilds_dir: Path = GUILD_KNOWLEDGE_DIR,
+                 memory_budget_mb: int = RAG_GUILD_MEMORY_BUDGET_MB):
+        self.embeddings_factory = embeddings_factory
+        self.guilds_dir = Path(guilds_dir)
+        self.memory_budget_bytes = memory_budget_mb * 1024 * 1024
+
+        self._embeddings: Optional[Embeddings] = None
+        self._embeddings_lock = threading.Lock()
+
+        self.global_knowledge_base = KnowledgeBase(KnowledgeSource(), self.get_embeddings, store=index_store)
+
+        # Bases de servidores en orden de uso (la más reciente al final)
+        self._guilds: "OrderedDict[str, KnowledgeBase]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._watcher_thread = None
+        self._watcher_running = False
+
+    def get_embeddings(self) -> Embeddings:
+        """Obtiene el modelo de embeddings compartido, creándolo en el primer uso"""
+        if self._embeddings is None:
+            with self._embeddings_lock:
+                if self._embeddings is None:
+                    self._embeddings = self.embeddings_factory()
+        return self._embeddings
+
+    @property
+    def embeddings_loaded(self) -> bool:
+        """Indica si el modelo de embeddings ya se creó"""
+        return self._embeddings is not None
+
+    def _guild_dir(self, guild_id: Optional[str]) -> Optional[Path]:
+        """Carpeta de la base propia del servidor, o None si no tiene"""
+        # Los IDs de Discord son numéricos: cualquier otra cosa no es una ruta válida
+        if not guild_id or not str(guild_id).isdigit():
+            return None
+        directory = self.guilds_dir / str(guild_id)
+        return directory if directory.is_dir() else None
+
+    def _create(self, guild_id: str, directory: Path) -> KnowledgeBase:
+        """Crea la base de conocimiento de un servidor (sin cargar el índice)"""
+        store = IndexStore(index_dir=directory / GUILD_INDEX_DIRNAME)
+        return KnowledgeBase(KnowledgeSource(directory=directory), self.get_embeddings, store=store)
+
+    def get(self, guild_id: Optional[str] = None) -> KnowledgeBase:
+        """
+        Obtiene la base de conocimiento de un servidor, cargándola si hace falta.
+
+        Args:
+            guild_id: ID del servidor de Discord (None para mensajes directos)
+
+        Returns:
+            KnowledgeBase: Base del servidor, o la global si no tiene una propia
+        """
+        directory = self._guild_dir(guild_id)
+        if directory is None:
+            return self.global_knowledge_base
+
+        guild_id = str(guild_id)
+        with self._lock:
+            knowledge_base = self._guilds.get(guild_id)
+            if knowledge_base is None:
+                knowledge_base = self._create(guild_id, directory)
+                self._guilds[guild_id] = knowledge_base
+            self._guilds.move_to_end(guild_id)
+
+        if knowledge_base.is_ready():
+            return knowledge_base
+
+        # La carga se hace fuera del lock del registro para no bloquear a otros servidores
+        start_time = time.time()
+        try:
+            knowledge_base.load()
+        except Exception as e:
+            logger.error(f"Error cargando la base de conocimiento del servidor {guild_id}: {e}")
+            with self._lock:
+                if self._guilds.get(guild_id) is knowledge_base:
+                    del self._guilds[guild_id]
+            return self.global_knowledge_base
+
+        metrics_collector.increment_counter("rag_guild_loads_total")
+        logger.info(f"Base de conocimiento del servidor {guild_id} cargada en {time.time() - start_time:.2f}s")
+        self._evict_over_budget(keep=guild_id)
+        return knowledge_base
+
+    def _evict_over_budget(self, keep: str):
+        """Descarga las bases menos usadas hasta quedar dentro del presupuesto"""
+        with self._lock:
+            usage = {guild_id: kb.memory_usage() for guild_id, kb in self._guilds.items()}
+            total = sum(usage.values())
+            evicted = []
+            for guild_id in list(self._guilds):
+                if total <= self.memory_budget_bytes:
+                    break
+                if guild_id == keep:
+                    continue
+                self._guilds.pop(guild_id).unload()
+                total -= usage[guild_id]
+                evicted.append(guild_id)
+
+        if evicted:
+            metrics_collector.increment_counter("rag_guild_evictions_total", len(evicted))
+            logger.info(f"Bases de conocimiento descargadas por presupuesto de memoria: {evicted}")
+        metrics_collector.record_value("rag_guild_resident_mb", total / (1024 * 1024))
+
+    def resident_guilds(self) -> Dict[str, KnowledgeBase]:
+        """Bases de servidores cargadas actualmente"""
+        with self._lock:
+            return dict(self._guilds)
+
+    def reload(self, guild_id: Optional[str] = None) -> Dict[str, Any]:
+        """Recarga la base del servidor indicado (o la global)"""
+        return self.get(guild_id).reload()
+
+    def start_warmup(self, watch_interval_seconds: float = 0):
+        """
+        Calienta la base global en segundo plano y vigila todas las bases residentes.
+        """
+        self.global_knowledge_base.start_warmup()
+        self.start_watcher(watch_interval_seconds)
+
+    def start_watcher(self, interval_seconds: float):
+        """
+        Inicia un único hilo que vigila los archivos de la base global y de las
+        bases de servidores residentes.
+
+        Args:
+            interval_seconds: Intervalo de sondeo; 0 o negativo lo deshabilita
+        """
+        if interval_seconds <= 0 or self._watcher_running:
+            return
+
+        def watch_loop():
+            while self._watcher_running:
+                time.sleep(interval_seconds)
+                knowledge_bases = [self.global_knowledge_base, *self.resident_guilds().values()]
+                for knowledge_base in knowledge_bases:
+                    if not knowledge_base.is_ready():
+                        continue
+                    try:
+                        knowledge_base.reload_if_modified()
+                    except Exception as e:
+                        logger.error(f"Error recargando la base de conocimiento: {e}")
+
+        self._watcher_running = True
+        self._watcher_thread = threading.Thread(target=watch_loop, name="KnowledgeBaseWatcher")
+        self._watcher_thread.daemon = True
+        self._watcher_thread.start()
+        logger.info(f"Vigilancia de las bases de conocimiento iniciada (cada {interval_seconds}s)")
+
+    def stop_watcher(self):
+        """Detiene el hilo de vigilancia"""
+        self._watcher_running = False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Estadísticas de las bases de servidores residentes"""
+        resident = self.resident_guilds()
+        return {
+            "resident_guilds": len(resident),
+            "resident_mb": round(sum(kb.memory_usage() for kb in resident.values()) / (1024 * 1024), 2),
+            "memory_budget_mb": self.memory_budget_bytes // (1024 * 1024),
+        }
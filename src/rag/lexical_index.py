@@ -0,0 +1,225 @@
+"""
+Índice invertido BM25 para búsqueda léxica y fusión con la búsqueda vectorial
+"""
+
+import math
+import re
+import sys
+import unicodedata
+from array import array
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+from langchain.schema import Document
+
+from src.rag.document_store import IDS_FILE
+from src.rag.term_table import MmapTermTable, write_term_table
+
+# Prefijo de los archivos del índice léxico guardado junto al índice FAISS
+LEXICAL_PREFIX = "lexical"
+DOC_LENGTHS_FILE = "lexical_doc_lengths.npy"
+
+# Palabras vacías frecuentes que no aportan a la búsqueda léxica
+STOPWORDS = {
+    "a", "al", "con", "de", "del", "el", "en", "es", "la", "las", "le", "lo", "los", "me", "mi",
+    "para", "por", "se", "su", "te", "tu", "un", "una", "y", "o", "que", "quien", "cuando",
+    "donde", "como", "cual", "the", "is", "of", "and", "to", "in", "who", "what",
+}
+
+
+def strip_accents(text: str) -> str:
+    """
+    Elimina tildes y diacríticos (Joaquín -> Joaquin).
+    """
+    normalized = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in normalized if not unicodedata.combining(c))
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Divide un texto en términos normalizados para el índice invertido.
+    """
+    words = re.findall(r'\w+', strip_accents(text).lower())
+    return [word for word in words if len(word) > 1 and word not in STOPWORDS]
+
+
+class InvertedIndex:
+    """
+    Índice invertido con puntuación BM25 sobre la base de conocimiento.
+
+    Solo guarda IDs de documento; el texto se resuelve contra el docstore.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self.doc_lengths: Dict[str, int] = {}
+        self.avg_doc_length = 0.0
+        self._total_length = 0
+
+    def add(self, doc: Document):
+        """Añade un documento con `metadata["id"]` al índice"""
+        doc_id = doc.metadata["id"]
+        terms = tokenize(doc.page_content)
+        self.doc_lengths[doc_id] = len(terms)
+        for term, frequency in Counter(terms).items():
+            self.postings[term][doc_id] = frequency
+        self._total_length += len(terms)
+        self.avg_doc_length = self._total_length / len(self.doc_lengths)
+
+    @classmethod
+    def build(cls, documents: Iterable[Document]) -> "InvertedIndex":
+        """
+        Construye el índice a partir de documentos con `metadata["id"]`.
+        """
+        index = cls()
+        for doc in documents:
+            index.add(doc)
+        return index
+
+    def memory_usage(self) -> int:
+        """
+        Estimación en bytes de la memoria del proceso que ocupa el índice: los
+        diccionarios de postings y longitudes con sus términos e IDs de documento.
+        """
+        total = sys.getsizeof(self.postings) + sys.getsizeof(self.doc_lengths)
+        for term, postings in self.postings.items():
+            total += sys.getsizeof(term) + sys.getsizeof(postings)
+        # Los IDs se comparten entre las postings y doc_lengths: se cuentan una vez
+        total += sum(sys.getsizeof(doc_id) for doc_id in self.doc_lengths)
+        return total
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        """
+        Busca los documentos con mayor puntuación BM25 para la consulta.
+
+        Args:
+            query: Texto de la consulta
+            k: Número máximo de resultados
+
+        Returns:
+            Lista de tuplas (ID de documento, puntuación) ordenada de mayor a menor
+        """
+        total_docs = len(self.doc_lengths)
+        if not total_docs:
+            return []
+
+        scores: Dict[str, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (total_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, frequency in postings.items():
+                length_norm = 1 - self.b + self.b * self.doc_lengths[doc_id] / (self.avg_doc_length or 1)
+                scores[doc_id] += idf * frequency * (self.k1 + 1) / (frequency + self.k1 * length_norm)
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+class LexicalIndexWriter:
+    """
+    Acumula las postings BM25 mientras se escribe el almacén de documentos y las
+    guarda en formato mapeable; las postings apuntan a filas del almacén
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self._postings: Dict[str, Dict[str, array]] = {}
+        self._doc_lengths = array('i')
+
+    def add(self, doc: Document):
+        """Añade el documento de la siguiente fila del almacén"""
+        row = len(self._doc_lengths)
+        terms = tokenize(doc.page_content)
+        self._doc_lengths.append(len(terms))
+        for term, frequency in Counter(terms).items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {"rows": array('i'), "frequencies": array('i')}
+            postings["rows"].append(row)
+            postings["frequencies"].append(frequency)
+
+    def close(self):
+        """Escribe la tabla de términos y las longitudes de los documentos"""
+        write_term_table(self.directory, LEXICAL_PREFIX, self._postings,
+                         {"rows": "int32", "frequencies": "int32"})
+        np.save(self.directory / DOC_LENGTHS_FILE, np.asarray(self._doc_lengths, dtype=np.int32))
+
+
+class MmapInvertedIndex:
+    """
+    Índice BM25 de solo lectura sobre los archivos de LexicalIndexWriter, mapeados
+    en memoria y compartidos entre procesos. Misma interfaz de búsqueda que InvertedIndex.
+    """
+
+    def __init__(self, directory: Path, k1: float = 1.5, b: float = 0.75):
+        directory = Path(directory)
+        self.k1 = k1
+        self.b = b
+        self._table = MmapTermTable(directory, LEXICAL_PREFIX, ["rows", "frequencies"])
+        self.doc_lengths = np.load(directory / DOC_LENGTHS_FILE, mmap_mode='r')
+        self.doc_ids = np.load(directory / IDS_FILE, mmap_mode='r')
+        self.avg_doc_length = float(self.doc_lengths.mean()) if len(self.doc_lengths) else 0.0
+
+    def memory_usage(self) -> int:
+        """Memoria propia del proceso: ninguna, sus páginas son las de los archivos del índice"""
+        return 0
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        """
+        Busca los documentos con mayor puntuación BM25 para la consulta.
+
+        Returns:
+            Lista de tuplas (ID de documento, puntuación) ordenada de mayor a menor
+        """
+        total_docs = len(self.doc_lengths)
+        if not total_docs:
+            return []
+
+        matched_rows, matched_scores = [], []
+        for term in set(tokenize(query)):
+            postings = self._table.postings(term)
+            if postings is None:
+                continue
+            rows, frequencies = postings
+            frequencies = frequencies.astype(np.float64)
+            idf = math.log(1 + (total_docs - len(rows) + 0.5) / (len(rows) + 0.5))
+            length_norm = 1 - self.b + self.b * self.doc_lengths[rows] / (self.avg_doc_length or 1)
+            matched_rows.append(rows)
+            matched_scores.append(idf * frequencies * (self.k1 + 1) / (frequencies + self.k1 * length_norm))
+        if not matched_rows:
+            return []
+
+        # Sumar las puntuaciones de cada documento entre términos
+        rows, inverse = np.unique(np.concatenate(matched_rows), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(matched_scores))
+        top = np.argsort(-scores, kind="stable")[:k]
+        return [(self.doc_ids[rows[i]].decode('ascii'), float(scores[i])) for i in top]
+
+
+def reciprocal_rank_fusion(result_lists: List[List[Document]], limit: int, rrf_k: int = 60) -> List[Document]:
+    """
+    Combina varias listas de resultados con Reciprocal Rank Fusion.
+
+    Args:
+        result_lists: Listas de documentos ordenadas por relevancia
+        limit: Número máximo de documentos a retornar
+        rrf_k: Constante de suavizado de RRF
+
+    Returns:
+        List[Document]: Documentos fusionados y ordenados
+    """
+    scores: Dict[str, float] = defaultdict(float)
+    documents: Dict[str, Document] = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results):
+            key = doc.metadata.get("id") or doc.page_content
+            scores[key] += 1 / (rrf_k + rank + 1)
+            documents.setdefault(key, doc)
+
+    ranked = sorted(scores, key=lambda key: scores[key], reverse=True)[:limit]
+    return [documents[key] for key in ranked]
@@ -0,0 +1,102 @@
+"""
+Tabla de términos con listas de postings en formato de offsets, mapeable en memoria
+(mmap) y compartida en modo solo lectura por todos los procesos que la abren
+"""
+
+import mmap
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Archivos de una tabla; cada índice usa su propio prefijo
+TERMS_FILE = "{prefix}_terms.bin"
+TERM_OFFSETS_FILE = "{prefix}_term_offsets.npy"
+POSTINGS_OFFSETS_FILE = "{prefix}_postings_offsets.npy"
+POSTINGS_FILE = "{prefix}_postings_{column}.npy"
+
+
+def write_term_table(directory: Path, prefix: str, postings: Dict[str, Dict[str, list]],
+                     dtypes: Dict[str, str]):
+    """
+    Escribe una tabla de términos: los términos ordenados concatenados en un
+    archivo, sus offsets, y por cada columna un array con las postings de todos
+    los términos seguidas (los offsets de postings delimitan las de cada término).
+
+    Args:
+        directory: Directorio de destino
+        prefix: Prefijo de los archivos (ej: "lexical")
+        postings: Término -> columna -> valores de sus postings
+        dtypes: Tipo numpy de cada columna
+    """
+    directory = Path(directory)
+    terms = sorted(postings)
+    encoded = [term.encode('utf-8') for term in terms]
+
+    term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    term_offsets[1:] = np.cumsum([len(term) for term in encoded])
+    postings_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    postings_offsets[1:] = np.cumsum([len(next(iter(postings[term].values()))) for term in terms])
+
+    with open(directory / TERMS_FILE.format(prefix=prefix), 'wb') as f:
+        f.write(b"".join(encoded))
+    np.save(directory / TERM_OFFSETS_FILE.format(prefix=prefix), term_offsets)
+    np.save(directory / POSTINGS_OFFSETS_FILE.format(prefix=prefix), postings_offsets)
+    for column, dtype in dtypes.items():
+        values = np.fromiter((value for term in terms for value in postings[term][column]),
+                             dtype=dtype, count=int(postings_offsets[-1]))
+        np.save(directory / POSTINGS_FILE.format(prefix=prefix, column=column), values)
+
+
+class MmapTermTable:
+    """
+    Tabla de términos de solo lectura sobre archivos mapeados en memoria.
+
+    Los términos se buscan por búsqueda binaria sobre el archivo ordenado, sin
+    cargar el vocabulario ni las postings en memoria del proceso.
+    """
+
+    def __init__(self, directory: Path, prefix: str, columns: List[str]):
+        directory = Path(directory)
+        with open(directory / TERMS_FILE.format(prefix=prefix), 'rb') as f:
+            size = f.seek(0, 2)
+            self._terms = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self._term_offsets = np.load(directory / TERM_OFFSETS_FILE.format(prefix=prefix), mmap_mode='r')
+        self._postings_offsets = np.load(directory / POSTINGS_OFFSETS_FILE.format(prefix=prefix), mmap_mode='r')
+        self._columns = {
+            column: np.load(directory / POSTINGS_FILE.format(prefix=prefix, column=column), mmap_mode='r')
+            for column in columns
+        }
+
+    def __len__(self) -> int:
+        return len(self._term_offsets) - 1
+
+    def _term(self, position: int) -> bytes:
+        return bytes(self._terms[int(self._term_offsets[position]):int(self._term_offsets[position + 1])])
+
+    def _find(self, term: str) -> Optional[int]:
+        """Posición del término en la tabla ordenada, o None si no está"""
+        key = term.encode('utf-8')
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if self._term(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self) and self._term(low) == key:
+            return low
+        return None
+
+    def postings(self, term: str) -> Optional[Tuple[np.ndarray, ...]]:
+        """
+        Postings de un término.
+
+        Returns:
+            Tupla con el array de cada columna (vistas sobre el mmap), o None si el término no existe
+        """
+        position = self._find(term)
+        if position is None:
+            return None
+        start, end = int(self._postings_offsets[position]), int(self._postings_offsets[position + 1])
+        return tuple(values[start:end] for values in self._columns.values())
@@ -0,0 +1,84 @@
+"""
+Caché LRU con expiración (TTL) segura para hilos
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+from src.utils.metrics import metrics_collector
+
+
+class LRUCache:
+    """
+    Caché acotada con política LRU y expiración opcional por entrada
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float = 0, metrics_prefix: Optional[str] = None):
+        """
+        Args:
+            max_size: Número máximo de entradas
+            ttl_seconds: Tiempo de vida de cada entrada; 0 deshabilita la expiración
+            metrics_prefix: Prefijo de las métricas de aciertos/fallos (ej: "rag_query_embedding_cache")
+        """
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.metrics_prefix = metrics_prefix
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _record(self, hit: bool):
+        """Actualiza los contadores de aciertos y fallos"""
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        if self.metrics_prefix:
+            metrics_collector.increment_counter(f"{self.metrics_prefix}_{'hits' if hit else 'misses'}")
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Obtiene un valor de la caché o None si no existe o expiró"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if not expires_at or expires_at > time.time():
+                    self._data.move_to_end(key)
+                    self._record(True)
+                    return value
+                del self._data[key]
+            self._record(False)
+            return None
+
+    def put(self, key: Hashable, value: Any):
+        """Guarda un valor, expulsando la entrada menos usada si la caché está llena"""
+        if self.max_size <= 0:
+            return
+        expires_at = time.time() + self.ttl_seconds if self.ttl_seconds > 0 else 0
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """Vacía la caché"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Obtiene estadísticas de uso de la caché"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate_percent": round(self.hits / total * 100, 2) if total else 0
+        }
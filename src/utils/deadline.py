@@ -0,0 +1,66 @@
+"""
+Tiempos límite de las peticiones
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class DeadlineExceeded(Exception):
+    """La petición superó su tiempo límite y su trabajo ya no sirve"""
+
+
+@dataclass(frozen=True)
+class Deadline:
+    """Instante (epoch, como time.time()) a partir del cual una petición ya no se procesa"""
+    expires_at: float
+
+    @classmethod
+    def after(cls, seconds: float, start: Optional[float] = None) -> "Deadline":
+        """Tiempo límite `seconds` después de `start` (por defecto, ahora)"""
+        return cls((start if start is not None else time.time()) + seconds)
+
+    def remaining(self) -> float:
+        """Segundos que quedan (0 si ya venció)"""
+        return max(0.0, self.expires_at - time.time())
+
+    @property
+    def expired(self) -> bool:
+        return time.time() >= self.expires_at
+
+    def check(self, stage: str):
+        """
+        Lanza DeadlineExceeded si el tiempo límite ya pasó.
+
+        Args:
+            stage: Paso que se iba a ejecutar, para el mensaje de error
+        """
+        if self.expired:
+            raise DeadlineExceeded(f"Tiempo límite superado antes de {stage}")
+
+
+async def wait_with_deadline(awaitable: Awaitable[T], deadline: Optional[Deadline], stage: str) -> T:
+    """
+    Espera `awaitable` como mucho hasta el tiempo límite y lo cancela si vence.
+
+    Args:
+        awaitable: Trabajo a esperar
+        deadline: Tiempo límite (None para esperar sin límite)
+        stage: Paso en curso, para el mensaje de error
+
+    Raises:
+        DeadlineExceeded: Si el tiempo límite vence antes de terminar
+    """
+    if deadline is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, timeout=deadline.remaining())
+    except asyncio.TimeoutError:
+        # Un timeout propio del trabajo (no del tiempo límite) se propaga tal cual
+        if not deadline.expired:
+            raise
+        raise DeadlineExceeded(f"Tiempo límite superado durante {stage}") from None
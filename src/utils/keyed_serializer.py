@@ -0,0 +1,64 @@
+"""
+Ejecución en serie por clave: los elementos con la misma clave se procesan de uno
+en uno y en orden, y los de claves distintas en paralelo
+"""
+
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Hashable, Optional
+
+
+class KeyedSerializer:
+    """
+    Colas de espera por clave para los workers de una cola compartida.
+
+    El worker que saca un elemento llama a `acquire`: si la clave está libre la
+    reserva y lo procesa; si otro worker ya procesa esa clave, el elemento queda
+    en la cola de la clave. Al terminar, `release` devuelve el siguiente elemento
+    pendiente de la misma clave (que el mismo worker procesa a continuación) o
+    libera la clave. Sirve tanto para hilos como para corrutinas.
+    """
+
+    def __init__(self):
+        self._pending: Dict[Hashable, Deque[Any]] = {}
+        self._lock = threading.Lock()
+        self.deferred = 0
+
+    def acquire(self, key: Hashable, item: Any) -> bool:
+        """
+        Reserva la clave para procesar `item`.
+
+        Returns:
+            bool: True si se puede procesar ya; False si quedó esperando a su clave
+        """
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is None:
+                self._pending[key] = deque()
+                return True
+            pending.append(item)
+            self.deferred += 1
+            return False
+
+    def release(self, key: Hashable) -> Optional[Any]:
+        """
+        Termina el elemento en curso de la clave.
+
+        Returns:
+            Optional[Any]: Siguiente elemento de la clave, o None si la clave queda libre
+        """
+        with self._lock:
+            pending = self._pending[key]
+            if pending:
+                return pending.popleft()
+            del self._pending[key]
+            return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Claves en proceso y elementos esperando a su clave"""
+        with self._lock:
+            return {
+                "active_keys": len(self._pending),
+                "waiting": sum(len(pending) for pending in self._pending.values()),
+                "deferred_total": self.deferred
+            }
@@ -57,6 +57,37 @@ class MetricsCollector:
         self.register_metric("discord_queue_size", MetricType.QUEUE_SIZE, "Tamaño de la cola de procesamiento")
         self.register_metric("discord_active_workers", MetricType.ACTIVE_WORKERS, "Workers activos")
         self.register_metric("discord_retry_count", MetricType.REQUEST_COUNT, "Número de reintentos")
+        self.register_metric("discord_interactions_expired", MetricType.REQUEST_COUNT, "Peticiones descartadas por superar su tiempo límite")
+        self.register_metric("discord_requests_serialized", MetricType.REQUEST_COUNT, "Peticiones en espera de otra del mismo usuario")
+        self.register_metric("discord_batch_size", MetricType.QUEUE_SIZE, "Peticiones procesadas en cada lote")
+        self.register_metric("discord_time_to_first_token_ms", MetricType.RESPONSE_TIME, "Tiempo hasta el primer token en streaming")
+        self.register_metric("discord_inflight_generations", MetricType.ACTIVE_WORKERS, "Generaciones del LLM en curso (modo asíncrono)")
+        
+        # Métricas del sistema RAG
+        self.register_metric("rag_warmup_time_ms", MetricType.RESPONSE_TIME, "Tiempo de calentamiento del RAG")
+        self.register_metric("rag_reloads_total", MetricType.REQUEST_COUNT, "Recargas de la base de conocimiento")
+        self.register_metric("rag_reload_time_ms", MetricType.RESPONSE_TIME, "Tiempo de recarga de la base de conocimiento")
+        self.register_metric("rag_query_embedding_cache_hits", MetricType.REQUEST_COUNT, "Aciertos de la caché de embeddings de consultas")
+        self.register_metric("rag_query_embedding_cache_misses", MetricType.REQUEST_COUNT, "Fallos de la caché de embeddings de consultas")
+        self.register_metric("rag_retrieval_cache_hits", MetricType.REQUEST_COUNT, "Aciertos de la caché de resultados de recuperación")
+        self.register_metric("rag_retrieval_cache_misses", MetricType.REQUEST_COUNT, "Fallos de la caché de resultados de recuperación")
+        self.register_metric("rag_embedding_batch_size", MetricType.QUEUE_SIZE, "Consultas codificadas por lote")
+        self.register_metric("rag_guild_loads_total", MetricType.REQUEST_COUNT, "Bases de conocimiento de servidores cargadas")
+        self.register_metric("rag_guild_evictions_total", MetricType.REQUEST_COUNT, "Bases de conocimiento de servidores descargadas")
+        self.register_metric("rag_guild_resident_mb", MetricType.QUEUE_SIZE, "Memoria estimada de los índices de servidores residentes")
+        
+        # Métricas del chat
+        self.register_metric("chat_response_cache_hits", MetricType.REQUEST_COUNT, "Respuestas servidas desde la caché semántica")
+        self.register_metric("chat_prompt_tokens", MetricType.QUEUE_SIZE, "Tokens estimados del prompt enviado al LLM")
+        self.register_metric("chat_response_cache_misses", MetricType.REQUEST_COUNT, "Consultas elegibles no encontradas en la caché semántica")
+        self.register_metric("chat_single_flight_coalesced", MetricType.REQUEST_COUNT, "Peticiones resueltas con la generación en curso de otra idéntica")
+        
+        # Métricas del enrutador de LLM
+        self.register_metric("llm_request_time_ms", MetricType.RESPONSE_TIME, "Latencia de cada proveedor de LLM (completa o hasta el primer token)")
+        self.register_metric("llm_hedged_requests_total", MetricType.REQUEST_COUNT, "Peticiones de respaldo lanzadas por latencia alta")
+        self.register_metric("llm_hedge_wins_total", MetricType.REQUEST_COUNT, "Respuestas servidas por un proveedor alternativo")
+        self.register_metric("llm_failovers_total", MetricType.REQUEST_COUNT, "Peticiones reenviadas tras un error del proveedor")
+        self.register_metric("llm_circuit_open_total", MetricType.REQUEST_COUNT, "Aperturas del circuit breaker de un proveedor")
         
         logger.info("Sistema de métricas inicializado")
     
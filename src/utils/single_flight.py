@@ -0,0 +1,145 @@
+"""
+Single-flight: las llamadas concurrentes con la misma clave comparten una sola ejecución
+"""
+
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple, Type
+
+from src.utils.metrics import metrics_collector
+
+
+class _Call:
+    """Ejecución en curso de una clave, esperada por las llamadas duplicadas"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Agrupa llamadas concurrentes por clave: la primera ejecuta la función y las
+    que llegan mientras está en curso esperan su resultado (o su excepción) en
+    lugar de repetir el trabajo. No guarda nada una vez terminada la ejecución.
+
+    Si la ejecución compartida se cancela o falla con uno de `leader_errors`
+    (errores de la llamada que la lanzó, no del trabajo), una de las llamadas en
+    espera toma el relevo y ejecuta su propia función.
+    """
+
+    def __init__(self, metrics_prefix: Optional[str] = None,
+                 leader_errors: Tuple[Type[BaseException], ...] = ()):
+        """
+        Args:
+            metrics_prefix: Prefijo de la métrica de llamadas agrupadas (ej: "chat_single_flight")
+            leader_errors: Excepciones propias de la llamada líder que no se comparten
+                (ej: su tiempo límite vencido)
+        """
+        self.metrics_prefix = metrics_prefix
+        self.leader_errors = leader_errors
+        self._calls: Dict[Hashable, _Call] = {}
+        self._futures: Dict[Hashable, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+
+    def _record_coalesced(self):
+        """Cuenta una llamada resuelta con el resultado de otra"""
+        self.coalesced += 1
+        if self.metrics_prefix:
+            metrics_collector.increment_counter(f"{self.metrics_prefix}_coalesced")
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """
+        Ejecuta `fn` una sola vez para todas las llamadas concurrentes con `key`.
+
+        Returns:
+            Any: Resultado de la ejecución compartida
+        """
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+                    self.executions += 1
+            if leader:
+                break
+
+            call.done.wait()
+            if isinstance(call.error, self.leader_errors):
+                # El error era de la llamada líder, no del trabajo: se toma el relevo
+                continue
+            # Solo cuenta como agrupada si la resuelve la ejecución compartida
+            with self._lock:
+                self._record_coalesced()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Variante asíncrona de do(): `fn` devuelve una corrutina. Las llamadas deben
+        hacerse desde un mismo event loop.
+        """
+        future = self._futures.get(key)
+        while future is not None:
+            try:
+                # shield: cancelar una llamada duplicada no cancela la ejecución compartida
+                result = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # Se canceló la ejecución compartida (no esta llamada): se toma el relevo
+            except self.leader_errors:
+                pass  # El error era de la llamada líder, no del trabajo: se toma el relevo
+            except BaseException:
+                self._record_coalesced()
+                raise
+            else:
+                # Solo cuenta como agrupada si la resuelve la ejecución compartida
+                self._record_coalesced()
+                return result
+            future = self._futures.get(key)
+
+        future = asyncio.get_running_loop().create_future()
+        self._futures[key] = future
+        self.executions += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Evita el aviso de excepción no recuperada si nadie más esperaba
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._futures[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Obtiene estadísticas de las llamadas agrupadas"""
+        total = self.executions + self.coalesced
+        return {
+            "in_flight": len(self._calls) + len(self._futures),
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "coalesced_percent": round(self.coalesced / total * 100, 2) if total else 0
+        }
@@ -0,0 +1,121 @@
+"""
+Pruebas de los tiempos límite en el chat en lote: cada turno se abandona solo
+cuando vence su propio tiempo límite
+
+Ejecutar con: python -m pytest tests/test_chat_batch.py
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+# Agregar el directorio padre al path para importar módulos del proyecto
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("langchain")
+pytest.importorskip("faiss")
+pytest.importorskip("langchain_google_genai")
+pytest.importorskip("langchain_openai")
+pytest.importorskip("langchain_ollama")
+
+from langchain.memory import ConversationBufferMemory
+
+from src.core import chat
+from src.utils.deadline import Deadline, DeadlineExceeded
+
+
+class StubChain:
+    """Chain que responde con el usuario del config y registra las llamadas"""
+
+    def __init__(self, delays=None):
+        self.delays = delays or {}
+        self.calls = []
+
+    def _respond(self, config):
+        user_id = config["metadata"]["user_id"]
+        self.calls.append(user_id)
+        return f"Respuesta para {user_id}"
+
+    def batch(self, inputs, config, return_exceptions=False):
+        return [self._respond(item) for item in config]
+
+    async def ainvoke(self, inputs, config):
+        await asyncio.sleep(self.delays.get(config["metadata"]["user_id"], 0))
+        return self._respond(config)
+
+
+class StubMemoryStore:
+    def __init__(self):
+        self.memories = {}
+        self.saved = []
+
+    def get_user_memory(self, user_id):
+        return self.memories.setdefault(user_id, ConversationBufferMemory(return_messages=True))
+
+    def save_user_memory(self, user_id, memory):
+        self.saved.append(user_id)
+        return True
+
+
+class StubContextStorage:
+    def store_context(self, context):
+        pass
+
+
+@pytest.fixture
+def memory_store(monkeypatch):
+    store = StubMemoryStore()
+    monkeypatch.setattr(chat, "persistent_memory", store)
+    monkeypatch.setattr(chat, "context_storage", StubContextStorage())
+    monkeypatch.setattr(chat, "RESPONSE_CACHE_ENABLED", False)
+    monkeypatch.setattr(chat, "get_knowledge_fingerprint", lambda guild_id: "stub")
+    monkeypatch.setattr(chat, "get_enhanced_documents_batch", lambda prompts, contexts: [[] for _ in prompts])
+    return store
+
+
+def request(user_id, prompt, deadline):
+    return {"prompt": prompt, "user_id": user_id, "roles": [], "username": user_id,
+            "interaction_token": "", "guild_id": None, "channel_id": None, "deadline": deadline}
+
+
+def test_expired_leader_does_not_fail_live_follower(monkeypatch, memory_store):
+    chain = StubChain()
+    monkeypatch.setattr(chat, "get_chain", lambda: chain)
+
+    def slow_retrieval(prompts, contexts):
+        time.sleep(0.3)
+        return [[] for _ in prompts]
+
+    # El tiempo límite del primer turno vence durante la recuperación del lote
+    monkeypatch.setattr(chat, "get_enhanced_documents_batch", slow_retrieval)
+    expiring = Deadline.after(0.1)
+    live = Deadline.after(60)
+
+    results = chat.chat_batch([request("lider", "¿Quién es Ana?", expiring),
+                               request("seguidor", "¿quién es  Ana?", live)])
+
+    assert isinstance(results[0], DeadlineExceeded)
+    # El seguidor vigente pasa a ser el primer turno del grupo y recibe la respuesta
+    assert results[1] == "Respuesta para seguidor"
+    assert chain.calls == ["seguidor"]
+    assert memory_store.saved == ["seguidor"]
+
+
+def test_async_batch_applies_each_group_deadline(monkeypatch, memory_store):
+    chain = StubChain(delays={"lento": 5})
+    monkeypatch.setattr(chat, "get_chain", lambda: chain)
+    short = Deadline.after(0.2)
+    long = Deadline.after(60)
+
+    start = time.time()
+    results = asyncio.run(chat.achat_batch([request("lento", "¿Quién es Ana?", short),
+                                            request("rapido", "¿Quién es Bruno?", long)]))
+
+    # La generación vencida se cancela sin esperar al resto del lote ni guardarse en memoria
+    assert time.time() - start < 2
+    assert isinstance(results[0], DeadlineExceeded)
+    assert results[1] == "Respuesta para rapido"
+    assert memory_store.saved == ["rapido"]
@@ -0,0 +1,114 @@
+"""
+Prueba de concurrencia: cada petición de recuperación usa solo su propio contexto
+
+Ejecutar con: python -m pytest tests/test_retrieval_context.py
+"""
+
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+# Agregar el directorio padre al path para importar módulos del proyecto
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("langchain")
+pytest.importorskip("faiss")
+
+from langchain.schema import Document
+
+from src.rag import enhanced_rag
+from src.rag.enhanced_rag import RetrievalContext, get_enhanced_documents
+from src.utils.cache import LRUCache
+
+USERS = ["Ana", "Bruno", "Carla", "Diego", "Elena", "Fabio", "Gloria", "Hugo"]
+
+
+class StubRetriever:
+    """Retriever que devuelve un documento por consulta y espera a que todas estén en curso"""
+
+    def __init__(self, parties: int):
+        self.barrier = threading.Barrier(parties, timeout=10)
+        self.queries = []
+
+    def invoke(self, query: str):
+        self.queries.append(query)
+        # Todas las peticiones llegan aquí antes de que ninguna continúe
+        self.barrier.wait()
+        owner = query.rsplit(" ", 1)[-1].rstrip(")")
+        return [Document(page_content=f"Vectorial: {query}", metadata={"id": f"vector-{owner}", "owner": owner})]
+
+
+class StubLexicalIndex:
+    def search(self, query: str, k: int):
+        return []
+
+
+class StubEntityIndex:
+    def lookup(self, entity: str, limit=None):
+        return [f"entity-{entity}"][:limit]
+
+
+class StubSnapshot:
+    """Índice mínimo con la interfaz de IndexSnapshot que usa get_enhanced_documents"""
+    fingerprint = "stub"
+
+    def __init__(self, parties: int):
+        self.retriever = StubRetriever(parties)
+        self.lexical_index = StubLexicalIndex()
+        self.entity_index = StubEntityIndex()
+
+    def get_documents(self, doc_ids):
+        return [Document(page_content=doc_id, metadata={"id": doc_id, "owner": doc_id.split("-", 1)[1]})
+                for doc_id in doc_ids]
+
+
+class StubKnowledgeBase:
+    def __init__(self, snapshot: StubSnapshot):
+        self.snapshot = snapshot
+
+
+class StubRegistry:
+    def __init__(self, snapshot: StubSnapshot):
+        self.knowledge_base = StubKnowledgeBase(snapshot)
+
+    def get(self, guild_id=None):
+        return self.knowledge_base
+
+
+@pytest.fixture
+def snapshot(monkeypatch):
+    snapshot = StubSnapshot(len(USERS))
+    monkeypatch.setattr(enhanced_rag, "knowledge_registry", StubRegistry(snapshot))
+    monkeypatch.setattr(enhanced_rag, "retrieval_cache", LRUCache(128, 60))
+    monkeypatch.setattr(enhanced_rag, "RAG_HYBRID_SEARCH", True)
+    return snapshot
+
+
+def test_concurrent_requests_keep_their_own_context(snapshot):
+    def retrieve(user: str):
+        context = RetrievalContext(history=f"Usuario: Háblame de {user}\nBot: {user} es un personaje.")
+        return user, get_enhanced_documents("¿Cuándo nació?", context)
+
+    with ThreadPoolExecutor(max_workers=len(USERS)) as executor:
+        results = list(executor.map(retrieve, USERS))
+
+    # Cada consulta mejorada se refiere a la entidad de su propio historial
+    assert sorted(snapshot.retriever.queries) == sorted(f"¿Cuándo nació? (refiriéndose a {user})" for user in USERS)
+
+    # Y cada petición recibe solo los documentos de su contexto
+    for user, documents in results:
+        assert documents
+        assert {doc.metadata["owner"] for doc in documents} == {user}
+        assert {doc.metadata["id"] for doc in documents} == {f"vector-{user}", f"entity-{user}"}
+
+
+def test_request_without_context_is_not_enhanced(snapshot):
+    snapshot.retriever.barrier = threading.Barrier(1)
+
+    documents = get_enhanced_documents("¿Cuándo nació?")
+
+    assert snapshot.retriever.queries == ["¿Cuándo nació?"]
+    assert documents[0].page_content == "Vectorial: ¿Cuándo nació?"